@@ -6,12 +6,17 @@ from flask import Flask
 from flask_cors import CORS
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from controllers.adminController import admin_controller
+from controllers.aggregateStatsController import aggregate_stats_controller
 from controllers.baseModelController import base_model_controller
 from controllers.errorHandler import error_handler
 from controllers.searchStatsController import search_stats_controller
 from jsonProcessing.ExtendedJsonProvider import ExtendedJsonProvider
 from masterStats.MasterStatsManager import MasterStatsManager
 from mongo.dao.MongoDAO import MongoDAO
+from monitoring.metrics import init_metrics
+from monitoring.profiling import init_profiling
+from monitoring.request_recorder import init_request_recording
 from utils.loggingUtils import configure_logging
 
 LOG = logging.getLogger(__name__)
@@ -49,6 +54,11 @@ def create_server_apps(config_file_path: str, log_level: str) -> Flask:
     # Custom JSON Provider for the app
     app.json = ExtendedJsonProvider(app)
 
+    # Request metrics, on-demand profiling and request recording
+    init_metrics(app)
+    init_profiling(app)
+    init_request_recording(app)
+
     # MONGO Access setup
     app.logger.info("Open MongoDAO")
     mongo_dao = MongoDAO(MongoDAO.compute_dao_options_from_app(app.config))
@@ -63,6 +73,10 @@ def create_server_apps(config_file_path: str, log_level: str) -> Flask:
     app.register_blueprint(error_handler)
     app.register_blueprint(base_model_controller)
     app.register_blueprint(search_stats_controller)
+    app.register_blueprint(aggregate_stats_controller)
+    if app.config.get('ENABLE_ADMIN_API', False):
+        app.logger.warning("ENABLE ADMIN API")
+        app.register_blueprint(admin_controller)
 
     return app
 
@@ -0,0 +1,35 @@
+import json
+import logging
+
+from MasterStatsAPI import setup_argument_parser
+from MongoCacheBuilder import read_py_file_config
+from masterStats.MasterStatsManager import MasterStatsManager
+from masterStats.loading.frame_compaction import format_memory_report
+from utils.loggingUtils import configure_logging
+
+LOG = logging.getLogger(__name__)
+
+
+def main(log_level: str = 'INFO', config: str = './config.py', as_json: bool = False):
+    # Logging configuration
+    configure_logging(log_level)
+
+    # read the configuration as a dict
+    LOG.info("Load configuration")
+    config = read_py_file_config(config)
+    LOG.info("Stats Manager setup")
+    master_stats_mgr = MasterStatsManager(config)
+    LOG.info("Load full stats")
+    master_stats_mgr.build_full_stats()
+    if not config.get('COMPACT_STATS_DTYPES', False):
+        master_stats_mgr.compact_stats_frames()
+    report = master_stats_mgr.memory_report()
+    print(json.dumps(report, indent=2) if as_json else format_memory_report(report))
+
+
+if __name__ == '__main__':
+    # Parse application arguments
+    arg_parser = setup_argument_parser()
+    arg_parser.add_argument('--json', help="Print the report as JSON", action='store_true')
+    args = arg_parser.parse_args()
+    main(args.log_level, args.config, args.json)
@@ -36,25 +36,37 @@ def read_py_file_config(filename: str | os.PathLike[str], silent: bool = False)
     return config
 
 
-def main(log_level: str = 'INFO', config: str = './config.py'):
-    # Logging configuration
-    configure_logging(log_level)
-
-    # read the configuration as a dict
-    LOG.info("Load configuration")
-    config = read_py_file_config(args.config)
+def build_cache(config: dict):
+    """
+    (Re-)Build the mongo cache from the sources of the configuration
+    :param config: the configuration as a dict
+    """
     LOG.info("Stats Manager setup")
     master_stats_mgr = MasterStatsManager(config)
-    LOG.info("Load full stats")
-    master_stats_mgr.build_full_stats()
+    chunk_size = config.get('BUILD_CHUNK_SIZE')
+    if not chunk_size:
+        LOG.info("Load full stats")
+        master_stats_mgr.build_full_stats()
     LOG.info("(Re-)Build Mongo cache")
     with MongoDAO(MongoDAO.compute_dao_options_from_app(config)) as mongo_dao:
         LOG.info("Mongo init index")
         mongo_dao.init_indexes()
-        master_stats_mgr.build_mongo_cache(clear_col=True)
+        if chunk_size:
+            master_stats_mgr.build_chunked_mongo_cache(chunk_size, clear_col=True)
+        else:
+            master_stats_mgr.build_mongo_cache(clear_col=True)
     LOG.info("Cache building done")
 
 
+def main(log_level: str = 'INFO', config: str = './config.py'):
+    # Logging configuration
+    configure_logging(log_level)
+
+    # read the configuration as a dict
+    LOG.info("Load configuration")
+    build_cache(read_py_file_config(config))
+
+
 if __name__ == '__main__':
     # Parse application arguments
     arg_parser = setup_argument_parser()
@@ -0,0 +1,118 @@
+import json
+import logging
+import math
+import os
+import resource
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+__all__ = ['percentile', 'summarize_latencies', 'current_rss_bytes', 'peak_rss_bytes', 'use_mongomock',
+           'ServerThread', 'save_results', 'load_results', 'compare_results']
+
+LOG = logging.getLogger(__name__)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(pct / 100. * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, Optional[float]]:
+    """
+    Summarize latencies (in seconds) as milliseconds statistics
+    """
+    sorted_latencies = sorted(latencies)
+    to_ms = (lambda v: round(v * 1000., 3) if v is not None else None)
+    return {
+        'meanMs': to_ms(sum(sorted_latencies) / len(sorted_latencies)) if sorted_latencies else None,
+        'p50Ms': to_ms(percentile(sorted_latencies, 50)),
+        'p95Ms': to_ms(percentile(sorted_latencies, 95)),
+        'p99Ms': to_ms(percentile(sorted_latencies, 99)),
+        'maxMs': to_ms(sorted_latencies[-1]) if sorted_latencies else None,
+    }
+
+
+def current_rss_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def use_mongomock():
+    """
+    Replace the MongoClient of MongoDAO by a single in-process mongomock client (optional dependency).
+    mongomock does not support $text queries nor explain commands.
+    """
+    import mongomock
+    import mongo.dao.MongoDAO as mongo_dao_module
+    client = mongomock.MongoClient()
+    mongo_dao_module.MongoClient = lambda *args, **kwargs: client
+    LOG.warning("Use mongomock as in-process mongo stand-in")
+
+
+class ServerThread(threading.Thread):
+    """
+    Threaded werkzeug server running a flask app in background, on a free port of localhost
+    """
+
+    def __init__(self, app: Flask, host: str = '127.0.0.1', port: int = 0):
+        super().__init__(daemon=True)
+        # request logs of werkzeug only at the benchmark logging level
+        logging.getLogger('werkzeug').setLevel(logging.getLogger().level)
+        self._server = make_server(host, port, app, threaded=True)
+        self.url = 'http://%s:%d' % (host, self._server.server_port)
+
+    def run(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        self._server.shutdown()
+
+
+def save_results(results: Dict, filepath: str):
+    with open(filepath, 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, ensure_ascii=False, indent=2)
+
+
+def load_results(filepath: str) -> Dict:
+    with open(filepath, encoding='utf-8') as results_file:
+        return json.load(results_file)
+
+
+def compare_results(current: Dict[str, Dict], baseline: Dict[str, Dict], metrics: Sequence[str],
+                    tolerance: float, higher_is_better: Sequence[str] = ()) -> List[Dict]:
+    """
+    Compare the metrics of named entries of current results with the ones of a baseline
+    :param current: the current results, entry name -> metric name -> value
+    :param baseline: the baseline results, with the same structure
+    :param metrics: the metrics to compare
+    :param tolerance: the relative change above which a worse value is a regression (0.1 for 10%)
+    :param higher_is_better: the metrics for which a higher value is better (lower is better by default)
+    :return: one dict per entry and metric: name, metric, baseline, current, change, regression
+    """
+    comparison = []
+    for name, current_entry in current.items():
+        baseline_entry = baseline.get(name)
+        if baseline_entry is None:
+            continue
+        for metric in metrics:
+            current_value, baseline_value = current_entry.get(metric), baseline_entry.get(metric)
+            if current_value is None or not baseline_value:
+                continue
+            change = (current_value - baseline_value) / baseline_value
+            worse_change = -change if metric in higher_is_better else change
+            comparison.append(dict(name=name, metric=metric, baseline=baseline_value, current=current_value,
+                                   change=round(change, 4), regression=worse_change > tolerance))
+    return comparison
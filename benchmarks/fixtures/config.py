@@ -0,0 +1,18 @@
+# BENCHMARK FIXTURES CONFIGURATION
+# Small checked-in sources (3 years of about 50 formations of 6 etablissements) for reproducible benchmark runs:
+#     python -m benchmarks.load_benchmark -c benchmarks/fixtures/config.py --mongomock --seed
+# Source paths are relative to the project root, where benchmarks are run from. Other settings keep their defaults.
+DEBUG = False
+ENABLE_CORS = False
+
+# MONGODB CONNECTION CONFIGURATION
+# A database of its own: seeding replaces the mongo cache
+MONGO_HOST = 'localhost'
+MONGO_PORT = 27017
+MONGO_DATABASE = 'masters_benchmark'
+
+# DATA SOURCE
+CANDIDATURE_SOURCE = 'benchmarks/fixtures/candidatures.csv'
+INSERTION_SOURCE = 'benchmarks/fixtures/insertion_professionnelle.csv'
+DISC_MAPPING_SOURCE = 'benchmarks/fixtures/mapping_cand_ins.csv'
+CITIES_SOURCE = 'benchmarks/fixtures/cities.csv'
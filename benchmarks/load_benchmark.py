@@ -0,0 +1,327 @@
+"""
+End-to-end HTTP load benchmark of the API.
+
+The app is created with create_server_apps and served by a threaded werkzeug server in the benchmark process, against
+the mongo instance of the configuration or an in-process mongomock stand-in (--mongomock, optional dependency). The
+mongo cache can be seeded beforehand from the CSV sources of the configuration (--seed). A weighted mix of requests is
+then replayed by concurrent clients, and throughput, p50/p95/p99 latencies and RSS are reported per scenario.
+For reproducible runs, use the configuration of the checked-in fixture sources (benchmarks/fixtures/config.py).
+
+Results can be stored as a JSON baseline (--output) and compared with a previous baseline (--compare): the exit code
+is 1 if a latency or throughput regression above the tolerance is found.
+
+Usage (from the project root):
+    python -m benchmarks.load_benchmark -c benchmarks/fixtures/config.py --mongomock --seed --output base.json
+    python -m benchmarks.load_benchmark -c ./config.py --seed --duration 30 --concurrency 8 --output base.json
+    python -m benchmarks.load_benchmark -c ./config.py --duration 30 --concurrency 8 --compare base.json
+"""
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from argparse import ArgumentParser
+from typing import Dict, List, Optional
+
+from MongoCacheBuilder import read_py_file_config
+from benchmarks.bench_utils import (ServerThread, compare_results, current_rss_bytes, load_results, peak_rss_bytes,
+                                    save_results, summarize_latencies, use_mongomock)
+from masterStats.MasterStatsManager import MasterStatsManager
+from mongo.dao.MongoDAO import MongoDAO
+from utils.loggingUtils import configure_logging
+
+LOG = logging.getLogger(__name__)
+
+COMPARED_METRICS = ['throughput', 'p50Ms', 'p95Ms', 'p99Ms']
+
+
+def setup_argument_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Master stats API load benchmark")
+    parser.add_argument('-c', '--config', help="Configuration file location (default: ./config.py)",
+                        metavar='<configuration file>', type=str, default='./config.py')
+    parser.add_argument('-l', '--log-level', help="Level of logger", metavar='<logging level>', type=str,
+                        default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'FATAL'])
+    parser.add_argument('--url', help="Benchmark an already running API at this base url instead of starting it",
+                        type=str, default=None)
+    parser.add_argument('--mongomock', help="Use an in-process mongomock stand-in instead of mongo",
+                        action='store_true')
+    parser.add_argument('--seed', help="(Re-)Build the mongo cache from the sources of the configuration first",
+                        action='store_true')
+    parser.add_argument('--mix', help="JSON file of the request mix (default: mix generated from reference data)",
+                        type=str, default=None)
+    parser.add_argument('--write-mix', help="Write the request mix used in this JSON file", type=str, default=None)
+    parser.add_argument('--concurrency', help="Number of concurrent clients", type=int, default=4)
+    parser.add_argument('--duration', help="Duration of the measured run, in seconds", type=float, default=20.)
+    parser.add_argument('--warmup', help="Duration of the unmeasured warmup run, in seconds", type=float,
+                        default=3.)
+    parser.add_argument('--random-seed', help="Seed of the scenario choice", type=int, default=42)
+    parser.add_argument('--output', help="Write the results as a JSON baseline in this file", type=str,
+                        default=None)
+    parser.add_argument('--compare', help="Compare the results with this JSON baseline", type=str, default=None)
+    parser.add_argument('--tolerance', help="Relative change considered as a regression (default: 0.1)", type=float,
+                        default=0.1)
+    return parser
+
+
+def seed_mongo_cache(config_file_path: str, log_level: str, in_process: bool):
+    """
+    Build the mongo cache from the CSV sources of the configuration.
+    With a mongo server, the build runs in a subprocess so that its memory is not accounted in the benchmark RSS.
+    In process, the singletons are reset after the build: the API must not reuse the builder configuration nor its
+    full stats frames (memory, and code paths preferring frames with the mongo backend).
+    :param config_file_path: the configuration file
+    :param log_level: the logging level
+    :param in_process: build in the current process (required for the mongomock stand-in)
+    """
+    LOG.warning("Seed mongo cache from %s", config_file_path)
+    if in_process:
+        from MongoCacheBuilder import build_cache
+        build_cache(read_py_file_config(config_file_path))
+        MasterStatsManager.reset_instance()
+        # the mongomock client is kept by use_mongomock, new DAOs share its data
+        MongoDAO.reset_instance()
+        gc.collect()
+    else:
+        subprocess.run([sys.executable, 'MongoCacheBuilder.py', '-c', config_file_path, '-l', log_level],
+                       check=True)
+
+
+def start_api(config_file_path: str, log_level: str, mongomock: bool = False, seed: bool = False) -> ServerThread:
+    """
+    Create the app and serve it in background
+    :param config_file_path: the configuration file
+    :param log_level: the logging level
+    :param mongomock: use an in-process mongomock stand-in instead of mongo
+    :param seed: build the mongo cache from the sources of the configuration first
+    :return: the started server thread
+    """
+    if mongomock:
+        use_mongomock()
+    if seed:
+        seed_mongo_cache(config_file_path, log_level, in_process=mongomock)
+    from MasterStatsAPI import create_server_apps
+    app = create_server_apps(config_file_path, log_level)
+    server = ServerThread(app)
+    server.start()
+    LOG.warning("API served at %s", server.url)
+    return server
+
+
+def http_request(base_url: str, scenario: Dict, timeout: float = 60.) -> (int, int):
+    """
+    Perform the request of a scenario
+    :param base_url: the base url of the API
+    :param scenario: the scenario (method, path, optional json body)
+    :param timeout: the request timeout
+    :return: the status code and the size of the response body
+    """
+    data, headers = None, dict()
+    if scenario.get('body') is not None:
+        data = json.dumps(scenario['body']).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(base_url + scenario['path'], data=data, headers=headers,
+                                 method=scenario.get('method', 'GET'))
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, len(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, len(e.read())
+
+
+def _get_json(base_url: str, path: str):
+    with urllib.request.urlopen(base_url + path, timeout=60.) as response:
+        return json.loads(response.read())
+
+
+def generate_request_mix(base_url: str, rnd: random.Random, text_search: bool = True) -> List[Dict]:
+    """
+    Generate a weighted request mix from the reference data served by the API
+    :param base_url: the base url of the API
+    :param rnd: the random generator choosing the filter values
+    :param text_search: include formation text searches (not supported by mongomock without the in-memory text index)
+    :return: the list of scenarios (name, weight, method, path, body)
+    """
+    academies = _get_json(base_url, '/api/rest/academies')
+    etablissements = _get_json(base_url, '/api/rest/etablissements')
+    sect_discs = _get_json(base_url, '/api/rest/secteurs-disciplinaires')
+    region_ids = sorted(set(a['regionId'] for a in academies))
+    uais = [e['uai'] for e in etablissements]
+    uai = rnd.choice(uais)
+    formations = _get_json(base_url, '/api/rest/formations?' + urllib.parse.urlencode({'uai': uai}))
+    ifcs = [f['ifc'] for f in formations] or ['unknown']
+    words = [w for f in formations for w in (f.get('parcours') or '').split() if len(w) > 4] or ['master']
+
+    mix = [
+        dict(name='academies', weight=5, method='GET', path='/api/rest/academies'),
+        dict(name='formations_by_etab', weight=10, method='GET',
+             path='/api/rest/formations?' + urllib.parse.urlencode({'uai': uai})),
+        dict(name='formation_by_ifc', weight=10, method='GET',
+             path='/api/rest/formations/' + urllib.parse.quote(rnd.choice(ifcs)) + '?full-details=true'),
+        dict(name='stats_region', weight=20, method='POST', path='/api/rest/stats/search',
+             body={'filters': {'regionIds': rnd.choice(region_ids)}}),
+        dict(name='stats_academie_all_details', weight=15, method='POST', path='/api/rest/stats/search',
+             body={'filters': {'academieIds': rnd.choice(academies)['id']},
+                   'harvest': {'candidatureDetails': 'all', 'insertionProDetails': 'all'}}),
+        dict(name='stats_formations', weight=20, method='POST', path='/api/rest/stats/search',
+             body={'filters': {'formationIfcs': rnd.sample(ifcs, min(3, len(ifcs)))},
+                   'harvest': {'typeStats': 'candidatures', 'candidatureDetails': 'all'}}),
+        dict(name='stats_etab_sect_disc', weight=15, method='POST', path='/api/rest/stats/search',
+             body={'filters': {'etablissementIds': uai, 'secteurDisciplinaireIds': rnd.choice(sect_discs)['id']}}),
+    ]
+    if text_search:
+        mix.append(dict(name='formations_text', weight=5, method='GET',
+                        path='/api/rest/formations?' + urllib.parse.urlencode({'q': rnd.choice(words)})))
+    return mix
+
+
+class _Client(threading.Thread):
+
+    def __init__(self, base_url: str, mix: List[Dict], rnd: random.Random, deadline: float):
+        super().__init__(daemon=True)
+        self._base_url = base_url
+        self._mix = mix
+        self._weights = [s.get('weight', 1) for s in mix]
+        self._rnd = rnd
+        self._deadline = deadline
+        # (scenario name, latency, status code, response size)
+        self.samples = []
+
+    def run(self):
+        while time.perf_counter() < self._deadline:
+            scenario = self._rnd.choices(self._mix, weights=self._weights)[0]
+            start = time.perf_counter()
+            try:
+                status, size = http_request(self._base_url, scenario)
+            except OSError as e:
+                LOG.debug("Request error on %s: %s", scenario['name'], str(e))
+                status, size = 0, 0
+            self.samples.append((scenario['name'], time.perf_counter() - start, status, size))
+
+
+def run_load(base_url: str, mix: List[Dict], concurrency: int, duration: float, random_seed: int) -> (List, float):
+    """
+    Replay the request mix with concurrent clients during a given time
+    :return: the samples of all clients and the measured elapsed time
+    """
+    deadline = time.perf_counter() + duration
+    clients = [_Client(base_url, mix, random.Random(random_seed + i), deadline) for i in range(concurrency)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    return [sample for client in clients for sample in client.samples], elapsed
+
+
+def summarize_samples(samples: List, elapsed: float) -> Dict[str, Dict]:
+    """
+    Summarize samples per scenario and for all scenarios (entry '*ALL*')
+    :return: scenario name -> count, errors, throughput (req/s), latencies statistics (ms), mean response size
+    """
+    by_scenario = dict()
+    for sample in samples:
+        by_scenario.setdefault(sample[0], []).append(sample)
+        by_scenario.setdefault('*ALL*', []).append(sample)
+    summary = dict()
+    for name, scenario_samples in sorted(by_scenario.items()):
+        summary[name] = dict(count=len(scenario_samples),
+                             errors=sum(1 for s in scenario_samples if not 200 <= s[2] < 400),
+                             throughput=round(len(scenario_samples) / elapsed, 3),
+                             meanResponseBytes=round(sum(s[3] for s in scenario_samples) / len(scenario_samples)),
+                             **summarize_latencies([s[1] for s in scenario_samples]))
+    return summary
+
+
+def format_summary(summary: Dict[str, Dict]) -> str:
+    lines = ["{:<44} {:>8} {:>7} {:>10} {:>10} {:>10} {:>10} {:>12}".format(
+        'scenario', 'count', 'errors', 'req/s', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'size (B)')]
+    for name, s in summary.items():
+        lines.append("{:<44} {:>8} {:>7} {:>10} {:>10} {:>10} {:>10} {:>12}".format(
+            name, s['count'], s['errors'], s['throughput'], s['p50Ms'], s['p95Ms'], s['p99Ms'],
+            s['meanResponseBytes']))
+    return '\n'.join(lines)
+
+
+def format_comparison(comparison: List[Dict]) -> str:
+    lines = ["{:<28} {:<12} {:>12} {:>12} {:>9}".format('scenario', 'metric', 'baseline', 'current', 'change')]
+    for c in comparison:
+        lines.append("{:<28} {:<12} {:>12} {:>12} {:>8.1f}%{}".format(
+            c['name'], c['metric'], c['baseline'], c['current'], c['change'] * 100.,
+            '  REGRESSION' if c['regression'] else ''))
+    return '\n'.join(lines)
+
+
+def main(args) -> int:
+    configure_logging(args.log_level)
+    server: Optional[ServerThread] = None
+    base_url = args.url
+    if base_url is None:
+        server = start_api(args.config, args.log_level, args.mongomock, args.seed)
+        base_url = server.url
+    rss_after_startup = current_rss_bytes()
+
+    try:
+        if args.mix:
+            with open(args.mix, encoding='utf-8') as mix_file:
+                mix = json.load(mix_file)
+        else:
+            # $text queries are not supported by mongomock
+            text_search = args.url is not None or not args.mongomock or \
+                read_py_file_config(args.config).get('FORMATION_TEXT_INDEX_ENABLED', True)
+            mix = generate_request_mix(base_url, random.Random(args.random_seed), text_search)
+        if args.write_mix:
+            save_results(mix, args.write_mix)
+
+        if args.warmup > 0:
+            LOG.warning("Warmup during %.1fs", args.warmup)
+            run_load(base_url, mix, args.concurrency, args.warmup, args.random_seed)
+        LOG.warning("Run during %.1fs with %d clients", args.duration, args.concurrency)
+        samples, elapsed = run_load(base_url, mix, args.concurrency, args.duration, args.random_seed)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    summary = summarize_samples(samples, elapsed)
+    results = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cpuCount': os.cpu_count(),
+        'url': args.url,
+        'mongomock': args.mongomock,
+        'concurrency': args.concurrency,
+        'duration': round(elapsed, 3),
+        'mix': mix,
+        # RSS of the benchmark process: API and clients, unless the API is given by --url
+        'rss': {'afterStartup': rss_after_startup, 'end': current_rss_bytes(), 'peak': peak_rss_bytes()},
+        'scenarios': summary,
+    }
+    print(format_summary(summary))
+    print("RSS (B): after startup %s, end %s, peak %s" % (results['rss']['afterStartup'], results['rss']['end'],
+                                                          results['rss']['peak']))
+    if args.output:
+        save_results(results, args.output)
+
+    if args.compare:
+        baseline = load_results(args.compare)
+        if baseline.get('concurrency') != args.concurrency or baseline.get('mongomock') != args.mongomock:
+            LOG.warning("Baseline run with different settings (concurrency %s, mongomock %s)",
+                        baseline.get('concurrency'), baseline.get('mongomock'))
+        comparison = compare_results(summary, baseline['scenarios'], COMPARED_METRICS, args.tolerance,
+                                     higher_is_better=['throughput'])
+        print(format_comparison(comparison))
+        if any(c['regression'] for c in comparison):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(setup_argument_parser().parse_args()))
@@ -0,0 +1,187 @@
+"""
+Build pipeline benchmark across dataset scales.
+
+For each scale factor, synthetic source files are generated from the sources of the configuration (see
+synthetic_dataset), then the pipeline runs in a dedicated subprocess (clean memory, own peak RSS): build_full_stats
+with a timing of each loading and creation stage (extends_formations_with_cities being also timed inside
+create_formations), then init_indexes and build_mongo_cache (or build_chunked_mongo_cache with --chunk-size).
+
+The mongo cache is built in the database of the configuration suffixed with _bench, or in an in-process mongomock
+stand-in (--mongomock). The report gives, per stage and scale, the duration and its ratio to a linear extrapolation
+of the smallest scale (1.0 when the stage scales linearly).
+
+Usage (from the project root):
+    python -m benchmarks.pipeline_benchmark -c ./config.py --scales 1 10 100 --work-dir ./local/bench --output p.json
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser, SUPPRESS
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, List
+
+from MongoCacheBuilder import read_py_file_config
+from benchmarks.bench_utils import peak_rss_bytes, save_results, use_mongomock
+from benchmarks.synthetic_dataset import generate_synthetic_dataset
+from utils.loggingUtils import configure_logging
+
+LOG = logging.getLogger(__name__)
+
+# module -> names of the timed stage functions, as called by MasterStatsManager.build_full_stats
+TIMED_FUNCTIONS = {
+    'masterStats.MasterStatsManager': ['load_candidates', 'load_disc_mapping', 'load_cities', 'create_academies',
+                                       'create_etablissements', 'create_secteur_disciplinaires', 'create_mentions',
+                                       'create_formations', 'create_stats_candidatures', 'load_insertionspro',
+                                       'create_stats_insertionspro'],
+    'masterStats.loading.candidatures_loading': ['extends_formations_with_cities'],
+}
+
+
+class StageTimer:
+    """
+    Accumulate the durations of the stage functions of the pipeline, by wrapping them in their module
+    """
+
+    def __init__(self):
+        self.durations: Dict[str, float] = OrderedDict()
+
+    def time(self, stage: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.durations[stage] = self.durations.get(stage, 0.) + time.perf_counter() - start
+
+    def instrument(self, module_functions: Dict[str, List[str]]):
+        for module_name, func_names in module_functions.items():
+            module = sys.modules[module_name]
+            for func_name in func_names:
+                setattr(module, func_name, self._wrap(func_name, getattr(module, func_name)))
+
+    def _wrap(self, stage: str, func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            return self.time(stage, func, *args, **kwargs)
+
+        return timed
+
+
+def run_pipeline(config: Dict, chunk_size: int = None) -> Dict:
+    """
+    Run and time the build pipeline in the current process
+    :param config: the configuration (sources and mongo database)
+    :param chunk_size: if set, build the mongo cache by chunks of CSV rows
+    :return: stage durations (s), frames rows counts and peak RSS
+    """
+    from masterStats.MasterStatsManager import MasterStatsManager
+    from mongo.dao.MongoDAO import MongoDAO
+
+    timer = StageTimer()
+    timer.instrument(TIMED_FUNCTIONS)
+    master_stats_mgr = MasterStatsManager(config)
+    rows = dict()
+    if not chunk_size:
+        timer.time('build_full_stats', master_stats_mgr.build_full_stats)
+        rows = dict(formations=len(master_stats_mgr.formations_df),
+                    statsCandidatures=len(master_stats_mgr.stats_candidatures_df),
+                    statsInsertionsPro=len(master_stats_mgr.stats_insertionspro_df))
+    with MongoDAO(MongoDAO.compute_dao_options_from_app(config)) as mongo_dao:
+        timer.time('init_indexes', mongo_dao.init_indexes)
+        if chunk_size:
+            timer.time('build_chunked_mongo_cache', master_stats_mgr.build_chunked_mongo_cache, chunk_size,
+                       clear_col=True)
+        else:
+            timer.time('build_mongo_cache', master_stats_mgr.build_mongo_cache, clear_col=True)
+    return dict(durations=timer.durations, rows=rows, peakRss=peak_rss_bytes())
+
+
+def run_scale_in_subprocess(config_file_path: str, sources: Dict[str, str], log_level: str, mongomock: bool,
+                            chunk_size: int, result_file: str) -> Dict:
+    command = [sys.executable, '-m', 'benchmarks.pipeline_benchmark', '-c', config_file_path, '-l', log_level,
+               '--run-sources', json.dumps(sources), '--result-file', result_file]
+    if mongomock:
+        command.append('--mongomock')
+    if chunk_size:
+        command += ['--chunk-size', str(chunk_size)]
+    subprocess.run(command, check=True)
+    with open(result_file, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_report(results: Dict[int, Dict]) -> str:
+    scales = sorted(results)
+    stages = list(OrderedDict.fromkeys(stage for scale in scales for stage in results[scale]['durations']))
+    base_scale = scales[0]
+    header = "{:<32}".format('stage') + ''.join("{:>22}".format('x%d s (lin. ratio)' % s) for s in scales)
+    lines = [header]
+    for stage in stages:
+        base = results[base_scale]['durations'].get(stage)
+        cells = []
+        for scale in scales:
+            duration = results[scale]['durations'].get(stage)
+            if duration is None:
+                cells.append("{:>22}".format('-'))
+                continue
+            ratio = duration / (base * scale / base_scale) if base else None
+            cells.append("{:>22}".format('%.3f (%s)' % (duration, '%.2f' % ratio if ratio is not None else '-')))
+        lines.append("{:<32}".format(stage) + ''.join(cells))
+    lines.append("{:<32}".format('peak RSS (MB)') +
+                 ''.join("{:>22}".format('%.1f' % (results[s]['peakRss'] / 2 ** 20)) for s in scales))
+    return '\n'.join(lines)
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Build pipeline benchmark across dataset scales")
+    parser.add_argument('-c', '--config', help="Configuration file giving the sources and mongo (default: ./config.py)",
+                        metavar='<configuration file>', type=str, default='./config.py')
+    parser.add_argument('-l', '--log-level', help="Level of logger", metavar='<logging level>', type=str,
+                        default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'FATAL'])
+    parser.add_argument('--scales', help="Scale factors (default: 1 10 100)", type=int, nargs='+',
+                        default=[1, 10, 100])
+    parser.add_argument('--work-dir', help="Directory of the generated datasets", type=str, default='./local/bench')
+    parser.add_argument('--mongomock', help="Use an in-process mongomock stand-in instead of mongo",
+                        action='store_true')
+    parser.add_argument('--chunk-size', help="Build the mongo cache by chunks of CSV rows", type=int, default=None)
+    parser.add_argument('--random-seed', help="Seed of the synthetic data jitter", type=int, default=42)
+    parser.add_argument('--output', help="Write the results in this JSON file", type=str, default=None)
+    # internal: run the pipeline of one scale
+    parser.add_argument('--run-sources', help=SUPPRESS, type=str, default=None)
+    parser.add_argument('--result-file', help=SUPPRESS, type=str, default=None)
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    config = read_py_file_config(args.config)
+    config['MONGO_DATABASE'] = config.get('MONGO_DATABASE', 'masters') + '_bench'
+
+    if args.run_sources is not None:
+        if args.mongomock:
+            use_mongomock()
+        config.update(json.loads(args.run_sources))
+        save_results(run_pipeline(config, args.chunk_size), args.result_file)
+        return 0
+
+    results = dict()
+    for scale in sorted(args.scales):
+        scale_dir = os.path.join(args.work_dir, 'x%d' % scale)
+        LOG.warning("Generate dataset x%d in %s", scale, scale_dir)
+        start = time.perf_counter()
+        sources = generate_synthetic_dataset(config, scale, scale_dir, args.random_seed)
+        generation_duration = time.perf_counter() - start
+        LOG.warning("Run pipeline x%d", scale)
+        results[scale] = run_scale_in_subprocess(args.config, sources, args.log_level, args.mongomock,
+                                                 args.chunk_size, os.path.join(scale_dir, 'result.json'))
+        results[scale]['generationDuration'] = generation_duration
+        results[scale]['candidaturesFileSize'] = os.path.getsize(sources['CANDIDATURE_SOURCE'])
+    print(format_report(results))
+    if args.output:
+        save_results(dict(date=time.strftime('%Y-%m-%dT%H:%M:%S'), chunkSize=args.chunk_size,
+                          mongomock=args.mongomock, scales=results), args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
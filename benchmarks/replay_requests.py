@@ -0,0 +1,153 @@
+"""
+Replay of requests recorded by monitoring.request_recorder (REQUEST_RECORDING_ENABLED).
+
+Recorded requests are sent to the API started in process from a configuration (as load_benchmark does) or to an
+already running API (--url), either at their original pacing (--speed to accelerate it) or as fast as possible
+(--asap) with concurrent clients. Latencies are reported per route, with the recorded ones for comparison, and the
+replayed responses whose status differs from the recorded one are counted. Replaying production traffic on a freshly
+started server also warms its caches.
+
+Usage (from the project root):
+    python -m benchmarks.replay_requests -c ./config.py local/requests.jsonl local/requests.jsonl.1 --asap
+    python -m benchmarks.replay_requests --url http://127.0.0.1:5001 local/requests.jsonl --speed 2
+"""
+import json
+import logging
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from benchmarks.bench_utils import ServerThread, save_results, summarize_latencies
+from benchmarks.load_benchmark import format_summary, http_request, start_api, summarize_samples
+from utils.loggingUtils import configure_logging
+
+LOG = logging.getLogger(__name__)
+
+
+def read_recorded_requests(filepaths: List[str]) -> Iterator[Dict]:
+    """
+    Read recorded requests of files, in time order
+    :param filepaths: the recorded files (rotated files included)
+    :return: the recorded requests
+    """
+    records = []
+    for filepath in filepaths:
+        with open(filepath, encoding='utf-8') as recorded_file:
+            for line_no, line in enumerate(recorded_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    LOG.warning("Skip invalid line %d of %s", line_no, filepath)
+    return iter(sorted(records, key=lambda r: r['ts']))
+
+
+def _to_scenario(record: Dict) -> Dict:
+    path = record['path'] + ('?' + record['query'] if record.get('query') else '')
+    return dict(name='%s %s' % (record['method'], record.get('route') or record['path']), method=record['method'],
+                path=path, body=record.get('body'))
+
+
+def replay(base_url: str, records: Iterator[Dict], asap: bool, speed: float,
+           concurrency: int) -> (List, List, int, float):
+    """
+    Replay recorded requests
+    :param base_url: the base url of the API
+    :param records: the recorded requests, in time order
+    :param asap: send requests as fast as possible instead of at their original pacing
+    :param speed: the acceleration factor of the original pacing
+    :param concurrency: the maximum number of concurrent requests
+    :return: the samples (route, latency, status, size), the recorded samples, the number of responses whose status
+             differs from the recorded one and the elapsed time
+    """
+    samples, recorded_samples, mismatches = [], [], [0]
+    lock = threading.Lock()
+
+    def send(scenario: Dict, record: Dict):
+        start = time.perf_counter()
+        try:
+            status, size = http_request(base_url, scenario)
+        except OSError as e:
+            LOG.debug("Request error on %s: %s", scenario['path'], str(e))
+            status, size = 0, 0
+        with lock:
+            samples.append((scenario['name'], time.perf_counter() - start, status, size))
+            if status != record.get('status'):
+                mismatches[0] += 1
+
+    replay_start = time.perf_counter()
+    first_ts = None
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            scenario = _to_scenario(record)
+            recorded_samples.append((scenario['name'], record.get('latency', 0.), record.get('status', 0),
+                                     record.get('size') or 0))
+            if not asap:
+                first_ts = record['ts'] if first_ts is None else first_ts
+                delay = replay_start + (record['ts'] - first_ts) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            executor.submit(send, scenario, record)
+    return samples, recorded_samples, mismatches[0], time.perf_counter() - replay_start
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Replay of recorded requests")
+    parser.add_argument('files', help="Recorded requests files", nargs='+')
+    parser.add_argument('-c', '--config', help="Configuration file location (default: ./config.py)",
+                        metavar='<configuration file>', type=str, default='./config.py')
+    parser.add_argument('-l', '--log-level', help="Level of logger", metavar='<logging level>', type=str,
+                        default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'FATAL'])
+    parser.add_argument('--url', help="Replay on an already running API at this base url instead of starting it",
+                        type=str, default=None)
+    parser.add_argument('--mongomock', help="Use an in-process mongomock stand-in instead of mongo",
+                        action='store_true')
+    parser.add_argument('--seed', help="(Re-)Build the mongo cache from the sources of the configuration first",
+                        action='store_true')
+    parser.add_argument('--asap', help="Send requests as fast as possible instead of at their original pacing",
+                        action='store_true')
+    parser.add_argument('--speed', help="Acceleration factor of the original pacing (default: 1)", type=float,
+                        default=1.)
+    parser.add_argument('--concurrency', help="Maximum number of concurrent requests (default: 8)", type=int,
+                        default=8)
+    parser.add_argument('--output', help="Write the results in this JSON file", type=str, default=None)
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    server: Optional[ServerThread] = None
+    base_url = args.url
+    if base_url is None:
+        server = start_api(args.config, args.log_level, args.mongomock, args.seed)
+        base_url = server.url
+    try:
+        samples, recorded_samples, status_mismatches, elapsed = replay(
+            base_url, read_recorded_requests(args.files), args.asap, args.speed, args.concurrency)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    summary = summarize_samples(samples, elapsed)
+    recorded_latencies = dict()
+    for name, latency, _, _ in recorded_samples:
+        recorded_latencies.setdefault(name, []).append(latency)
+        recorded_latencies.setdefault('*ALL*', []).append(latency)
+    recorded_summary = dict((name, summarize_latencies(latencies)) for name, latencies in recorded_latencies.items())
+    print("Replayed:")
+    print(format_summary(summary))
+    print("Recorded latencies (ms):")
+    for name, s in sorted(recorded_summary.items()):
+        print("{:<48} p50 {:>10} p95 {:>10} p99 {:>10}".format(name, s['p50Ms'], s['p95Ms'], s['p99Ms']))
+    print("Responses with a status different from the recorded one: %d" % status_mismatches)
+    if args.output:
+        save_results(dict(date=time.strftime('%Y-%m-%dT%H:%M:%S'), url=args.url, asap=args.asap, speed=args.speed,
+                          concurrency=args.concurrency, duration=round(elapsed, 3), scenarios=summary,
+                          recorded=recorded_summary, statusMismatches=status_mismatches), args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
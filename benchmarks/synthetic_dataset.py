@@ -0,0 +1,148 @@
+"""
+Synthetic dataset generator: scale the source files of the configuration by an integer factor.
+
+The candidatures and insertions pro files are replicated scale times. Copies other than the first one get suffixed
+etablissement UAIs and names and formation IFCs, so that the catalogue grows with the scale, and jittered counts and
+rates. The numeric values of a row are all jittered by the same random factor, so that the relations between them
+hold in copies (women and categories within totals, accepted <= proposed <= ranked <= candidates, regional salary
+quartiles...). Empty and non numeric values are kept as is, so that NaN patterns and bad rows of the sources are
+preserved.
+Academies, sectors, mentions, the disciplines mapping and cities are nomenclatures: they are not scaled, and the
+mapping and cities files are copied.
+
+Usage (from the project root):
+    python -m benchmarks.synthetic_dataset -c ./config.py --scale 10 --output-dir ./local/synthetic_x10
+"""
+import logging
+import os
+import shutil
+import sys
+from argparse import ArgumentParser
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from MongoCacheBuilder import read_py_file_config
+from masterStats.loading.candidatures_loading import use_cand_cols
+from masterStats.loading.insertion_pro_loading import use_ins_cols
+from utils.loggingUtils import configure_logging
+
+__all__ = ['generate_synthetic_dataset', 'scale_csv']
+
+LOG = logging.getLogger(__name__)
+
+# capacity, counts and rank of the last accepted candidate: all of them scale with the size of the formation
+CAND_JITTERED_COLS = use_cand_cols[16:]
+INS_JITTERED_COLS = use_ins_cols[6:]
+# insertions pro columns holding percentages
+INS_RATE_COLS = [col for col in INS_JITTERED_COLS if col.startswith(('taux', 'emplois', 'poids', 'de_', 'femmes'))]
+
+READ_CHUNK_SIZE = 50000
+
+
+def _jitter_column(serie: pd.Series, factors: np.ndarray, max_value: float = None) -> pd.Series:
+    """
+    Jitter the numeric values of a column. Integers are rounded down: with the same factor for all the columns of a
+    row, a value lower than another one, or than a sum of other ones, stays so (a downward bias below one unit).
+    :param serie: the raw values of the column
+    :param factors: the jitter factor of each row
+    :param max_value: the upper bound of values (100 for percentages), None for none
+    :return: the jittered raw values
+    """
+    # only numeric values are jittered: empty strings and markers (ns, nd...) keep their place
+    values = pd.to_numeric(serie, errors='coerce')
+    numeric = values.notna()
+    if not numeric.any():
+        return serie
+    jittered = values[numeric] * factors[numeric.to_numpy()]
+    if max_value is not None:
+        jittered = jittered.clip(upper=max_value)
+    decimals = serie[numeric].str.contains('.', regex=False)
+    formatted = np.where(decimals, jittered.round(1).astype(str), np.floor(jittered).astype(np.int64).astype(str))
+    result = serie.copy()
+    result[numeric] = formatted
+    return result
+
+
+def _suffix_column(serie: pd.Series, suffix: str) -> pd.Series:
+    # keep empty values empty: they mark bad rows
+    return serie.where(serie == '', serie + suffix)
+
+
+def scale_csv(source: str, destination: str, scale: int, suffixed_cols: List[str], jittered_cols: List[str],
+              rate_cols: List[str], rng: np.random.Generator, amplitude: float = 0.2, sep: str = ';'):
+    """
+    Write a CSV made of scale copies of a source CSV, read and written by chunks
+    :param source: the source CSV
+    :param destination: the scaled CSV
+    :param scale: the number of copies
+    :param suffixed_cols: the identifier columns suffixed in copies other than the first one
+    :param jittered_cols: the numeric columns jittered in copies other than the first one, by the same factor per row
+    :param rate_cols: the jittered columns holding percentages (bounded to 100)
+    :param rng: the random generator
+    :param amplitude: the relative amplitude of the jitter
+    :param sep: the CSV separator
+    """
+    first_chunk = True
+    for copy_idx in range(scale):
+        # all values as raw strings: the written file keeps the source formatting
+        with pd.read_csv(source, sep=sep, dtype=str, keep_default_na=False, chunksize=READ_CHUNK_SIZE) as reader:
+            for chunk in reader:
+                if copy_idx > 0:
+                    for col in suffixed_cols:
+                        if col in chunk.columns:
+                            chunk[col] = _suffix_column(chunk[col], '-S%d' % copy_idx)
+                    # one factor per row, shared by its related values
+                    factors = rng.uniform(1. - amplitude, 1. + amplitude, len(chunk))
+                    for col in jittered_cols:
+                        if col in chunk.columns:
+                            chunk[col] = _jitter_column(chunk[col], factors, 100. if col in rate_cols else None)
+                chunk.to_csv(destination, sep=sep, index=False, header=first_chunk, mode='w' if first_chunk else 'a')
+                first_chunk = False
+
+
+def generate_synthetic_dataset(config: Dict, scale: int, output_dir: str, random_seed: int = 42) -> Dict[str, str]:
+    """
+    Generate the scaled source files of a configuration
+    :param config: the configuration giving the source files
+    :param scale: the scale factor
+    :param output_dir: the output directory
+    :param random_seed: the seed of the jitter
+    :return: the configuration keys of the sources (CANDIDATURE_SOURCE...) -> generated file paths
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(random_seed)
+    sources = dict((key, os.path.join(output_dir, os.path.basename(config[key])))
+                   for key in ['CANDIDATURE_SOURCE', 'INSERTION_SOURCE', 'DISC_MAPPING_SOURCE', 'CITIES_SOURCE'])
+    LOG.info("Generate candidatures x%d", scale)
+    scale_csv(config['CANDIDATURE_SOURCE'], sources['CANDIDATURE_SOURCE'], scale, ['eta_uai', 'eta_nom', 'ifc'],
+              CAND_JITTERED_COLS, [], rng)
+    LOG.info("Generate insertions pro x%d", scale)
+    scale_csv(config['INSERTION_SOURCE'], sources['INSERTION_SOURCE'], scale, ['numero_de_l_etablissement'],
+              INS_JITTERED_COLS, INS_RATE_COLS, rng)
+    for key in ['DISC_MAPPING_SOURCE', 'CITIES_SOURCE']:
+        shutil.copyfile(config[key], sources[key])
+    return sources
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Scaled synthetic source files generator")
+    parser.add_argument('-c', '--config', help="Configuration file giving the source files (default: ./config.py)",
+                        metavar='<configuration file>', type=str, default='./config.py')
+    parser.add_argument('-l', '--log-level', help="Level of logger", metavar='<logging level>', type=str,
+                        default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'FATAL'])
+    parser.add_argument('--scale', help="Scale factor (default: 10)", type=int, default=10)
+    parser.add_argument('--output-dir', help="Output directory", type=str, required=True)
+    parser.add_argument('--random-seed', help="Seed of the jitter", type=int, default=42)
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    sources = generate_synthetic_dataset(read_py_file_config(args.config), args.scale, args.output_dir,
+                                         args.random_seed)
+    for key, path in sources.items():
+        print("%s = '%s'" % (key, path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,13 +11,95 @@ MONGO_DATABASE = 'masters'
 MONGO_USERNAME = 'root'
 MONGO_PASSWORD = 'rootpassword'
 MONGO_AUTH_SOURCE = 'admin'
+# Log find/aggregate/count commands slower than MONGO_SLOW_QUERY_MS (e.g. 200) with their filter shape, disabled if
+# None. If MONGO_SLOW_QUERY_EXPLAIN, their explain plan is logged too, at most once per filter shape and interval (in s.)
+MONGO_SLOW_QUERY_MS = None
+MONGO_SLOW_QUERY_EXPLAIN = False
+MONGO_SLOW_QUERY_EXPLAIN_INTERVAL = 300
 
 # DATA SOURCE
+# Where the API loads academies, etablissements, sect. disc. and mentions from: 'mongo' (collections written by
+# the cache builder), 'csv' (CSV files below) or 'auto' (mongo if the collections are built, CSV otherwise)
+API_REFERENCE_SOURCE = 'auto'
 CANDIDATURE_SOURCE = 'local/fr-esr-mon_master.csv'
 INSERTION_SOURCE = 'local/fr-esr-insertion_professionnelle-master.csv'
 DISC_MAPPING_SOURCE = 'local/mappingCandIns.csv'
 CITIES_SOURCE = 'local/cities.csv'
 
+# STATS SEARCH
+# Backend of stats search: 'mongo' (queries on the mongo cache) or 'pandas' (in-memory search, stats being loaded
+# from the mongo cache at startup)
+STATS_SEARCH_BACKEND = 'mongo'
+# Identical concurrent stats searches (same filters and harvest, whatever the order of values) of a worker process
+# are computed once, and share the serialized result
+SEARCH_COALESCING_ENABLED = True
+# Admission control of stats searches, per worker process, from a cost estimated before fetching (cheap counts).
+# Searches returning more than SEARCH_MAX_ROWS rows or about SEARCH_MAX_BYTES bytes are rejected: clients must add
+# filters or paginate (harvest offset/limit). At most SEARCH_EXPENSIVE_CONCURRENCY searches of more than
+# SEARCH_EXPENSIVE_ROWS rows run at a time, other ones wait up to SEARCH_EXPENSIVE_QUEUE_TIMEOUT s. before a 429.
+# None disables a limit.
+SEARCH_MAX_ROWS = 50000
+SEARCH_MAX_BYTES = None
+SEARCH_EXPENSIVE_ROWS = 5000
+SEARCH_EXPENSIVE_CONCURRENCY = 2
+SEARCH_EXPENSIVE_QUEUE_TIMEOUT = 10
+# Max-age (in s.) of GET stats search responses in HTTP caches. Responses hold an ETag tied to the dataset version,
+# so that caches revalidate them after a cache rebuild.
+SEARCH_HTTP_CACHE_MAX_AGE = 3600
+# Maximum number of stats rows of rankings (/api/rest/stats/top?metric=...&k=...)
+TOP_MAX_K = 100
+# Build in-memory data cubes of stats at startup (sums and counts of metrics per year, academie and secteur
+# disciplinaire, or insertions pro discipline), served by /api/rest/stats/cube
+DATA_CUBE_ENABLED = False
+# Hold the formation catalogue in memory (index by ifc, secondary indexes of etablissement, secteur disciplinaire and
+# departement filters, pre-rendered dicts): formation lookups and searches without text do not query mongo
+FORMATION_CATALOGUE_ENABLED = True
+# Search formations (/api/rest/formations?q=) with an in-memory French full-text index built at startup (folding,
+# stemming, prefix matching of the last word, BM25 ranking) instead of the mongo text index
+FORMATION_TEXT_INDEX_ENABLED = True
+# Type-ahead suggestions (/api/rest/suggest?q=<prefix>&kind=...) of mentions, formations, etablissements and cities,
+# from an in-memory prefix index built at startup, the most popular (number of candidates) first. At most
+# SUGGEST_MAX_LIMIT suggestions are given by request.
+SUGGEST_ENABLED = True
+SUGGEST_MAX_LIMIT = 50
+# Maximum number of formations compared at once (/api/rest/formations/compare?ifc=...)
+COMPARE_MAX_FORMATIONS = 50
+
+# CACHE BUILDING
+# Number of CSV rows read at once by the cache builder. If set, stats are streamed to mongo chunk by chunk so that
+# memory stays bounded by the chunk size. If None, CSV files are fully loaded in memory.
+BUILD_CHUNK_SIZE = None
+# Use compact dtypes (categoricals, nullable small integers, float32) for in-memory stats frames.
+# Counts are then stored as integers in the mongo cache, and missing ones as null instead of NaN.
+COMPACT_STATS_DTYPES = False
+
+# MONITORING
+# Measure per route latency and stages of requests. Metrics are exposed at /api/admin/metrics (admin API)
+ENABLE_METRICS = True
+# Profile requests holding the PROFILING_HEADER header with cProfile and tracemalloc (top functions, cumulative
+# times, allocations). With the header value 'inline', the report replaces the response; otherwise it is stored in
+# PROFILING_OUTPUT_DIR and its id given by the X-Profile-Id response header. Only for diagnosis: slows requests down.
+# Requests must also provide ADMIN_API_TOKEN (see ADMIN API), no request is profiled without it.
+ENABLE_PROFILING = False
+PROFILING_HEADER = 'X-Profile'
+PROFILING_OUTPUT_DIR = None
+PROFILING_TOP_FUNCTIONS = 30
+# Record a sample (REQUEST_RECORDING_SAMPLE_RATE, from 0 to 1) of requests on REQUEST_RECORDING_PATHS as JSON lines
+# in REQUEST_RECORDING_FILE, rotated every REQUEST_RECORDING_MAX_BYTES. Use a {pid} placeholder in the file name
+# with several workers. Recorded files can be replayed with benchmarks/replay_requests.py
+REQUEST_RECORDING_ENABLED = False
+REQUEST_RECORDING_FILE = 'local/requests.jsonl'
+REQUEST_RECORDING_SAMPLE_RATE = 1.0
+REQUEST_RECORDING_PATHS = ['/api/rest/stats/search', '/api/rest/formations']
+REQUEST_RECORDING_MAX_BYTES = 50 * 2 ** 20
+REQUEST_RECORDING_BACKUP_COUNT = 5
+
+# ADMIN API
+# Enable /api/admin/* endpoints (memory report, metrics...). If ADMIN_API_TOKEN is set, requests must provide it
+# with the X-Admin-Token header or as a bearer token
+ENABLE_ADMIN_API = False
+ADMIN_API_TOKEN = None
+
 # DEV CONFIG
 # use 0.0.0.0:5000 for a docker deployment
 SERVER_HOST_DEV = '127.0.0.1'
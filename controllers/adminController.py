@@ -0,0 +1,33 @@
+import logging
+
+from flask import Blueprint, Response, jsonify, request, current_app
+from prometheus_client import CONTENT_TYPE_LATEST
+from werkzeug.exceptions import Forbidden
+
+from masterStats.MasterStatsManager import MasterStatsManager
+from monitoring.metrics import generate_metrics_output
+
+__all__ = ['admin_controller']
+
+admin_controller = Blueprint('admin', __name__)
+
+LOG = logging.getLogger(__name__)
+
+
+@admin_controller.before_request
+def check_admin_token():
+    admin_token = current_app.config.get('ADMIN_API_TOKEN')
+    # Token given either with X-Admin-Token or as a bearer token (Prometheus scrape config)
+    if admin_token and request.headers.get('X-Admin-Token') != admin_token \
+            and request.headers.get('Authorization') != 'Bearer ' + admin_token:
+        raise Forbidden('Jeton d\'administration invalide')
+
+
+@admin_controller.route("/api/admin/memory", methods=['GET'])
+def get_memory_report():
+    return jsonify(MasterStatsManager().memory_report())
+
+
+@admin_controller.route("/api/admin/metrics", methods=['GET'])
+def get_metrics():
+    return Response(generate_metrics_output(), mimetype=CONTENT_TYPE_LATEST)
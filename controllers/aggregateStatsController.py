@@ -0,0 +1,44 @@
+import logging
+
+from flask import request, Blueprint, jsonify, abort
+
+from controllers.http_cache_management import dataset_cached_response
+from masterStats.search.StatSearchOptions import StatSearchOptions
+from masterStats.stat_aggregate_engine import aggregate_candidatures, aggregate_stats, query_data_cube, \
+    get_time_series
+
+__all__ = ['aggregate_stats_controller']
+
+aggregate_stats_controller = Blueprint('aggregate-stats', __name__)
+
+LOG = logging.getLogger(__name__)
+
+
+@aggregate_stats_controller.route("/api/rest/stats/aggregate", methods=['GET'])
+def get_stats_aggregate():
+    args = request.args.to_dict(flat=False)
+    group_by = [d.strip() for v in args.pop('groupBy', []) for d in v.split(',') if d.strip()]
+    counters = [c.strip() for v in args.pop('counters', []) for c in v.split(',') if c.strip()]
+    return dataset_cached_response(request.query_string.decode('utf-8'),
+                                   lambda: jsonify(aggregate_candidatures(group_by, args, counters or None)))
+
+
+@aggregate_stats_controller.route("/api/rest/stats/aggregate", methods=['POST'])
+def post_stats_aggregate():
+    if not request.is_json:
+        abort(code=400)
+    return jsonify(aggregate_stats(request.get_json(force=False)))
+
+
+@aggregate_stats_controller.route("/api/rest/stats/cube", methods=['GET'])
+def get_stats_cube():
+    args = request.args.to_dict(flat=False)
+    group_by = args.pop('groupBy', [None])[-1]
+    metrics = [m.strip() for v in args.pop('metrics', []) for m in v.split(',') if m.strip()]
+    search_options = StatSearchOptions.create_from_query_args(args)
+    return jsonify(query_data_cube(search_options, group_by, metrics or None))
+
+
+@aggregate_stats_controller.route("/api/rest/stats/series/<level>/<key>", methods=['GET'])
+def get_stats_time_series(level: str, key: str):
+    return dataset_cached_response('%s:%s' % (level, key), lambda: jsonify(get_time_series(level, key)))
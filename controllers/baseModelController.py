@@ -1,10 +1,12 @@
 import logging
+from typing import Optional
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from werkzeug.exceptions import NotFound
 
-from controllers.http_cache_management import http_cached
+from controllers.http_cache_management import dataset_cached_response, http_cached
 from masterStats.MasterStatsManager import MasterStatsManager
+from masterStats.formation_compare_engine import compare_formations
 
 __all__ = ['base_model_controller']
 
@@ -49,12 +51,47 @@ def get_formations():
     depts = request.args.getlist('dept')
     search = request.args.get('q')
     full_details = request.args.get('full-details')
+    # Potential geographic search: around a point, within a radius and/or the nearest formations
+    latitude = _float_arg('lat')
+    longitude = _float_arg('lon')
+
+    if latitude is None and longitude is None:
+        formations = MasterStatsManager().search_formations(etab_uais, sec_disc_ids, depts, search)
+        if full_details and full_details.lower() not in ['no', '0', 'false']:
+            return MasterStatsManager().formations_to_dicts(formations, full_details=True)
+        else:
+            return MasterStatsManager().formations_to_dicts(formations)
+    if latitude is None or longitude is None:
+        raise ValueError("Attributes lat and lon should be given together.")
+    nearest = request.args.get('nearest')
+    try:
+        nearest = int(nearest) if nearest is not None else None
+    except ValueError:
+        raise ValueError("Attribute nearest should be an integer.")
+    formations_distances = MasterStatsManager().search_formations_near(
+        etab_uais, sec_disc_ids, depts, search, latitude, longitude, _float_arg('radiusKm'), nearest)
+    formations_dicts = MasterStatsManager().formations_to_dicts(
+        [f for f, _ in formations_distances],
+        full_details=bool(full_details and full_details.lower() not in ['no', '0', 'false']))
+    return [dict(fd, distanceKm=round(d, 3)) for fd, (_, d) in zip(formations_dicts, formations_distances)]
+
+
+def _float_arg(name: str) -> Optional[float]:
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError("Attribute %s should be a number." % name)
 
-    formations = MasterStatsManager().search_formations(etab_uais, sec_disc_ids, depts, search)
-    if full_details and full_details.lower() not in ['no', '0', 'false']:
-        return [f.to_full_dict() for f in formations]
-    else:
-        return [f.to_small_dict() for f in formations]
+
+@base_model_controller.route("/api/rest/formations/compare", methods=['GET'])
+def get_formations_comparison():
+    ifcs = [ifc.strip() for v in request.args.getlist('ifc') for ifc in v.split(',') if ifc.strip()]
+    # duplicates removed, order kept
+    ifcs = list(dict.fromkeys(ifcs))
+    return dataset_cached_response(','.join(ifcs), lambda: jsonify(compare_formations(ifcs)))
 
 
 @base_model_controller.route("/api/rest/formations/<ifc>", methods=['GET'])
@@ -64,8 +101,26 @@ def get_formation(ifc: str):
     try:
         formation = MasterStatsManager().find_formation_by_ifc(ifc)
         if full_details and full_details.lower() not in ['no', '0', 'false']:
-            return formation.to_full_dict()
+            return MasterStatsManager().formations_to_dicts([formation], full_details=True)[0]
         else:
-            return formation.to_small_dict()
+            return MasterStatsManager().formations_to_dicts([formation])[0]
     except KeyError:
         raise NotFound('IFC de formation inconnu')
+
+
+@base_model_controller.route("/api/rest/suggest", methods=['GET'])
+def get_suggestions():
+    suggest_index = MasterStatsManager().suggest_index
+    if suggest_index is None:
+        raise NotFound('Index de suggestions non construit (SUGGEST_ENABLED)')
+    prefix = request.args.get('q', '')
+    kinds = [k.strip() for v in request.args.getlist('kind') for k in v.split(',') if k.strip()]
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        raise ValueError("Attribute limit should be an integer.")
+    max_limit = current_app.config.get('SUGGEST_MAX_LIMIT', 50)
+    if not 0 < limit <= max_limit:
+        raise ValueError("Attribute limit should be between 1 and %d." % max_limit)
+    return dataset_cached_response(request.query_string.decode('utf-8'),
+                                   lambda: jsonify(suggest_index.suggest(prefix, kinds or None, limit)))
@@ -31,7 +31,9 @@ def handle_not_found(e):
 
 @error_handler.app_errorhandler(HTTPException)
 def handle_other_http_exception(e: HTTPException):
-    return ErrorMessage(error=e.description, details=str(e), code=e.code), e.code
+    # keep specific headers (Retry-After...)
+    headers = [(k, v) for k, v in e.get_headers() if k != 'Content-Type']
+    return ErrorMessage(error=e.description, details=str(e), code=e.code), e.code, headers
 
 
 @error_handler.app_errorhandler(Exception)
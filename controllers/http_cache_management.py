@@ -1,5 +1,48 @@
+import hashlib
 from functools import wraps
-from flask import Response
+from typing import Callable, Optional
+
+from flask import Response, current_app, request
+
+from masterStats.MasterStatsManager import MasterStatsManager
+
+
+def set_http_cache_headers(response: Response, max_age: int = 86400, public: bool = True, immutable: bool = True):
+    response.cache_control.public = public
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable
+
+
+def dataset_etag(dataset_version: Optional[str], key: str) -> Optional[str]:
+    """
+    Give the ETag of a response computed from the dataset
+    :param dataset_version: the version of the dataset, see MasterStatsManager.get_dataset_version
+    :param key: the key of the response in a dataset version (canonical query...)
+    :return: the ETag, None if the dataset version is unknown
+    """
+    if dataset_version is None:
+        return None
+    return hashlib.sha1(('%s|%s' % (dataset_version, key)).encode('utf-8')).hexdigest()
+
+
+def dataset_cached_response(key: str, build_response: Callable[[], Response]) -> Response:
+    """
+    Give a response computed from the dataset, with an ETag tied to the dataset version: 304 if the client already
+    holds it. The dataset changes on cache rebuild, so HTTP caches keep it SEARCH_HTTP_CACHE_MAX_AGE s. then revalidate.
+    :param key: the key of the response in a dataset version (canonical query...)
+    :param build_response: builds the response, only called without a matching If-None-Match
+    :return: the response, with its ETag and cache headers
+    """
+    etag = dataset_etag(MasterStatsManager().get_dataset_version(), key)
+    if etag is not None and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = build_response()
+    if etag is not None:
+        response.set_etag(etag)
+    set_http_cache_headers(response, max_age=current_app.config.get('SEARCH_HTTP_CACHE_MAX_AGE', 3600),
+                           immutable=False)
+    return response
 
 
 def http_cached(max_age: int = 86400, public: bool = True, immutable: bool = True):
@@ -8,9 +51,7 @@ def http_cached(max_age: int = 86400, public: bool = True, immutable: bool = Tru
         def wrapper(*args, **kwargs):
             result = func(*args, **kwargs)
             if isinstance(result, Response):
-                result.cache_control.public = public
-                result.cache_control.max_age = max_age
-                result.cache_control.immutable = immutable
+                set_http_cache_headers(result, max_age, public, immutable)
             return result
 
         return wrapper
@@ -1,7 +1,12 @@
 import logging
-from flask import request, Blueprint, abort, jsonify
+from flask import request, Blueprint, abort, jsonify, current_app, Response, redirect, url_for
+
+from controllers.http_cache_management import dataset_cached_response
+from masterStats.SearchAdmission import SearchAdmission
 from masterStats.search.StatSearchOptions import StatSearchOptions
-from masterStats.stat_search_engine import search_stats
+from masterStats.stat_search_engine import search_stats, explain_search_stats, facet_candidatures, rank_stats
+from monitoring.metrics import count_coalesced_request
+from utils.SingleFlight import SingleFlight
 
 __all__ = ['search_stats_controller']
 
@@ -9,10 +14,27 @@ search_stats_controller = Blueprint('search-stats', __name__)
 
 LOG = logging.getLogger(__name__)
 
+# Canonical query string of the GET stats search with default options
+DEFAULT_SEARCH_QUERY = 'typeStats=all'
+
+# Identical concurrent searches of a worker process share the serialized result of the first one
+_search_single_flight = SingleFlight(wait_timeout=60.)
+
 
 @search_stats_controller.route("/api/rest/stats/search", methods=['GET'])
 def get_stats_search():
-    return jsonify(StatSearchOptions.get_search_option_template())
+    if not request.args:
+        return jsonify(StatSearchOptions.get_search_option_template())
+    stat_search_options = StatSearchOptions.create_from_query_args(request.args.to_dict(flat=False))
+    search_key = stat_search_options.canonicalize()
+    # a single URL per search, for HTTP caches. Without any parameter, the URL gives the template: the search with
+    # default options only has its own canonical form.
+    canonical_query = stat_search_options.to_query_string() or DEFAULT_SEARCH_QUERY
+    if request.query_string.decode('utf-8') != canonical_query:
+        # not permanent: the canonical form may change with the API
+        return redirect(url_for('.get_stats_search') + '?' + canonical_query, code=302)
+    return dataset_cached_response(canonical_query, lambda: Response(_search_body(search_key, stat_search_options),
+                                                                     mimetype='application/json'))
 
 
 @search_stats_controller.route("/api/rest/stats/search", methods=['POST'])
@@ -21,5 +43,68 @@ def post_stats_search():
         abort(code=400)
     data = request.get_json(force=False)
     stat_search_options = StatSearchOptions.create_from_request_data(data)
-    search_result = search_stats(stat_search_options)
-    return jsonify(search_result)
+    search_key = stat_search_options.canonicalize()
+    return Response(_search_body(search_key, stat_search_options), mimetype='application/json')
+
+
+def _search_body(search_key: str, stat_search_options: StatSearchOptions) -> str:
+    if not current_app.config.get('SEARCH_COALESCING_ENABLED', True):
+        return _admit_search_and_serialize(stat_search_options)
+    # admitted and serialized once by the leader
+    body, shared = _search_single_flight.do(search_key,
+                                            lambda: _admit_search_and_serialize(stat_search_options))
+    count_coalesced_request(shared)
+    return body
+
+
+def _admit_search_and_serialize(stat_search_options: StatSearchOptions) -> str:
+    search_admission = current_app.extensions.get('search_admission')
+    if search_admission is None:
+        search_admission = current_app.extensions.setdefault('search_admission',
+                                                             SearchAdmission(current_app.config))
+    # on the pandas backend, the search reuses the frame masks of its cost estimate
+    frame_filters = dict()
+    with search_admission.admit(stat_search_options, frame_filters):
+        return current_app.json.dumps(search_stats(stat_search_options, frame_filters))
+
+
+@search_stats_controller.route("/api/rest/stats/search/explain", methods=['POST'])
+def post_stats_search_explain():
+    if not request.is_json:
+        abort(code=400)
+    data = request.get_json(force=False)
+    stat_search_options = StatSearchOptions.create_from_request_data(data)
+    return jsonify(explain_search_stats(stat_search_options))
+
+
+@search_stats_controller.route("/api/rest/stats/search/facets", methods=['GET'])
+def get_stats_search_facets():
+    stat_search_options = StatSearchOptions.create_from_query_args(request.args.to_dict(flat=False))
+    return jsonify(facet_candidatures(stat_search_options))
+
+
+@search_stats_controller.route("/api/rest/stats/search/facets", methods=['POST'])
+def post_stats_search_facets():
+    if not request.is_json:
+        abort(code=400)
+    data = request.get_json(force=False)
+    stat_search_options = StatSearchOptions.create_from_request_data(data)
+    return jsonify(facet_candidatures(stat_search_options))
+
+
+@search_stats_controller.route("/api/rest/stats/top", methods=['GET'])
+def get_stats_top():
+    args = request.args.to_dict(flat=False)
+    metric = args.pop('metric', [None])[-1]
+    k = args.pop('k', ['10'])[-1]
+    order = args.pop('order', ['desc'])[-1]
+    if not metric:
+        raise ValueError("Attribute metric is required.")
+    try:
+        k = int(k)
+    except ValueError:
+        raise ValueError("Attribute k should be an integer.")
+    if order not in ('asc', 'desc'):
+        raise ValueError("Attribute order should be asc or desc.")
+    stat_search_options = StatSearchOptions.create_from_query_args(args)
+    return jsonify(rank_stats(stat_search_options, metric, k, ascending=order == 'asc'))
@@ -1,2 +1,12 @@
+import os
+
 bind = "127.0.0.1:5001"
-workers = 2
\ No newline at end of file
+workers = 2
+
+
+def child_exit(server, worker):
+    # Clean up the metrics files of dead workers (see monitoring.metrics), only shared with PROMETHEUS_MULTIPROC_DIR
+    # (start_server.sh): errors of this hook would stop the arbiter
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
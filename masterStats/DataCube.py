@@ -0,0 +1,125 @@
+import logging
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['DataCube']
+
+LOG = logging.getLogger(__name__)
+
+
+class DataCube:
+    """
+    Dense in-memory cube of stats: sums and non-null counts of metrics, and number of stats rows, per combination of
+    dimensions values. The first dimension is the year: arrays hold cumulative sums along it, so that any year range
+    is the difference of two slices.
+    Arrays shapes: (years + 1, other dimensions sizes..., metrics) for sums and counts, without metrics for rows.
+    """
+    __slots__ = ['dimensions', 'metrics', 'axes', '_cum_sums', '_cum_counts', '_cum_rows']
+
+    def __init__(self, stats_df: pd.DataFrame, dimensions: List[str], metrics: List[str]):
+        """
+        :param stats_df: the stats frame
+        :param dimensions: the columns of the cube axes, year first. Rows with a missing value are ignored.
+        :param metrics: the numeric columns to sum and count
+        """
+        self.dimensions: List[str] = dimensions
+        self.metrics: List[str] = metrics
+        stats_df = stats_df.loc[stats_df[dimensions].notna().all(axis=1), :]
+        self.axes: Dict[str, np.ndarray] = dict()
+        codes = []
+        for dim in dimensions:
+            dim_serie = stats_df[dim]
+            dim_values = dim_serie.to_numpy(dtype=np.int64) if pd.api.types.is_numeric_dtype(dim_serie) \
+                else dim_serie.astype(str).to_numpy()
+            axis, dim_codes = np.unique(dim_values, return_inverse=True)
+            self.axes[dim] = axis
+            codes.append(dim_codes)
+        shape = tuple(len(self.axes[dim]) for dim in dimensions)
+        size = int(np.prod(shape))
+        flat_codes = np.ravel_multi_index(codes, shape) if codes else np.zeros(0, dtype=np.int64)
+        sums = np.zeros((size, len(metrics)))
+        counts = np.zeros((size, len(metrics)), dtype=np.int64)
+        for i, metric in enumerate(metrics):
+            values = stats_df[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+            known = ~np.isnan(values)
+            sums[:, i] = np.bincount(flat_codes[known], weights=values[known], minlength=size)
+            counts[:, i] = np.bincount(flat_codes[known], minlength=size)
+        rows = np.bincount(flat_codes, minlength=size)
+        self._cum_sums = self._cumulate(sums.reshape(shape + (len(metrics),)))
+        self._cum_counts = self._cumulate(counts.reshape(shape + (len(metrics),)))
+        self._cum_rows = self._cumulate(rows.reshape(shape))
+
+    @staticmethod
+    def _cumulate(array: np.ndarray) -> np.ndarray:
+        cum = np.zeros((array.shape[0] + 1,) + array.shape[1:], dtype=array.dtype)
+        np.cumsum(array, axis=0, out=cum[1:])
+        return cum
+
+    def memory_usage(self) -> Dict:
+        usage = dict(sums=self._cum_sums.nbytes, counts=self._cum_counts.nbytes, rows=self._cum_rows.nbytes)
+        usage.update(('axis:' + dim, int(axis.nbytes)) for dim, axis in self.axes.items())
+        return dict(total=int(sum(usage.values())), columns=usage)
+
+    def aggregate(self, selections: Dict[str, Optional[Sequence]], year_min=None, year_max=None,
+                  group_by: Optional[str] = None, metrics: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Aggregate the stats of selected dimensions values, by array slicing
+        :param selections: dimension -> the selected values, None for all of them. Unknown values are ignored.
+        :param year_min: the first year (included), None for no limit
+        :param year_max: the last year (excluded), None for no limit
+        :param group_by: the dimension to group on, None for a single total
+        :param metrics: the metrics to give (default: all of them)
+        :return: per group, its dimension value (if grouped), its number of stats rows, and the sums, non-null
+        counts and means of metrics
+        """
+        year_dim = self.dimensions[0]
+        years = self.axes[year_dim]
+        metric_idx = [self.metrics.index(m) for m in metrics] if metrics else list(range(len(self.metrics)))
+        # year range first, on cumulative arrays
+        lo = 0 if year_min is None else int(np.searchsorted(years, year_min, side='left'))
+        hi = len(years) if year_max is None else int(np.searchsorted(years, year_max, side='left'))
+        hi = max(lo, hi)
+        indexes = [self._select(dim, selections.get(dim)) for dim in self.dimensions]
+        year_idx = indexes[0][(indexes[0] >= lo) & (indexes[0] < hi)]
+        if group_by == year_dim or len(year_idx) < hi - lo:
+            # per year values
+            sums = self._cum_sums[year_idx + 1] - self._cum_sums[year_idx]
+            counts = self._cum_counts[year_idx + 1] - self._cum_counts[year_idx]
+            rows = self._cum_rows[year_idx + 1] - self._cum_rows[year_idx]
+        else:
+            sums = (self._cum_sums[hi] - self._cum_sums[lo])[np.newaxis]
+            counts = (self._cum_counts[hi] - self._cum_counts[lo])[np.newaxis]
+            rows = (self._cum_rows[hi] - self._cum_rows[lo])[np.newaxis]
+        other_idx = np.ix_(*indexes[1:]) if len(indexes) > 1 else tuple()
+        sums = sums[(slice(None),) + other_idx][..., metric_idx]
+        counts = counts[(slice(None),) + other_idx][..., metric_idx]
+        rows = rows[(slice(None),) + other_idx]
+        # sum over every axis but the grouped one
+        group_axis = self.dimensions.index(group_by) if group_by is not None else None
+        sum_axes = tuple(a for a in range(len(self.dimensions)) if a != group_axis)
+        sums, counts, rows = sums.sum(axis=sum_axes), counts.sum(axis=sum_axes), rows.sum(axis=sum_axes)
+        metric_names = [self.metrics[i] for i in metric_idx]
+        if group_by is None:
+            return [self._to_result(rows, sums, counts, metric_names)]
+        group_values = years[year_idx] if group_by == year_dim else self.axes[group_by][indexes[group_axis]]
+        results = []
+        for i, value in enumerate(group_values):
+            result = {group_by: value.item() if hasattr(value, 'item') else value}
+            result.update(self._to_result(rows[i], sums[i], counts[i], metric_names))
+            results.append(result)
+        return results
+
+    def _select(self, dim: str, values: Optional[Sequence]) -> np.ndarray:
+        axis = self.axes[dim]
+        if values is None:
+            return np.arange(len(axis))
+        return np.flatnonzero(np.isin(axis, list(values)))
+
+    @staticmethod
+    def _to_result(rows, sums: np.ndarray, counts: np.ndarray, metric_names: List[str]) -> Dict:
+        return dict(rows=int(rows),
+                    sums=dict((m, float(s) if c else None) for m, s, c in zip(metric_names, sums, counts)),
+                    counts=dict((m, int(c)) for m, c in zip(metric_names, counts)),
+                    means=dict((m, float(s) / c if c else None) for m, s, c in zip(metric_names, sums, counts)))
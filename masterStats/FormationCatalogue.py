@@ -0,0 +1,122 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from masterStats.search.geo_utils import haversine_km, select_nearest
+from mongo.model.Formation import Formation
+
+__all__ = ['FormationCatalogue']
+
+LOG = logging.getLogger(__name__)
+
+
+class FormationCatalogue:
+    """
+    Immutable in-memory catalogue of formations, in mongo cache order: index by ifc, secondary indexes of the search
+    filters (etablissement, secteur disciplinaire and departement), coordinates arrays for geographic searches, and
+    small and full dicts of formations rendered once.
+    """
+    __slots__ = ['formations', '_positions', '_small_dicts', '_full_dicts', '_indexes', '_latitudes', '_longitudes',
+                 '_located']
+
+    # search filter -> formation field
+    INDEXED_FIELDS = {'etab_uais': 'etabUai', 'sec_disc_ids': 'sectDiscId', 'depts': 'dept'}
+
+    def __init__(self, formations: Iterable[Formation]):
+        self.formations: List[Formation] = list(formations)
+        self._positions: Dict[str, int] = dict((f.ifc, i) for i, f in enumerate(self.formations))
+        self._small_dicts: List[Dict] = [f.to_small_dict() for f in self.formations]
+        self._full_dicts: List[Dict] = [f.to_full_dict() for f in self.formations]
+        self._indexes: Dict[str, Dict[object, np.ndarray]] = dict()
+        for field in self.INDEXED_FIELDS.values():
+            field_positions: Dict[object, List[int]] = dict()
+            for i, formation in enumerate(self.formations):
+                value = getattr(formation, field)
+                if value is not None:
+                    field_positions.setdefault(value, []).append(i)
+            self._indexes[field] = dict((value, np.array(positions, dtype=np.int32))
+                                        for value, positions in field_positions.items())
+        self._latitudes: np.ndarray = np.array([f.latitude if f.latitude is not None else np.nan
+                                                for f in self.formations], dtype=np.float64)
+        self._longitudes: np.ndarray = np.array([f.longitude if f.longitude is not None else np.nan
+                                                 for f in self.formations], dtype=np.float64)
+        self._located: np.ndarray = ~(np.isnan(self._latitudes) | np.isnan(self._longitudes))
+        LOG.info("Formation catalogue built: %d formations", len(self.formations))
+
+    def __len__(self):
+        return len(self.formations)
+
+    def get(self, ifc: str) -> Optional[Formation]:
+        position = self._positions.get(ifc)
+        return self.formations[position] if position is not None else None
+
+    def filter(self, etab_uais: Optional[List[str]] = None, sec_disc_ids: Optional[List[int]] = None,
+               depts: Optional[List[int]] = None) -> List[Formation]:
+        """
+        Select formations by intersection of the secondary indexes of filters
+        :param etab_uais: the etablissements of formations, None for any
+        :param sec_disc_ids: the secteurs disciplinaires of formations, None for any
+        :param depts: the departements of formations, None for any
+        :return: the formations, in catalogue order
+        """
+        positions = self.filter_positions(etab_uais, sec_disc_ids, depts)
+        if positions is None:
+            return list(self.formations)
+        return [self.formations[i] for i in positions]
+
+    def filter_positions(self, etab_uais: Optional[List[str]] = None, sec_disc_ids: Optional[List[int]] = None,
+                         depts: Optional[List[int]] = None) -> Optional[np.ndarray]:
+        """
+        Select formations by intersection of the secondary indexes of filters, see filter
+        :return: the sorted positions of formations in the catalogue, None for all of them (no filter)
+        """
+        positions: Optional[np.ndarray] = None
+        for filter_name, values in (('etab_uais', etab_uais), ('sec_disc_ids', sec_disc_ids), ('depts', depts)):
+            if not values:
+                continue
+            index = self._indexes[self.INDEXED_FIELDS[filter_name]]
+            value_positions = [index[value] for value in values if value in index]
+            filter_positions = np.unique(np.concatenate(value_positions)) if value_positions \
+                else np.zeros(0, dtype=np.int32)
+            positions = filter_positions if positions is None \
+                else np.intersect1d(positions, filter_positions, assume_unique=True)
+        return positions
+
+    def positions_of(self, formations: Iterable[Formation]) -> np.ndarray:
+        """
+        :param formations: formations of the catalogue
+        :return: their positions in the catalogue, in the order of formations
+        """
+        return np.array([self._positions[f.ifc] for f in formations], dtype=np.int64)
+
+    def near(self, latitude: float, longitude: float, positions: Optional[np.ndarray] = None,
+             radius_km: Optional[float] = None, nearest: Optional[int] = None) -> List[Tuple[Formation, float]]:
+        """
+        Select formations around a point, from the coordinates arrays. Formations without coordinates are ignored.
+        :param latitude: the latitude of the point
+        :param longitude: the longitude of the point
+        :param positions: the positions of the formations to select from (see filter_positions), None for all of them
+        :param radius_km: the maximum distance (km), None for no limit
+        :param nearest: the maximum number of formations, None for no limit
+        :return: the formations with their distance (km), the nearest first
+        """
+        if positions is None:
+            positions = np.flatnonzero(self._located)
+        else:
+            positions = positions[self._located[positions]]
+        distances = haversine_km(latitude, longitude, self._latitudes[positions], self._longitudes[positions])
+        return [(self.formations[positions[i]], float(distances[i]))
+                for i in select_nearest(distances, radius_km, nearest)]
+
+    def to_dict(self, formation: Formation, full_details: bool = False) -> Dict:
+        """
+        Give the rendered dict of a formation, pre-rendered for formations of the catalogue
+        :param formation: the formation
+        :param full_details: True for its full dict, False for its small dict
+        :return: the dict, not to be modified
+        """
+        position = self._positions.get(formation.ifc)
+        if position is None or self.formations[position] is not formation:
+            return formation.to_full_dict() if full_details else formation.to_small_dict()
+        return self._full_dicts[position] if full_details else self._small_dicts[position]
@@ -1,13 +1,29 @@
 import logging
-from typing import Dict, Optional, List
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, List, Tuple
 
 import pandas as pd
+from pymongo.collection import Collection
 
+from masterStats.DataCube import DataCube
+from masterStats.FormationCatalogue import FormationCatalogue
 from masterStats.loading.candidatures_loading import load_candidates, create_academies, create_etablissements, \
-    create_secteur_disciplinaires, create_mentions, create_formations, create_stats_candidatures
+    create_secteur_disciplinaires, create_mentions, create_formations, create_stats_candidatures, \
+    iter_candidates_chunks, cand_ref_cols, use_cand_cols
 from masterStats.loading.cities_loading import load_cities
 from masterStats.loading.disc_mapping_loading import load_disc_mapping
-from masterStats.loading.insertion_pro_loading import load_insertionspro, create_stats_insertionspro
+from masterStats.loading.frame_compaction import compact_dataframe, dataframe_memory_usage
+from masterStats.loading.insertion_pro_loading import load_insertionspro, create_stats_insertionspro, \
+    iter_insertionspro_chunks, use_ins_cols
+from masterStats.search.FormationTextIndex import FormationTextIndex
+from masterStats.search.SuggestIndex import SuggestIndex
+from masterStats.search.geo_utils import check_geo_search, nearest_formations
+from masterStats.stat_rollups import ROLLUP_GROUPINGS, rollup_col_name, rollup_fields, compute_rollup, \
+    merge_rollups, generate_rollup_docs
+from masterStats.stat_time_series import TIME_SERIES_LEVELS, compute_time_series_part, merge_time_series_parts, \
+    generate_time_series_docs
 from mongo.dao.MongoDAO import MongoDAO
 from mongo.model.Candidature import Candidature
 from mongo.model.Formation import Formation
@@ -15,16 +31,30 @@ from mongo.model.InsertionPro import InsertionPro
 from mongo.repository.CandidatureRepository import CandidatureRepository
 from mongo.repository.FormationRepository import FormationRepository
 from mongo.repository.InsertionProRepository import InsertionProRepository
+from utils.FrameDerivedCache import FrameDerivedCache
 from utils.Singleton import Singleton
 
 __all__ = ['MasterStatsManager']
 
 LOG = logging.getLogger(__name__)
 
+DATASET_VERSION_TTL = 30.
+
+# Data cubes per type of stats: mongo collection, stats frame attribute, dimensions (year first) and metrics.
+# Regions and disciplines are not dimensions: they are sets of academies and secteurs disciplinaires.
+DATA_CUBES = {
+    'candidatures': (MongoDAO.candidature_col_name, '_stats_candidatures_df',
+                     ['anneeCollecte', 'academieId', 'secDiscId'], use_cand_cols[16:]),
+    'insertionsPro': (MongoDAO.insertionpro_col_name, '_stats_inspros_df',
+                      ['anneeCollecte', 'academieId', 'ins_disc', 'nbMoisApresDip'], use_ins_cols[6:]),
+}
+
 
 class MasterStatsManager(metaclass=Singleton):
     __slots__ = ['__configuration', '_academies_df', '_etablissements_df', '_sect_discs_df',
-                 '_mentions_df', '_formations_df', '_stats_candidatures_df', '_stats_inspros_df']
+                 '_mentions_df', '_formations_df', '_stats_candidatures_df', '_stats_inspros_df',
+                 '_memory_usage_before_compaction', '_dataset_version', '_dataset_version_read_time', '_data_cubes',
+                 '_formation_text_index', '_suggest_index', '_formation_catalogue', '_frame_derived_cache']
 
     """
     Index and Columns of datasets:
@@ -44,6 +74,14 @@ class MasterStatsManager(metaclass=Singleton):
         self._formations_df: Optional[pd.DataFrame] = None
         self._stats_candidatures_df: Optional[pd.DataFrame] = None
         self._stats_inspros_df: Optional[pd.DataFrame] = None
+        self._memory_usage_before_compaction: Dict[str, Dict] = dict()
+        self._dataset_version: Optional[str] = None
+        self._dataset_version_read_time: Optional[float] = None
+        self._data_cubes: Dict[str, DataCube] = dict()
+        self._formation_text_index: Optional[FormationTextIndex] = None
+        self._suggest_index: Optional[SuggestIndex] = None
+        self._formation_catalogue: Optional[FormationCatalogue] = None
+        self._frame_derived_cache: FrameDerivedCache = FrameDerivedCache()
 
     @property
     def configuration(self) -> Dict:
@@ -77,7 +115,32 @@ class MasterStatsManager(metaclass=Singleton):
     def stats_insertionspro_df(self) -> Optional[pd.DataFrame]:
         return self._stats_inspros_df
 
+    @property
+    def data_cubes(self) -> Dict[str, DataCube]:
+        return self._data_cubes
+
+    @property
+    def suggest_index(self) -> Optional[SuggestIndex]:
+        return self._suggest_index
+
+    @property
+    def formation_catalogue(self) -> Optional[FormationCatalogue]:
+        return self._formation_catalogue
+
+    @property
+    def frame_derived_cache(self) -> FrameDerivedCache:
+        """
+        Values derived from the stats frames by searches (facet codes, ranking metrics), dropped with their frame
+        """
+        return self._frame_derived_cache
+
     def find_formation_by_ifc(self, ifc: str):
+        if self._formation_catalogue is not None:
+            # the catalogue holds every formation: unknown ifcs are answered without querying mongo
+            formation = self._formation_catalogue.get(ifc)
+            if formation is None:
+                raise KeyError('IFC unknown for formation')
+            return formation
         mongo_dao = MongoDAO()
         formation_repo: FormationRepository = FormationRepository(mongo_dao.database)
         formation = formation_repo.find_one_by({'ifc': ifc})
@@ -94,11 +157,137 @@ class MasterStatsManager(metaclass=Singleton):
         if depts:
             depts_int = [int(dp) for dp in depts]
 
+        if text_search and self._formation_text_index is not None:
+            return self._formation_text_index.search(text_search, etab_uais, sec_disc_ids_int, depts_int)
+        if not text_search and self._formation_catalogue is not None:
+            return self._formation_catalogue.filter(etab_uais, sec_disc_ids_int, depts_int)
         mongo_dao = MongoDAO()
         formation_repo: FormationRepository = FormationRepository(mongo_dao.database)
         return list(formation_repo.find_by_criteria(etab_uais, sec_disc_ids_int, depts_int, text_search))
 
+    def search_formations_near(self, etab_uais: Optional[List[str]], sec_disc_ids: Optional[List[str]],
+                               depts: Optional[List[str]], text_search: Optional[str], latitude: float,
+                               longitude: float, radius_km: Optional[float],
+                               nearest: Optional[int]) -> List[Tuple[Formation, float]]:
+        """
+        Search formations around a point, within a radius and/or the nearest ones
+        :return: the formations with their distance (km), the nearest first
+        """
+        check_geo_search(latitude, longitude, radius_km, nearest)
+        catalogue = self._formation_catalogue
+        if catalogue is not None and (not text_search or self._formation_text_index is not None):
+            # distances from the coordinates arrays of the catalogue, for the formations matching filters or text
+            if text_search:
+                positions = catalogue.positions_of(self.search_formations(etab_uais, sec_disc_ids, depts,
+                                                                          text_search))
+            else:
+                positions = catalogue.filter_positions(etab_uais,
+                                                       [int(sd) for sd in sec_disc_ids] if sec_disc_ids else None,
+                                                       [int(dp) for dp in depts] if depts else None)
+            return catalogue.near(latitude, longitude, positions, radius_km, nearest)
+        if text_search:
+            # mongo text searches cannot be combined with the 2dsphere index: distances of matches are computed
+            return nearest_formations(self.search_formations(etab_uais, sec_disc_ids, depts, text_search),
+                                      latitude, longitude, radius_km, nearest)
+        formation_repo: FormationRepository = FormationRepository(MongoDAO().database)
+        return formation_repo.find_near(latitude, longitude, radius_km, nearest, etab_uais,
+                                        [int(sd) for sd in sec_disc_ids] if sec_disc_ids else None,
+                                        [int(dp) for dp in depts] if depts else None)
+
+    def formations_to_dicts(self, formations: List[Formation], full_details: bool = False) -> List[Dict]:
+        """
+        Render formations as served by the API, from the dicts pre-rendered by the catalogue if enabled
+        :param formations: the formations
+        :param full_details: True for full dicts, False for small dicts
+        :return: the dicts, not to be modified
+        """
+        if self._formation_catalogue is not None:
+            return [self._formation_catalogue.to_dict(f, full_details) for f in formations]
+        return [f.to_full_dict() if full_details else f.to_small_dict() for f in formations]
+
     def build_api_stats(self):
+        self._build_api_reference_models()
+        if self.__configuration.get('STATS_SEARCH_BACKEND', 'mongo') == 'pandas':
+            LOG.info("Load stats from mongo cache for in-memory search")
+            self._build_api_stats_models_from_mongo()
+        if self.__configuration.get('DATA_CUBE_ENABLED', False):
+            self.build_data_cubes()
+        catalogue_enabled = self.__configuration.get('FORMATION_CATALOGUE_ENABLED', True)
+        text_index_enabled = self.__configuration.get('FORMATION_TEXT_INDEX_ENABLED', True)
+        suggest_enabled = self.__configuration.get('SUGGEST_ENABLED', True)
+        if catalogue_enabled or text_index_enabled or suggest_enabled:
+            formation_repo: FormationRepository = FormationRepository(MongoDAO().database)
+            formations = list(formation_repo.find_by({}))
+            if catalogue_enabled:
+                LOG.info("Build formation catalogue")
+                self._formation_catalogue = FormationCatalogue(formations)
+            if text_index_enabled:
+                LOG.info("Build formation text index")
+                self._formation_text_index = FormationTextIndex(formations)
+            if suggest_enabled:
+                LOG.info("Build suggest index")
+                self._suggest_index = SuggestIndex(formations, self._mentions_df, self._etablissements_df,
+                                                   self._formations_n_can())
+        LOG.info("Dataset version: %s", self.get_dataset_version())
+
+    def build_data_cubes(self):
+        """
+        Build the in-memory data cubes of stats, from the stats frames if loaded, from the mongo cache otherwise
+        """
+        for type_stats, (col_name, df_attr, dimensions, metrics) in DATA_CUBES.items():
+            stats_df = getattr(self, df_attr)
+            if stats_df is None:
+                LOG.info("Load %s stats from mongo cache for data cube", type_stats)
+                projection = dict((field, 1) for field in dimensions + metrics)
+                projection['_id'] = 0
+                stats_df = pd.DataFrame(list(MongoDAO().database[col_name].find({}, projection=projection)),
+                                        columns=dimensions + metrics)
+            start = time.perf_counter()
+            data_cube = DataCube(stats_df, dimensions, metrics)
+            self._data_cubes[type_stats] = data_cube
+            LOG.info("Data cube of %s built in %.3fs: shape %s, %d bytes", type_stats, time.perf_counter() - start,
+                     'x'.join(str(len(data_cube.axes[dim])) for dim in dimensions),
+                     data_cube.memory_usage()['total'])
+
+    def _formations_n_can(self) -> Dict[str, float]:
+        # number of candidates of formations over all years, from the stats frame if loaded
+        if self._stats_candidatures_df is not None:
+            return self._stats_candidatures_df.groupby('formationIfc', observed=True)['n_can'].sum().to_dict()
+        pipeline = [{'$group': {'_id': '$formationIfc', 'n_can': {'$sum': '$n_can'}}}]
+        return dict((doc['_id'], doc['n_can']) for doc in
+                    MongoDAO().database[MongoDAO.candidature_col_name].aggregate(pipeline))
+
+    def get_dataset_version(self) -> Optional[str]:
+        """
+        Give the version of the mongo cache, changed at each build. With the pandas backend, it is the version of the
+        stats loaded at startup. Otherwise, it is read again from mongo every DATASET_VERSION_TTL seconds.
+        :return: the dataset version, None if the cache was built before versions
+        """
+        pandas_backend = self.__configuration.get('STATS_SEARCH_BACKEND', 'mongo') == 'pandas'
+        now = time.monotonic()
+        if self._dataset_version_read_time is None or \
+                (not pandas_backend and now - self._dataset_version_read_time > DATASET_VERSION_TTL):
+            metadata = MongoDAO().database[MongoDAO.metadata_col_name].find_one({'_id': 'dataset'})
+            self._dataset_version = metadata.get('version') if metadata else None
+            self._dataset_version_read_time = now
+        return self._dataset_version
+
+    def _write_dataset_version(self):
+        version = "%s-%s" % (time.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex[:8])
+        LOG.info("Mongo cache version %s", version)
+        MongoDAO().database[MongoDAO.metadata_col_name].replace_one(
+            {'_id': 'dataset'}, {'_id': 'dataset', 'version': version, 'builtAt': datetime.now(timezone.utc)},
+            upsert=True)
+
+    def _build_api_reference_models(self):
+        reference_source = self.__configuration.get('API_REFERENCE_SOURCE', 'auto')
+        if reference_source in ('auto', 'mongo'):
+            LOG.info("Load reference stats from mongo cache")
+            if self._build_api_models_from_mongo():
+                return
+            if reference_source == 'mongo':
+                raise Exception('Reference collections missing in mongo cache. Run the cache builder first')
+            LOG.warning("Reference collections missing in mongo cache. Fallback to CSV")
         LOG.info("Load base CSV stats")
         self._build_api_candidates_model()
 
@@ -106,6 +295,46 @@ class MasterStatsManager(metaclass=Singleton):
         LOG.info("Load full CSV stats")
         self._build_candidates_models()
         self._build_insertionspro_models()
+        if self.__configuration.get('COMPACT_STATS_DTYPES', False):
+            self.compact_stats_frames()
+
+    def compact_stats_frames(self):
+        """
+        Replace stats frames with their compact version (categoricals, nullable small integers, float32)
+        """
+        if self._stats_candidatures_df is not None:
+            LOG.info("Compact candidatures stats dtypes")
+            self._memory_usage_before_compaction['statsCandidatures'] = \
+                dataframe_memory_usage(self._stats_candidatures_df)
+            self._stats_candidatures_df = compact_dataframe(self._stats_candidatures_df,
+                                                            ['etabUai', 'formationIfc', 'mention'])
+        if self._stats_inspros_df is not None:
+            LOG.info("Compact insertions pro stats dtypes")
+            self._memory_usage_before_compaction['statsInsertionsPro'] = \
+                dataframe_memory_usage(self._stats_inspros_df)
+            self._stats_inspros_df = compact_dataframe(self._stats_inspros_df,
+                                                       ['etabUai', 'ins_disc', 'pbEchantillonRaison'])
+
+    def memory_report(self) -> Dict[str, Dict]:
+        """
+        Give the deep memory usage of each loaded frame, per column, and before compaction if it occurred, and of data
+        cubes, per array
+        :return: a dict of frame name -> {current: {total, columns}, beforeCompaction: {total, columns}}
+        """
+        frames = [('academies', self._academies_df), ('etablissements', self._etablissements_df),
+                  ('sectDiscs', self._sect_discs_df), ('mentions', self._mentions_df),
+                  ('formations', self._formations_df), ('statsCandidatures', self._stats_candidatures_df),
+                  ('statsInsertionsPro', self._stats_inspros_df)]
+        report = dict()
+        for frame_name, df in frames:
+            if df is None:
+                continue
+            report[frame_name] = dict(current=dataframe_memory_usage(df))
+            if frame_name in self._memory_usage_before_compaction:
+                report[frame_name]['beforeCompaction'] = self._memory_usage_before_compaction[frame_name]
+        for type_stats, data_cube in self._data_cubes.items():
+            report['dataCube.' + type_stats] = dict(current=data_cube.memory_usage())
+        return report
 
     def build_mongo_cache(self, clear_col: bool = False):
         mongo_dao = MongoDAO()
@@ -113,39 +342,155 @@ class MasterStatsManager(metaclass=Singleton):
         candidature_repo: CandidatureRepository = CandidatureRepository(mongo_dao.database)
         insertionpro_repo: InsertionProRepository = InsertionProRepository(mongo_dao.database)
 
-        test_presence = next(formation_repo.get_collection().find({}, limit=1, projection={'id': 1}), None)
-        if test_presence and not clear_col:
-            LOG.info("Mongo cache already built for formation. Do not reconstuct")
-        else:
-            if test_presence:
-                LOG.info("Mongo cache already built for formation. Clear it before reconstructing it")
-                formation_repo.get_collection().delete_many({})
+        self._build_reference_mongo_cache(clear_col)
+
+        if self._prepare_mongo_collection(formation_repo.get_collection(), 'formation', clear_col):
             LOG.info("Build mongo cache for formation")
             for formation in self._generate_formation_mongo_doc():
                 formation_repo.save(formation)
 
-        test_presence = next(candidature_repo.get_collection().find({}, limit=1, projection={'id': 1}), None)
-        if test_presence and not clear_col:
-            LOG.info("Mongo cache already built for candidatures. Do not reconstuct")
-        else:
-            if test_presence:
-                LOG.info("Mongo cache already built for candidatures. Clear it before reconstructing it")
-                candidature_repo.get_collection().delete_many({})
+        if self._prepare_mongo_collection(candidature_repo.get_collection(), 'candidatures', clear_col):
             LOG.info("Build mongo cache for candidature")
-            for candidature in self._generate_candidature_mongo_doc():
+            for candidature in self._generate_candidature_mongo_doc(self._stats_candidatures_df):
                 candidature_repo.save(candidature)
 
-        test_presence = next(insertionpro_repo.get_collection().find({}, limit=1, projection={'id': 1}), None)
-        if test_presence and not clear_col:
-            LOG.info("Mongo cache already built for insertions pro. Do not reconstuct")
-        else:
-            if test_presence:
-                LOG.info("Mongo cache already built for insertions pro. Clear it before reconstructing it")
-                insertionpro_repo.get_collection().delete_many({})
+        for grouping in self._prepare_rollup_collections(clear_col):
+            self._save_rollup(grouping, compute_rollup(self._stats_candidatures_df, grouping))
+
+        if self._prepare_time_series_collection(clear_col):
+            for level in TIME_SERIES_LEVELS:
+                self._save_time_series(level, compute_time_series_part(self._stats_candidatures_df, level))
+
+        if self._prepare_mongo_collection(insertionpro_repo.get_collection(), 'insertions pro', clear_col):
             LOG.info("Build mongo cache for insertions pro")
-            for inspro in self._generate_insertionpro_mongo_doc():
+            for inspro in self._generate_insertionpro_mongo_doc(self._stats_inspros_df):
                 insertionpro_repo.save(inspro)
 
+        self._write_dataset_version()
+
+    def build_chunked_mongo_cache(self, chunk_size: int, clear_col: bool = False):
+        """
+        Build the mongo cache straight from the CSV sources, reading them by chunks of chunk_size rows.
+        Only the small reference datasets are kept in memory: stats are never loaded as a whole.
+        :param chunk_size: the number of CSV rows per chunk
+        :param clear_col: if set to True, clear the already built collections before reconstructing them
+        """
+        mongo_dao = MongoDAO()
+        formation_repo: FormationRepository = FormationRepository(mongo_dao.database)
+        candidature_repo: CandidatureRepository = CandidatureRepository(mongo_dao.database)
+        insertionpro_repo: InsertionProRepository = InsertionProRepository(mongo_dao.database)
+
+        self._build_reference_models_by_chunks(chunk_size)
+        self._build_reference_mongo_cache(clear_col)
+
+        if self._prepare_mongo_collection(formation_repo.get_collection(), 'formation', clear_col):
+            LOG.info("Build mongo cache for formation")
+            formation_repo.save_many(self._generate_formation_mongo_doc())
+
+        build_candidatures = self._prepare_mongo_collection(candidature_repo.get_collection(), 'candidatures',
+                                                            clear_col)
+        # rollups of the whole stats, merged chunk by chunk
+        rollups = dict((grouping, None) for grouping in self._prepare_rollup_collections(clear_col))
+        # time series aggregates, merged chunk by chunk as well
+        time_series_parts = dict((level, None) for level in TIME_SERIES_LEVELS) \
+            if self._prepare_time_series_collection(clear_col) else dict()
+        if build_candidatures or rollups or time_series_parts:
+            LOG.info("Build mongo cache for candidature by chunks of %d rows", chunk_size)
+            for cand_chunk in iter_candidates_chunks(self.__configuration.get('CANDIDATURE_SOURCE'), chunk_size):
+                stats_chunk = create_stats_candidatures(cand_chunk, self._formations_df)
+                if stats_chunk.empty:
+                    continue
+                if build_candidatures:
+                    candidature_repo.save_many(self._generate_candidature_mongo_doc(stats_chunk))
+                for grouping, rollup in rollups.items():
+                    rollups[grouping] = merge_rollups(rollup, compute_rollup(stats_chunk, grouping))
+                for level, part in time_series_parts.items():
+                    time_series_parts[level] = merge_time_series_parts(part,
+                                                                       compute_time_series_part(stats_chunk, level))
+            for grouping, rollup in rollups.items():
+                if rollup is not None:
+                    self._save_rollup(grouping, rollup)
+            for level, part in time_series_parts.items():
+                if part is not None:
+                    self._save_time_series(level, part)
+
+        if self._prepare_mongo_collection(insertionpro_repo.get_collection(), 'insertions pro', clear_col):
+            LOG.info("Build mongo cache for insertions pro by chunks of %d rows", chunk_size)
+            for inspro_chunk in iter_insertionspro_chunks(self.__configuration.get('INSERTION_SOURCE'), chunk_size):
+                stats_chunk = create_stats_insertionspro(inspro_chunk, self._etablissements_df, self._academies_df)
+                if not stats_chunk.empty:
+                    insertionpro_repo.save_many(self._generate_insertionpro_mongo_doc(stats_chunk))
+
+        self._write_dataset_version()
+
+    @staticmethod
+    def _prepare_mongo_collection(collection: Collection, label: str, clear_col: bool) -> bool:
+        test_presence = next(collection.find({}, limit=1, projection={'id': 1}), None)
+        if test_presence and not clear_col:
+            LOG.info("Mongo cache already built for %s. Do not reconstuct", label)
+            return False
+        if test_presence:
+            LOG.info("Mongo cache already built for %s. Clear it before reconstructing it", label)
+            collection.delete_many({})
+        return True
+
+    def _prepare_rollup_collections(self, clear_col: bool) -> List[Tuple[str, ...]]:
+        database = MongoDAO().database
+        return [grouping for grouping in ROLLUP_GROUPINGS
+                if self._prepare_mongo_collection(database[rollup_col_name(grouping)], rollup_col_name(grouping),
+                                                  clear_col)]
+
+    @staticmethod
+    def _save_rollup(grouping: Tuple[str, ...], rollup: pd.DataFrame):
+        LOG.info("Build mongo cache for %s (%d groups)", rollup_col_name(grouping), len(rollup))
+        if rollup.empty:
+            return
+        collection = MongoDAO().database[rollup_col_name(grouping)]
+        collection.insert_many(list(generate_rollup_docs(rollup)))
+        # aggregates are looked up by their fields
+        collection.create_index([(field, 1) for field in rollup_fields(grouping)])
+
+    def _prepare_time_series_collection(self, clear_col: bool) -> bool:
+        return self._prepare_mongo_collection(MongoDAO().database[MongoDAO.candidature_time_series_col_name],
+                                              MongoDAO.candidature_time_series_col_name, clear_col)
+
+    @staticmethod
+    def _save_time_series(level: str, part: pd.DataFrame):
+        docs = list(generate_time_series_docs(part, level))
+        LOG.info("Build mongo cache for %s time series (%d series)", level, len(docs))
+        if docs:
+            # read by _id only
+            MongoDAO().database[MongoDAO.candidature_time_series_col_name].insert_many(docs)
+
+    @staticmethod
+    def _reference_collections():
+        return [(MongoDAO.academie_col_name, '_academies_df'),
+                (MongoDAO.etablissement_col_name, '_etablissements_df'),
+                (MongoDAO.sect_disc_col_name, '_sect_discs_df'),
+                (MongoDAO.mention_col_name, '_mentions_df')]
+
+    def _build_reference_mongo_cache(self, clear_col: bool):
+        # Reference datasets are stored as served by the API: one document per row, index as a regular field
+        database = MongoDAO().database
+        for col_name, df_attr in self._reference_collections():
+            collection = database[col_name]
+            if self._prepare_mongo_collection(collection, col_name, clear_col):
+                LOG.info("Build mongo cache for %s", col_name)
+                collection.insert_many(getattr(self, df_attr).reset_index().to_dict(orient='records'))
+
+    def _build_api_models_from_mongo(self) -> bool:
+        database = MongoDAO().database
+        reference_dfs = dict()
+        for col_name, df_attr in self._reference_collections():
+            # documents are sorted in insertion order, that is the order of the dataframe
+            documents = list(database[col_name].find({}, projection={'_id': 0}, sort=[('_id', 1)]))
+            if not documents:
+                return False
+            reference_dfs[df_attr] = pd.DataFrame(documents)
+        for df_attr, df in reference_dfs.items():
+            setattr(self, df_attr, df)
+        return True
+
     def _generate_formation_mongo_doc(self):
         for row_idx, row in self._formations_df.reset_index().iterrows():
             yield Formation(
@@ -161,6 +506,8 @@ class MasterStatsManager(metaclass=Singleton):
                 dept=row['dept'] if not pd.isna(row['dept']) else None,
                 latitude=row['latitude'] if not pd.isna(row['latitude']) else None,
                 longitude=row['longitude'] if not pd.isna(row['longitude']) else None,
+                location=dict(type='Point', coordinates=[row['longitude'], row['latitude']])
+                if not pd.isna(row['latitude']) and not pd.isna(row['longitude']) else None,
 
                 etablissement=row['etablissement'],
                 mention=row['mention'],
@@ -170,12 +517,14 @@ class MasterStatsManager(metaclass=Singleton):
                 discipline=row['disci_lib'],
             )
 
-    def _generate_candidature_mongo_doc(self):
-        for rowidx, row in self._stats_candidatures_df.iterrows():
+    @staticmethod
+    def _generate_candidature_mongo_doc(stats_candidatures_df: pd.DataFrame):
+        for rowidx, row in stats_candidatures_df.iterrows():
             yield Candidature(**row.to_dict())
 
-    def _generate_insertionpro_mongo_doc(self):
-        for rowidx, row in self._stats_inspros_df.iterrows():
+    @staticmethod
+    def _generate_insertionpro_mongo_doc(stats_inspros_df: pd.DataFrame):
+        for rowidx, row in stats_inspros_df.iterrows():
             yield InsertionPro(**row.to_dict())
 
     def _build_api_candidates_model(self):
@@ -193,6 +542,17 @@ class MasterStatsManager(metaclass=Singleton):
         self._sect_discs_df.reset_index(inplace=True)
         self._mentions_df.reset_index(inplace=True)
 
+    def _build_api_stats_models_from_mongo(self):
+        database = MongoDAO().database
+        self._stats_candidatures_df = pd.DataFrame(
+            list(database[MongoDAO.candidature_col_name].find({}, projection={'_id': 0})))
+        self._stats_inspros_df = pd.DataFrame(
+            list(database[MongoDAO.insertionpro_col_name].find({}, projection={'_id': 0})))
+        if self._stats_candidatures_df.empty or self._stats_inspros_df.empty:
+            raise Exception('Stats collections missing in mongo cache. Run the cache builder first')
+        if self.__configuration.get('COMPACT_STATS_DTYPES', False):
+            self.compact_stats_frames()
+
     def _build_candidates_models(self):
         LOG.info("Load candidates and disc mapping dfs")
         base_cand_df = load_candidates(self.__configuration.get('CANDIDATURE_SOURCE'))
@@ -206,6 +566,23 @@ class MasterStatsManager(metaclass=Singleton):
         self._formations_df = create_formations(base_cand_df, self._mentions_df, cities_df)
         self._stats_candidatures_df = create_stats_candidatures(base_cand_df, self._formations_df)
 
+    def _build_reference_models_by_chunks(self, chunk_size: int):
+        LOG.info("Load candidates reference columns by chunks of %d rows", chunk_size)
+        # drop duplicates chunk by chunk keeps the first occurrences in file order, as a full load would do
+        ref_chunks = [chunk.drop_duplicates() for chunk in
+                      iter_candidates_chunks(self.__configuration.get('CANDIDATURE_SOURCE'), chunk_size,
+                                             usecols=cand_ref_cols)]
+        base_ref_df = pd.concat(ref_chunks, ignore_index=True).drop_duplicates()
+        del ref_chunks
+        base_mapping_df = load_disc_mapping(self.__configuration.get('DISC_MAPPING_SOURCE'))
+        cities_df = load_cities(self.__configuration.get('CITIES_SOURCE'))
+        LOG.info("create academies, etablissements, sect. disc., mentions and formations")
+        self._academies_df = create_academies(base_ref_df)
+        self._etablissements_df = create_etablissements(base_ref_df)
+        self._sect_discs_df = create_secteur_disciplinaires(base_ref_df, base_mapping_df)
+        self._mentions_df = create_mentions(base_ref_df)
+        self._formations_df = create_formations(base_ref_df, self._mentions_df, cities_df)
+
     def _build_insertionspro_models(self):
         LOG.info("Load insertions pro dfs")
         base_inspro_df = load_insertionspro(self.__configuration.get('INSERTION_SOURCE'))
@@ -0,0 +1,77 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from werkzeug.exceptions import TooManyRequests
+
+from masterStats.search.StatSearchOptions import StatSearchOptions
+from masterStats.stat_search_engine import estimate_search_stats
+from monitoring.metrics import count_search_admission
+
+__all__ = ['SearchAdmission']
+
+LOG = logging.getLogger(__name__)
+
+
+class SearchAdmission:
+    """
+    Admission control of stats searches, per worker process. The cost of a search is estimated before fetching data:
+    - searches above the SEARCH_MAX_ROWS or SEARCH_MAX_BYTES budgets are rejected (400), the client having to add
+      filters or paginate with harvest offset/limit
+    - at most SEARCH_EXPENSIVE_CONCURRENCY searches above SEARCH_EXPENSIVE_ROWS run at a time. Other ones wait for
+      SEARCH_EXPENSIVE_QUEUE_TIMEOUT seconds at most, then are rejected (429)
+    """
+    __slots__ = ['max_rows', 'max_bytes', 'expensive_rows', 'queue_timeout', '_expensive_slots']
+
+    def __init__(self, configuration: Dict):
+        self.max_rows: Optional[int] = configuration.get('SEARCH_MAX_ROWS')
+        self.max_bytes: Optional[int] = configuration.get('SEARCH_MAX_BYTES')
+        self.expensive_rows: Optional[int] = configuration.get('SEARCH_EXPENSIVE_ROWS')
+        self.queue_timeout: float = configuration.get('SEARCH_EXPENSIVE_QUEUE_TIMEOUT', 10.)
+        self._expensive_slots = threading.BoundedSemaphore(configuration.get('SEARCH_EXPENSIVE_CONCURRENCY', 2))
+
+    @property
+    def is_active(self) -> bool:
+        return self.max_rows is not None or self.max_bytes is not None or self.expensive_rows is not None
+
+    @contextmanager
+    def admit(self, search_options: StatSearchOptions,
+              frame_filters: Optional[Dict] = None) -> Iterator[Optional[Dict]]:
+        """
+        Context of an admitted search
+        :param search_options: the search options
+        :param frame_filters: if given, gets the frame masks computed by the estimate, for the search to reuse them
+        :return: the cost estimate of the search, None if admission control is not active
+        """
+        if not self.is_active:
+            yield None
+            return
+        # exact counts are useless beyond the highest threshold
+        thresholds = [v for v in (self.max_rows, self.expensive_rows) if v is not None]
+        estimate = estimate_search_stats(search_options, max(thresholds) if thresholds else None, frame_filters)
+        self._check_budgets(estimate)
+        if self.expensive_rows is None or estimate['rows'] < self.expensive_rows:
+            count_search_admission('admitted')
+            yield estimate
+            return
+        if not self._expensive_slots.acquire(timeout=self.queue_timeout):
+            count_search_admission('rejected_busy')
+            LOG.warning("Expensive search rejected (%d rows estimated): too many concurrent ones", estimate['rows'])
+            raise TooManyRequests("Trop de recherches volumineuses en cours, réessayez plus tard.",
+                                  retry_after=max(1, int(self.queue_timeout)))
+        try:
+            count_search_admission('admitted_expensive')
+            yield estimate
+        finally:
+            self._expensive_slots.release()
+
+    def _check_budgets(self, estimate: Dict):
+        if self.max_rows is not None and estimate['rows'] > self.max_rows:
+            count_search_admission('rejected_budget')
+            raise ValueError("Search too large: more than %d rows. Add filters or paginate with harvest offset and "
+                             "limit." % self.max_rows)
+        if self.max_bytes is not None and estimate['bytes'] is not None and estimate['bytes'] > self.max_bytes:
+            count_search_admission('rejected_budget')
+            raise ValueError("Search too large: about %d bytes (max %d). Add filters or paginate with harvest "
+                             "offset and limit." % (estimate['bytes'], self.max_bytes))
@@ -0,0 +1,116 @@
+import logging
+from typing import Dict, List
+
+import pandas as pd
+
+from masterStats.MasterStatsManager import MasterStatsManager
+from mongo.dao.MongoDAO import MongoDAO
+from mongo.model.Formation import Formation
+from mongo.repository.FormationRepository import FormationRepository
+from monitoring.metrics import time_stage
+
+__all__ = ['compare_formations']
+
+LOG = logging.getLogger(__name__)
+
+# Fields of stats rows identifying their formation, given once per formation
+CANDIDATURES_FORMATION_FIELDS = ['regionId', 'academieId', 'etabUai', 'formationIfc', 'mention', 'mentionId',
+                                 'discId', 'secDiscId']
+INSERTIONS_PRO_FORMATION_FIELDS = ['regionId', 'academieId', 'etabUai', 'ins_disc']
+
+
+def compare_formations(ifcs: List[str]) -> Dict:
+    """
+    Give formations with their stats, for comparison: their details, the time series of their candidatures stats and
+    the insertions pro stats of their etablissement and discipline. Stats are read once for all formations (one $in
+    query per collection with the mongo backend).
+    :param ifcs: the ifcs of formations, without duplicates
+    :return: the formations, in the order of ifcs, and the unknown ifcs
+    """
+    max_formations = MasterStatsManager().configuration.get('COMPARE_MAX_FORMATIONS', 50)
+    if not ifcs:
+        raise ValueError("Attribute ifc is required.")
+    if len(ifcs) > max_formations:
+        raise ValueError("At most %d formations can be compared." % max_formations)
+    formations = _find_formations(ifcs)
+    known_formations = [formations[ifc] for ifc in ifcs if ifc in formations]
+    formations_df = pd.DataFrame(dict(
+        formationIfc=[f.ifc for f in known_formations], etabUai=[f.etabUai for f in known_formations],
+        sectDiscId=[f.sectDiscId for f in known_formations]))
+    # insertions pro are given per etablissement and discipline of insertions pro
+    sect_discs_df = MasterStatsManager().sect_discs_df
+    formations_df['ins_disc'] = formations_df['sectDiscId'].map(
+        sect_discs_df.drop_duplicates('id').set_index('id')['insDiscId'])
+    with time_stage('compare_query'):
+        cands_df = _find_candidatures(formations_df['formationIfc'].tolist())
+        inspros_df = _find_insertions_pro(formations_df.dropna(subset=['etabUai', 'ins_disc']))
+    with time_stage('compare_shaping'):
+        cands_by_ifc = _group_records(cands_df.sort_values('anneeCollecte', kind='stable'),
+                                      ['formationIfc'], CANDIDATURES_FORMATION_FIELDS)
+        inspros_by_key = _group_records(inspros_df.sort_values(['anneeCollecte', 'nbMoisApresDip'], kind='stable'),
+                                        ['etabUai', 'ins_disc'], INSERTIONS_PRO_FORMATION_FIELDS)
+        compared = []
+        for formation, ins_disc in zip(known_formations, formations_df['ins_disc']):
+            compared.append(dict(
+                formation=MasterStatsManager().formations_to_dicts([formation], full_details=True)[0],
+                candidatures=cands_by_ifc.get((formation.ifc,), []),
+                insertionsPro=inspros_by_key.get((formation.etabUai, ins_disc), []) if not pd.isna(ins_disc)
+                else []))
+    return dict(formations=compared, unknownIfcs=[ifc for ifc in ifcs if ifc not in formations])
+
+
+def _find_formations(ifcs: List[str]) -> Dict[str, Formation]:
+    catalogue = MasterStatsManager().formation_catalogue
+    if catalogue is not None:
+        found = (catalogue.get(ifc) for ifc in ifcs)
+        return dict((f.ifc, f) for f in found if f is not None)
+    formation_repo: FormationRepository = FormationRepository(MongoDAO().database)
+    return dict((f.ifc, f) for f in formation_repo.find_by({'ifc': {'$in': ifcs}}))
+
+
+def _find_candidatures(ifcs: List[str]) -> pd.DataFrame:
+    cands_df = MasterStatsManager().stats_candidatures_df
+    if cands_df is not None:
+        return cands_df.loc[cands_df['formationIfc'].isin(ifcs), :]
+    documents = MongoDAO().database[MongoDAO.candidature_col_name].find({'formationIfc': {'$in': ifcs}},
+                                                                        projection={'_id': 0})
+    return _documents_frame(documents, ['formationIfc', 'anneeCollecte'])
+
+
+def _find_insertions_pro(formations_df: pd.DataFrame) -> pd.DataFrame:
+    key_fields = ['etabUai', 'ins_disc']
+    inspros_df = MasterStatsManager().stats_insertionspro_df
+    if inspros_df is not None:
+        found_df = inspros_df.loc[inspros_df['etabUai'].isin(formations_df['etabUai']) &
+                                  inspros_df['ins_disc'].isin(formations_df['ins_disc']), :]
+    else:
+        documents = MongoDAO().database[MongoDAO.insertionpro_col_name].find(
+            {'etabUai': {'$in': formations_df['etabUai'].unique().tolist()},
+             'ins_disc': {'$in': formations_df['ins_disc'].unique().tolist()}}, projection={'_id': 0})
+        found_df = _documents_frame(documents, key_fields + ['anneeCollecte', 'nbMoisApresDip'])
+    # the $in queries match the cross product of etablissements and disciplines: keep the pairs of formations
+    pairs = pd.MultiIndex.from_frame(formations_df[key_fields].astype(str).drop_duplicates())
+    found_pairs = pd.MultiIndex.from_arrays([found_df[f].astype(str) for f in key_fields])
+    return found_df.loc[found_pairs.isin(pairs), :]
+
+
+def _documents_frame(documents, columns: List[str]) -> pd.DataFrame:
+    documents_df = pd.DataFrame(list(documents))
+    return documents_df if not documents_df.empty else pd.DataFrame(columns=columns)
+
+
+def _group_records(stats_df: pd.DataFrame, key_fields: List[str], formation_fields: List[str]) -> Dict[tuple, List]:
+    """
+    Split stats rows into records per key, without the fields identifying their formation
+    :return: key (tuple of key fields values) -> the records of its rows
+    """
+    if stats_df.empty:
+        return dict()
+    keys = list(zip(*[stats_df[f] for f in key_fields]))
+    values_df = stats_df.drop(columns=[f for f in formation_fields if f in stats_df.columns])
+    # NaN and missing values of compact dtypes as null
+    values_df = values_df.astype(object).where(values_df.notna(), None)
+    records_by_key: Dict[tuple, List] = dict()
+    for key, record in zip(keys, values_df.to_dict(orient='records')):
+        records_by_key.setdefault(key, []).append(record)
+    return records_by_key
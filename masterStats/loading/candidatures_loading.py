@@ -2,15 +2,16 @@ import logging
 import re
 import unicodedata
 from functools import partial
+from typing import Iterator, List, Optional
 
 import numpy as np
 import pandas as pd
 
 from masterStats.loading.loading_utils import secure_converter
 
-__all__ = ['load_candidates', 'create_academies', 'create_etablissements',
+__all__ = ['load_candidates', 'iter_candidates_chunks', 'cand_ref_cols', 'create_academies', 'create_etablissements',
            'create_secteur_disciplinaires', 'create_mentions', 'create_formations',
-           'create_stats_candidatures', 'extends_formations_with_cities']
+           'create_stats_candidatures', 'extends_formations_with_cities', 'normalize_spaces_hyphens', 'strip_accents']
 
 LOG = logging.getLogger(__name__)
 
@@ -54,6 +55,9 @@ use_cand_cols = [
     'n_accept_noninscri', 'n_accept_femme_noninscri', 'n_recrut_comp',
     'rang_dernier']
 
+# Columns needed to build academies, etablissements, sect. disc., mentions and formations
+cand_ref_cols = use_cand_cols[1:16]
+
 cand_dtypes = {
     'session': np.int16,
     'eta_uai': str,
@@ -79,23 +83,47 @@ def secure_acad_acadreg_converter(value):
         return -1
 
 
-def load_candidates(filepath: str) -> pd.DataFrame:
-    # Prepare specific column converters
+def _create_cand_converters(usecols: List[str]) -> dict:
     float64_sec_converter = partial(secure_converter, dtype=np.float64, zero_on_error=False)
     converters = dict((col, float64_sec_converter) for col in use_cand_cols[16:])
     converters['acad'] = secure_acad_acadreg_converter
     converters['acad_reg'] = secure_acad_acadreg_converter
     for key, cvt in cand_dtypes.items():
         converters[key] = cvt
+    return dict((col, cvt) for col, cvt in converters.items() if col in usecols)
 
-    DF_CAND = pd.read_csv(filepath, sep=';',
-                          usecols=use_cand_cols, converters=converters)
+
+def _remove_bad_candidates(candidatures_df: pd.DataFrame) -> pd.DataFrame:
     LOG.debug('- Remove inconsistent bad row')
-    bad_rows = (DF_CAND.eta_uai.isna()) | (DF_CAND.eta_nom.isna()) \
-               | (DF_CAND.acad == -1) | (DF_CAND.acad_lib.isna()) | (DF_CAND.acad_reg == -1) | (
-                   DF_CAND.acad_reg_lib.isna())
-    DF_CAND = DF_CAND.loc[~bad_rows, :].copy()
-    return DF_CAND
+    bad_rows = (candidatures_df.eta_uai.isna()) | (candidatures_df.eta_nom.isna()) \
+               | (candidatures_df.acad == -1) | (candidatures_df.acad_lib.isna()) | (candidatures_df.acad_reg == -1) | (
+                   candidatures_df.acad_reg_lib.isna())
+    return candidatures_df.loc[~bad_rows, :].copy()
+
+
+def load_candidates(filepath: str) -> pd.DataFrame:
+    DF_CAND = pd.read_csv(filepath, sep=';',
+                          usecols=use_cand_cols, converters=_create_cand_converters(use_cand_cols))
+    return _remove_bad_candidates(DF_CAND)
+
+
+def iter_candidates_chunks(filepath: str, chunk_size: int,
+                           usecols: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read the candidatures CSV by chunks of rows, each chunk being cleaned as load_candidates would do
+    :param filepath: the filepath of the candidatures CSV
+    :param chunk_size: the number of CSV rows per chunk
+    :param usecols: the subset of use_cand_cols to read (default: all of them)
+    :return: an iterator of cleaned dataframes
+    """
+    usecols = usecols if usecols is not None else use_cand_cols
+    # A chunk may only hold unparsable values for a stat column: force float64 to get the same dtype as a full load
+    float_cols = [col for col in use_cand_cols[16:] if col in usecols]
+    with pd.read_csv(filepath, sep=';', usecols=usecols, converters=_create_cand_converters(usecols),
+                     chunksize=chunk_size) as reader:
+        for chunk in reader:
+            chunk[float_cols] = chunk[float_cols].astype(np.float64)
+            yield _remove_bad_candidates(chunk)
 
 
 def create_academies(candidatures_df: pd.DataFrame) -> pd.DataFrame:
@@ -167,23 +195,26 @@ def create_stats_candidatures(candidatures_df: pd.DataFrame, formations_df: pd.D
     return candidatures_stats
 
 
-def extends_formations_with_cities(formations_df: pd.DataFrame, cities_df: pd.DataFrame) -> pd.DataFrame:
-    villes_suffix = formations_df.lieux.str.extract(r'\s+-\s+(?P<ville_suffix>.*(?!\s+-\s+))?$')
-    ext_formations_df = pd.concat([formations_df, villes_suffix], axis=1)
+space_re = re.compile(r"[\s\-_]+")
+hyphen_re = re.compile(r"['\"]+")
+
+
+def normalize_spaces_hyphens(s: str):
+    rs = s
+    rs = space_re.sub(' ', rs)
+    rs = hyphen_re.sub('', rs)
+    return rs
 
-    space_re = re.compile(r"[\s\-_]+")
-    hyphen_re = re.compile(r"['\"]+")
 
-    def normalize_spaces_hyphens(s: str):
-        rs = s
-        rs = space_re.sub(' ', rs)
-        rs = hyphen_re.sub('', rs)
-        return rs
+def strip_accents(s: str):
+    # replace all - or _ by a space
+    return ''.join(c for c in unicodedata.normalize('NFD', s)
+                   if unicodedata.category(c) != 'Mn' and c not in ['\''])
 
-    def strip_accents(s: str):
-        # replace all - or _ by a space
-        return ''.join(c for c in unicodedata.normalize('NFD', s)
-                       if unicodedata.category(c) != 'Mn' and c not in ['\''])
+
+def extends_formations_with_cities(formations_df: pd.DataFrame, cities_df: pd.DataFrame) -> pd.DataFrame:
+    villes_suffix = formations_df.lieux.str.extract(r'\s+-\s+(?P<ville_suffix>.*(?!\s+-\s+))?$')
+    ext_formations_df = pd.concat([formations_df, villes_suffix], axis=1)
 
     def get_cities(s, cities_with_len):
         if not s:
@@ -0,0 +1,90 @@
+import logging
+from typing import Dict, Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['compact_dataframe', 'dataframe_memory_usage', 'format_memory_report']
+
+LOG = logging.getLogger(__name__)
+
+nullable_int_dtypes = [(np.int8, pd.Int8Dtype()), (np.int16, pd.Int16Dtype()), (np.int32, pd.Int32Dtype())]
+
+
+def _compact_float_dtype(serie: pd.Series):
+    values = serie.to_numpy()
+    not_na_values = values[~np.isnan(values)]
+    # integer values with NaNs: smallest nullable integer type able to hold them
+    if len(not_na_values) > 0 and np.all(np.mod(not_na_values, 1) == 0):
+        v_min, v_max = not_na_values.min(), not_na_values.max()
+        for np_type, pd_type in nullable_int_dtypes:
+            type_info = np.iinfo(np_type)
+            if type_info.min <= v_min and v_max <= type_info.max:
+                return pd_type
+    # float32 only if no value is altered
+    if np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True):
+        return np.float32
+    return None
+
+
+def _compact_integer_dtype(serie: pd.Series):
+    if serie.empty:
+        return None
+    v_min, v_max = serie.min(), serie.max()
+    for np_type, _ in nullable_int_dtypes:
+        type_info = np.iinfo(np_type)
+        if type_info.min <= v_min and v_max <= type_info.max:
+            return np_type if np.dtype(np_type).itemsize < serie.dtype.itemsize else None
+    return None
+
+
+def compact_dataframe(df: pd.DataFrame, categorical_cols: Iterable[str] = ()) -> pd.DataFrame:
+    """
+    Create a lossless compact version of a dataframe:
+    - string columns in categorical_cols become categoricals
+    - float columns holding integers (and NaNs) become nullable small integers, other ones become float32
+      if no value is altered
+    - integer columns are downcasted to the smallest integer type
+    :param df: the dataframe to compact
+    :param categorical_cols: the string columns to dictionary-encode
+    :return: the compact dataframe
+    """
+    categorical_cols = set(categorical_cols)
+    compact_dtypes = dict()
+    for col in df.columns:
+        serie = df[col]
+        if col in categorical_cols:
+            compact_dtypes[col] = 'category'
+        elif serie.dtype == np.float64:
+            compact_dtype = _compact_float_dtype(serie)
+            if compact_dtype is not None:
+                compact_dtypes[col] = compact_dtype
+        elif isinstance(serie.dtype, np.dtype) and np.issubdtype(serie.dtype, np.integer):
+            compact_dtype = _compact_integer_dtype(serie)
+            if compact_dtype is not None:
+                compact_dtypes[col] = compact_dtype
+    LOG.debug("Compact %d columns of %d", len(compact_dtypes), len(df.columns))
+    return df.astype(compact_dtypes)
+
+
+def dataframe_memory_usage(df: pd.DataFrame) -> Dict:
+    usage = df.memory_usage(deep=True)
+    return dict(total=int(usage.sum()), columns=dict((str(col), int(v)) for col, v in usage.items()))
+
+
+def format_memory_report(report: Mapping[str, Mapping]) -> str:
+    """
+    Format a memory report of MasterStatsManager as a text table
+    :param report: the report given by MasterStatsManager.memory_report
+    :return: the text table, one line per frame total and per column
+    """
+    lines = ["{:<24} {:<48} {:>14} {:>14}".format('frame', 'column', 'before (B)', 'current (B)')]
+    for frame_name, frame_report in report.items():
+        current = frame_report['current']
+        before = frame_report.get('beforeCompaction')
+        lines.append("{:<24} {:<48} {:>14} {:>14}".format(frame_name, '*TOTAL*',
+                                                          before['total'] if before else '-', current['total']))
+        for col, col_usage in current['columns'].items():
+            col_before = before['columns'].get(col, '-') if before else '-'
+            lines.append("{:<24} {:<48} {:>14} {:>14}".format(frame_name, col, col_before, col_usage))
+    return '\n'.join(lines)
@@ -1,10 +1,11 @@
 from functools import partial
+from typing import Iterator
 
 import numpy as np
 import pandas as pd
 import re
 
-__all__ = ['load_insertionspro', 'create_stats_insertionspro']
+__all__ = ['load_insertionspro', 'iter_insertionspro_chunks', 'create_stats_insertionspro']
 
 from masterStats.loading.loading_utils import secure_converter
 
@@ -41,20 +42,43 @@ def secure_situation_extractor(value):
         return -1
 
 
-def load_insertionspro(filepath: str) -> pd.DataFrame:
-    # create specific converters
+def _create_ins_converters() -> dict:
     float64_sec_converter = partial(secure_converter, dtype=np.float64, zero_on_error=False)
     insc_converters = dict((col, float64_sec_converter) for col in use_ins_cols[6:])
     insc_converters['situation'] = secure_situation_extractor
-    insertionspro = pd.read_csv(filepath, sep=';',
-                                usecols=use_ins_cols, dtype=ins_dtypes, converters=insc_converters)
-    # remove bad rows
+    return insc_converters
+
+
+def _remove_bad_insertionspro(insertionspro: pd.DataFrame) -> pd.DataFrame:
     bad_rows = (~insertionspro.diplome.str.upper().str.startswith('MASTER LMD')) \
                | (insertionspro.numero_de_l_etablissement.isna()) \
                | (insertionspro.code_de_la_discipline.isna()) | (insertionspro.situation == -1)
     return insertionspro.loc[~bad_rows, :].copy()
 
 
+def load_insertionspro(filepath: str) -> pd.DataFrame:
+    insertionspro = pd.read_csv(filepath, sep=';',
+                                usecols=use_ins_cols, dtype=ins_dtypes, converters=_create_ins_converters())
+    # remove bad rows
+    return _remove_bad_insertionspro(insertionspro)
+
+
+def iter_insertionspro_chunks(filepath: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Read the insertions pro CSV by chunks of rows, each chunk being cleaned as load_insertionspro would do
+    :param filepath: the filepath of the insertions pro CSV
+    :param chunk_size: the number of CSV rows per chunk
+    :return: an iterator of cleaned dataframes
+    """
+    # A chunk may only hold unparsable values for a stat column: force float64 to get the same dtype as a full load
+    float_cols = use_ins_cols[6:]
+    with pd.read_csv(filepath, sep=';', usecols=use_ins_cols, dtype=ins_dtypes,
+                     converters=_create_ins_converters(), chunksize=chunk_size) as reader:
+        for chunk in reader:
+            chunk[float_cols] = chunk[float_cols].astype(np.float64)
+            yield _remove_bad_insertionspro(chunk)
+
+
 def create_stats_insertionspro(insertionspro_df: pd.DataFrame,
                                etablissements_df: pd.DataFrame,
                                academies_df: pd.DataFrame) -> pd.DataFrame:
@@ -0,0 +1,177 @@
+import logging
+import math
+import re
+from bisect import bisect_left
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from masterStats.loading.candidatures_loading import normalize_spaces_hyphens, strip_accents
+from mongo.model.Formation import Formation
+
+__all__ = ['FormationTextIndex', 'tokenize', 'french_stem', 'FRENCH_STOP_WORDS']
+
+LOG = logging.getLogger(__name__)
+
+# Indexed fields of formations, with the weight of their terms
+INDEXED_FIELDS = {
+    'lieux': 1.,
+    'etablissement': 1.,
+    'academie': 1.,
+    'region': 1.,
+    'parcours': 2.,
+    'mention': 2.,
+    'discipline': 1.,
+    'secteur_disciplinaire': 1.,
+}
+
+FRENCH_STOP_WORDS = frozenset([
+    'a', 'au', 'aux', 'avec', 'ce', 'ces', 'd', 'dans', 'de', 'des', 'du', 'en', 'et', 'l', 'la', 'le', 'les',
+    'leur', 'leurs', 'ou', 'par', 'pour', 'qu', 'que', 'sa', 'se', 'ses', 'son', 'sur', 'un', 'une',
+])
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Minimum length of a word to be completed as a prefix
+MIN_PREFIX_LENGTH = 3
+
+_apostrophes_re = re.compile(r"['’`]")
+_word_re = re.compile(r"[a-z0-9]+")
+
+# French light stemming (after J. Savoy): suffix -> replacement, longest suffixes first
+_FRENCH_SUFFIXES = [
+    ('issements', 'iss'), ('issement', 'iss'), ('atrices', 'at'), ('atrice', 'at'), ('ateurs', 'at'),
+    ('ateur', 'at'), ('ations', 'at'), ('ation', 'at'), ('ements', 'e'), ('ement', 'e'), ('ences', 'ent'),
+    ('ence', 'ent'), ('ances', 'ant'), ('ance', 'ant'), ('iques', 'iqu'), ('ique', 'iqu'), ('ismes', 'ism'),
+    ('isme', 'ism'), ('istes', 'ist'), ('iste', 'ist'), ('ites', 'it'), ('ite', 'it'), ('eaux', 'eau'),
+    ('aux', 'al'), ('ales', 'al'), ('ale', 'al'), ('elles', 'el'), ('elle', 'el'), ('ives', 'if'), ('ive', 'if'),
+    ('ifs', 'if'), ('euses', 'eu'), ('euse', 'eu'), ('eurs', 'eu'), ('eur', 'eu'), ('ees', ''), ('ee', ''),
+    ('es', ''), ('er', ''), ('ez', ''), ('s', ''), ('x', ''), ('e', ''),
+]
+
+
+def french_stem(word: str) -> str:
+    """
+    Light stemming of a folded (lower case, without accents) French word: plural, feminine and common
+    derivational suffixes are removed (mathematiques, mathematique -> mathematiqu), as long as the remaining root is
+    long enough
+    :param word: the word
+    :return: the stem
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix, replacement in _FRENCH_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= 3:
+            return word[:len(word) - len(suffix)] + replacement
+    return word
+
+
+def tokenize(text: Optional[str], stop_words: FrozenSet[str] = FRENCH_STOP_WORDS) -> List[str]:
+    """
+    Split a text into folded words (lower case, without accents), stop words removed
+    :param text: the text
+    :param stop_words: the removed words
+    :return: the words, in text order
+    """
+    if not text:
+        return []
+    # elisions (l'informatique) are separate words, normalize_spaces_hyphens would stick them
+    folded = strip_accents(normalize_spaces_hyphens(_apostrophes_re.sub(' ', text.lower())))
+    return [word for word in _word_re.findall(folded) if word not in stop_words]
+
+
+class FormationTextIndex:
+    """
+    In-memory inverted index of formations, for French full-text search ranked with BM25. Words are folded and
+    stemmed; the last word of a query also matches as a prefix of indexed words (search as you type). Searches can be
+    restricted to etablissements, secteurs disciplinaires and departements, whose posting lists are intersected with
+    the matching formations.
+    """
+    __slots__ = ['formations', '_postings', '_words', '_word_stems', '_doc_lengths', '_avg_doc_length',
+                 '_filter_postings']
+
+    def __init__(self, formations: Iterable[Formation]):
+        self.formations: List[Formation] = list(formations)
+        nb_docs = len(self.formations)
+        stem_tfs: Dict[str, Dict[int, float]] = dict()
+        word_stems: Dict[str, str] = dict()
+        self._doc_lengths = np.zeros(nb_docs)
+        # posting lists of search filters
+        self._filter_postings: Dict[str, Dict[object, np.ndarray]] = dict()
+        filter_docs: Dict[str, Dict[object, List[int]]] = dict(etabUai=dict(), sectDiscId=dict(), dept=dict())
+        for doc_id, formation in enumerate(self.formations):
+            for field, weight in INDEXED_FIELDS.items():
+                for word in tokenize(getattr(formation, field)):
+                    stem = word_stems.setdefault(word, french_stem(word))
+                    doc_tfs = stem_tfs.setdefault(stem, dict())
+                    doc_tfs[doc_id] = doc_tfs.get(doc_id, 0.) + weight
+                    self._doc_lengths[doc_id] += weight
+            for field, field_docs in filter_docs.items():
+                value = getattr(formation, field)
+                if value is not None:
+                    field_docs.setdefault(value, []).append(doc_id)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = dict(
+            (stem, (np.fromiter(doc_tfs.keys(), dtype=np.int32, count=len(doc_tfs)),
+                    np.fromiter(doc_tfs.values(), dtype=np.float64, count=len(doc_tfs))))
+            for stem, doc_tfs in stem_tfs.items())
+        self._words: List[str] = sorted(word_stems)
+        self._word_stems: Dict[str, str] = word_stems
+        self._avg_doc_length = float(self._doc_lengths.mean()) if nb_docs else 0.
+        for field, field_docs in filter_docs.items():
+            self._filter_postings[field] = dict((value, np.array(doc_ids, dtype=np.int32))
+                                                for value, doc_ids in field_docs.items())
+        LOG.info("Formation text index built: %d formations, %d stems", nb_docs, len(self._postings))
+
+    def __len__(self):
+        return len(self.formations)
+
+    def search(self, text_search: str, etab_uais: Optional[List[str]] = None,
+               sec_disc_ids: Optional[List[int]] = None, depts: Optional[List[int]] = None) -> List[Formation]:
+        """
+        Search formations matching any word of a text, restricted by filters
+        :param text_search: the searched text
+        :param etab_uais: the etablissements of formations, None for any
+        :param sec_disc_ids: the secteurs disciplinaires of formations, None for any
+        :param depts: the departements of formations, None for any
+        :return: the formations, most relevant first
+        """
+        words = tokenize(text_search)
+        scores = np.zeros(len(self.formations))
+        matched = np.zeros(len(self.formations), dtype=bool)
+        for i, word in enumerate(words):
+            stems = {self._word_stems.get(word, french_stem(word))}
+            if i == len(words) - 1 and len(word) >= MIN_PREFIX_LENGTH:
+                stems.update(self._word_stems[w] for w in self._prefixed_words(word))
+            for stem in stems:
+                posting = self._postings.get(stem)
+                if posting is not None:
+                    scores[posting[0]] += self._bm25(*posting)
+                    matched[posting[0]] = True
+        for field, values in (('etabUai', etab_uais), ('sectDiscId', sec_disc_ids), ('dept', depts)):
+            if values:
+                field_postings = self._filter_postings[field]
+                allowed = np.zeros(len(self.formations), dtype=bool)
+                for value in values:
+                    if value in field_postings:
+                        allowed[field_postings[value]] = True
+                matched &= allowed
+        doc_ids = np.flatnonzero(matched)
+        # most relevant first, then by ifc
+        order = sorted(doc_ids.tolist(), key=lambda d: (-scores[d], self.formations[d].ifc or ''))
+        return [self.formations[d] for d in order]
+
+    def _prefixed_words(self, prefix: str) -> List[str]:
+        words = []
+        i = bisect_left(self._words, prefix)
+        while i < len(self._words) and self._words[i].startswith(prefix):
+            words.append(self._words[i])
+            i += 1
+        return words
+
+    def _bm25(self, doc_ids: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+        nb_docs = len(self.formations)
+        idf = math.log(1. + (nb_docs - len(doc_ids) + .5) / (len(doc_ids) + .5))
+        norm = BM25_K1 * (1. - BM25_B + BM25_B * self._doc_lengths[doc_ids] / self._avg_doc_length)
+        return idf * tfs * (BM25_K1 + 1.) / (tfs + norm)
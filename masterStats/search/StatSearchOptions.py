@@ -1,15 +1,51 @@
+import json
 import logging
 from typing import List, Optional, Dict, Iterable
+from urllib.parse import quote
 
 __all__ = ['StatSearchOptions']
 
 LOG = logging.getLogger(__name__)
 
 
+# Query parameters of the GET stats search, in canonical order: (name, section of the request data, element type,
+# multiple values)
+QUERY_PARAMETERS = [
+    ('academieIds', 'filters', int, True),
+    ('annees', 'filters', int, True),
+    ('anneeMax', 'filters', int, False),
+    ('anneeMin', 'filters', int, False),
+    ('candidatureDetails', 'harvest', str, True),
+    ('disciplineIds', 'filters', int, True),
+    ('etablissementIds', 'filters', str, True),
+    ('format', 'harvest', str, False),
+    ('formationIfcs', 'filters', str, True),
+    ('insertionProDetails', 'harvest', str, True),
+    ('limit', 'harvest', int, False),
+    ('mentionIds', 'filters', int, True),
+    ('moisApresDiplome', 'filters', int, False),
+    ('offset', 'harvest', int, False),
+    ('regionIds', 'filters', int, True),
+    ('secteurDisciplinaireIds', 'filters', int, True),
+    ('typeStats', 'harvest', str, False),
+]
+
+# Request data names of attributes
+ATTRIBUTES_DATA_NAMES = {
+    'regions_filter': 'regionIds', 'academies_filter': 'academieIds', 'etablissements_filter': 'etablissementIds',
+    'mentions_filter': 'mentionIds', 'sec_disc_filter': 'secteurDisciplinaireIds',
+    'disciplines_filter': 'disciplineIds', 'annee_filter': 'annees', 'annee_mini_filter': 'anneeMin',
+    'annee_maxi_filter': 'anneeMax', 'mois_apres_dip_filter': 'moisApresDiplome',
+    'formations_filter': 'formationIfcs', 'type_stats': 'typeStats', 'cand_details': 'candidatureDetails',
+    'inspro_details': 'insertionProDetails', 'offset': 'offset', 'limit': 'limit', 'response_format': 'format'
+}
+
+
 class StatSearchOptions:
     __slots__ = ['regions_filter', 'academies_filter', 'etablissements_filter', 'mentions_filter',
                  'sec_disc_filter', 'disciplines_filter', 'annee_filter', 'annee_mini_filter',
-                 'annee_maxi_filter', 'mois_apres_dip_filter', 'formations_filter', 'type_stats', 'cand_details', 'inspro_details']
+                 'annee_maxi_filter', 'mois_apres_dip_filter', 'formations_filter', 'type_stats', 'cand_details', 'inspro_details',
+                 'offset', 'limit', 'response_format']
 
     def __init__(self):
         self.regions_filter: Optional[List[int]] = None
@@ -26,12 +62,27 @@ class StatSearchOptions:
         self.type_stats: str = "all" # all, candidatures or insertionsPro
         self.cand_details: List[str] = ['general'] # general, experience, origine, all
         self.inspro_details: List[str] = ['general'] # general, emplois, salaire, refRegion, all
+        self.offset: Optional[int] = None # pagination, applied to each type of stats
+        self.limit: Optional[int] = None
+        self.response_format: str = 'rows' # rows (one dict per stats row) or columnar (one list per field)
 
     def to_dict(self) -> Dict:
         attr_vars = ((k, getattr(self, k)) for k in self.__slots__)
         attr_vars = filter(lambda d: d[1] is not None, attr_vars)
         return dict(attr_vars)
 
+    def canonicalize(self) -> str:
+        """
+        Sort and deduplicate list attributes, whose order does not change the search, and give a key identifying the
+        search: two options with the same key give the same result
+        :return: the canonical key
+        """
+        for attr_name in self.__slots__:
+            v = getattr(self, attr_name)
+            if isinstance(v, List):
+                setattr(self, attr_name, sorted(set(v)))
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(',', ':'))
+
     def validate(self):
         # enforce expected type.
         # For each attribute : Nullable, Iterable, Type of attribute or if iterable,
@@ -50,7 +101,10 @@ class StatSearchOptions:
             'formations_filter': (True, True, str, None),
             'type_stats': (False, False, str, ['all', 'candidatures', 'insertionsPro']),
             'cand_details': (False, True, str, ['all', 'general', 'experience', 'origine']),
-            'inspro_details': (False, True, str, ['all', 'general', 'emplois', 'salaire', 'refRegion'])
+            'inspro_details': (False, True, str, ['all', 'general', 'emplois', 'salaire', 'refRegion']),
+            'offset': (True, False, int, None),
+            'limit': (True, False, int, None),
+            'response_format': (False, False, str, ['rows', 'columnar'])
         }
 
         for attr_name, (nullable, iterable, attr_type, allowed_values) in expected_types.items():
@@ -78,6 +132,11 @@ class StatSearchOptions:
                 if allowed_values is not None and v not in allowed_values:
                     raise ValueError("Attribute %s has not the expected value in %s." % (attr_name, str(allowed_values)))
 
+        if self.offset is not None and self.offset < 0:
+            raise ValueError("Attribute offset should not be negative.")
+        if self.limit is not None and self.limit < 1:
+            raise ValueError("Attribute limit should be positive.")
+
     @staticmethod
     def create_from_request_data(data: Dict):
         # create default request option
@@ -107,7 +166,8 @@ class StatSearchOptions:
         harvest = data.get('harvest')
         if harvest:
             it_var_in_out = [('candidatureDetails', 'cand_details'), ('insertionProDetails', 'inspro_details')]
-            dir_var_in_out = [('typeStats', 'type_stats')]
+            dir_var_in_out = [('typeStats', 'type_stats'), ('offset', 'offset'), ('limit', 'limit'),
+                              ('format', 'response_format')]
 
             for var_in, var_out in dir_var_in_out:
                 if var_in in harvest:
@@ -125,9 +185,61 @@ class StatSearchOptions:
         search_opts.validate()
         return search_opts
 
+    def to_query_string(self) -> str:
+        """
+        Give the canonical query string of the GET stats search: parameters in alphabetical order, sorted values
+        separated by commas, default values omitted. Options must be canonicalized first.
+        :return: the query string
+        """
+        defaults = StatSearchOptions()
+        values_by_name = dict()
+        for attr_name, data_name in ATTRIBUTES_DATA_NAMES.items():
+            v = getattr(self, attr_name)
+            if v is not None and v != getattr(defaults, attr_name):
+                values_by_name[data_name] = v
+        params = []
+        for name, _, _, _ in QUERY_PARAMETERS:
+            if name in values_by_name:
+                v = values_by_name[name]
+                v = ','.join(quote(str(e), safe='') for e in v) if isinstance(v, List) else quote(str(v), safe='')
+                params.append('%s=%s' % (name, v))
+        return '&'.join(params)
+
+    @staticmethod
+    def create_from_query_args(args: Dict[str, List[str]]):
+        """
+        Create search options from the query parameters of the GET stats search. Multiple values are given as
+        repeated parameters or separated by commas.
+        :param args: the query parameters, name -> list of values
+        :return: the validated search options
+        """
+        parameters = dict((name, (section, elem_type, multiple)) for name, section, elem_type, multiple
+                          in QUERY_PARAMETERS)
+        unknown = [name for name in args if name not in parameters]
+        if unknown:
+            raise ValueError("Unknown query parameters: %s." % ', '.join(sorted(unknown)))
+        data = dict(filters=dict(), harvest=dict())
+        for name, raw_values in args.items():
+            section, elem_type, multiple = parameters[name]
+            values = [v.strip() for raw_v in raw_values for v in raw_v.split(',') if v.strip()]
+            if not values:
+                continue
+            if elem_type is int:
+                try:
+                    values = [int(v) for v in values]
+                except ValueError:
+                    raise ValueError("Query parameter %s should hold integers." % name)
+            if not multiple and len(values) > 1:
+                raise ValueError("Query parameter %s should hold a single value." % name)
+            data[section][name] = values if multiple else values[0]
+        return StatSearchOptions.create_from_request_data(data)
+
     @staticmethod
     def get_search_option_template() -> Dict:
         return {
+            '##Description##': 'Recherche en POST avec un corps JSON de cette forme, ou en GET avec les mêmes noms '
+                               'de filtres et de choix de données en paramètres de requête (valeurs multiples '
+                               'séparées par des virgules).',
             'filters': {
                 '##Description##': 'filtres de statistiques. Multiples filtres possibles, combinés en "ET"',
                 'regionIds': 'Identifiant de région (int) ou tableau d\'identifiants de région. Optionnel.',
@@ -147,5 +259,8 @@ class StatSearchOptions:
                 'typeStats': 'Type de statistiques retournées (str). Valeur possible: {\'all\',\'candidatures\', \'insertionsPro\'}. Optionnel. Valeur par défaut : \'all\'',
                 'candidatureDetails': 'Element de statistiques de candidature à retourner (str) ou tableau d\'éléments. Valeurs possibles: {\'all\', \'general\', \'experience\', \'origine\'}. Optionnel. Valeur par défaut : \'general\'',
                 'insertionProDetails': 'Element de statistiques d\'insertion professionnelle à retourner (str) ou tableau d\'éléments. Valeurs possibles: {\'all\', \'general\', \'emplois\', \'salaire\', \'refRegion\'}. Optionnel. Valeur par défaut : \'general\'',
+                'offset': 'Nombre de statistiques à sauter, pour chaque type de statistiques (int). Optionnel.',
+                'limit': 'Nombre maximal de statistiques retournées, pour chaque type de statistiques (int). Optionnel. Nécessaire pour les recherches dépassant le nombre maximal de statistiques du serveur.',
+                'format': 'Format des statistiques retournées (str). Valeurs possibles: {\'rows\', \'columnar\'}. Optionnel. Valeur par défaut : \'rows\', un objet par statistique. \'columnar\' : pour chaque type de statistiques, le nombre de statistiques (count) et les mêmes éléments avec un tableau de valeurs par champ ; un champ ayant des valeurs nulles est un objet {valid, values} : tableau de validité (1 si la valeur de la statistique est non nulle, 0 sinon) et tableau des valeurs non nulles.',
             }
         }
\ No newline at end of file
@@ -4,9 +4,11 @@ from typing import Optional, Dict
 import pandas as pd
 from masterStats.MasterStatsManager import MasterStatsManager
 from masterStats.search.StatSearchOptions import StatSearchOptions
+from masterStats.search.columnar_formater_utils import create_cand_columnar, create_ins_columnar
 from masterStats.search.result_formater_utils import create_cand_identifiants, create_cand_relations, \
     create_cand_general, create_cand_experience, create_cand_origine, create_ins_general, create_ins_emplois, \
     create_ins_ref_region, create_ins_salaire, create_ins_identifiants, create_ins_relations
+from monitoring.metrics import time_stage
 
 
 LOG = logging.getLogger(__name__)
@@ -21,11 +23,26 @@ class StatSearchResult:
 
     def to_dict(self) -> Dict:
         ssr_res = dict(request=self.request_options.to_dict())
+        with time_stage('response_shaping'):
+            if self.request_options.response_format == 'columnar':
+                self._add_columnar_dicts(ssr_res)
+                return ssr_res
+            if self.candidatures_found is not None:
+                ssr_res['candidatures'] = list(self._generate_cand_dicts())
+            if self.insertions_pro_found is not None:
+                ssr_res['insertionsPro'] = list(self._generate_inspro_dicts())
+        return ssr_res
+
+    def _add_columnar_dicts(self, ssr_res: Dict):
+        # found stats are frames whatever the search backend, columns are given straight from their arrays
         if self.candidatures_found is not None:
-            ssr_res['candidatures'] = list(self._generate_cand_dicts())
+            ssr_res['candidatures'] = create_cand_columnar(self.candidatures_found,
+                                                           self.request_options.cand_details)
         if self.insertions_pro_found is not None:
-            ssr_res['insertionsPro'] = list(self._generate_inspro_dicts())
-        return ssr_res
+            ssr_res['insertionsPro'] = create_ins_columnar(self.insertions_pro_found,
+                                                           self.request_options.inspro_details,
+                                                           MasterStatsManager().sect_discs_df,
+                                                           MasterStatsManager().mentions_df)
 
     def _generate_cand_dicts(self):
         # Build creators
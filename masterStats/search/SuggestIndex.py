@@ -0,0 +1,127 @@
+import logging
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from masterStats.search.FormationTextIndex import FRENCH_STOP_WORDS, tokenize
+from mongo.model.Formation import Formation
+
+__all__ = ['SuggestIndex', 'SUGGEST_KINDS']
+
+LOG = logging.getLogger(__name__)
+
+# Kinds of suggestions, in the order results of same popularity are given
+SUGGEST_KINDS = ['mention', 'formation', 'etablissement', 'ville']
+
+# Upper bound of folded keys sharing a prefix (folded keys only hold [a-z0-9 ])
+_KEY_UPPER_BOUND = '\uffff'
+
+
+class _SuggestEntries:
+    """
+    Suggestions of a kind, sorted by popularity (then label): the index of an entry is its rank. Keys are the folded
+    label from each of its words, sorted to find the ones starting with a prefix by binary search.
+    """
+    __slots__ = ['ids', 'labels', 'details', 'popularities', 'keys', 'key_entries']
+
+    def __init__(self, entries: pd.DataFrame):
+        entries = entries.sort_values(['popularity', 'label'], ascending=[False, True], kind='stable')
+        self.ids: List = entries['id'].tolist()
+        self.labels: List[str] = entries['label'].tolist()
+        self.details: List[Optional[str]] = entries['detail'].tolist()
+        self.popularities: List[int] = entries['popularity'].astype('int64').tolist()
+        keys = []
+        for entry_idx, label in enumerate(self.labels):
+            words = tokenize(label)
+            keys.extend((' '.join(words[i:]), entry_idx) for i in range(len(words)))
+        keys.sort()
+        self.keys: List[str] = [key for key, _ in keys]
+        self.key_entries: np.ndarray = np.fromiter((entry_idx for _, entry_idx in keys), dtype=np.int32,
+                                                   count=len(keys))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def top(self, folded_prefix: str, limit: int) -> np.ndarray:
+        lo = bisect_left(self.keys, folded_prefix)
+        hi = bisect_left(self.keys, folded_prefix + _KEY_UPPER_BOUND, lo)
+        # entries are ranked by index: the most popular ones are the smallest indexes
+        return np.unique(self.key_entries[lo:hi])[:limit]
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index of mentions, formations, etablissements and cities of formations, for type-ahead
+    suggestions. Suggestions are the entries having a word starting with the folded query (the query words following
+    it having to match the next words), the most popular first: popularity is the number of candidates (n_can) of
+    formations, summed for mentions, etablissements and cities.
+    """
+    __slots__ = ['_entries']
+
+    def __init__(self, formations: Iterable[Formation], mentions_df: pd.DataFrame, etablissements_df: pd.DataFrame,
+                 formations_n_can: Dict[str, float]):
+        """
+        :param formations: the formations
+        :param mentions_df: the mentions (id and nom columns)
+        :param etablissements_df: the etablissements (uai and nom columns)
+        :param formations_n_can: ifc of formations -> number of candidates, over all years
+        """
+        formations_df = pd.DataFrame([dict(
+            id=f.ifc, label=' - '.join(s for s in [f.mention, f.parcours] if s),
+            detail=', '.join(s for s in [f.etablissement, f.ville] if s) or None, mentionId=f.mentionId,
+            etabUai=f.etabUai, ville=f.ville, dept=f.dept) for f in formations],
+            columns=['id', 'label', 'detail', 'mentionId', 'etabUai', 'ville', 'dept'])
+        formations_df['popularity'] = formations_df['id'].map(formations_n_can).fillna(0)
+        mentions_entries = mentions_df[['id', 'nom']].rename(columns={'nom': 'label'}).assign(
+            detail=None, popularity=mentions_df['id'].map(
+                formations_df.groupby('mentionId')['popularity'].sum()).fillna(0).to_numpy())
+        etablissements_entries = etablissements_df[['uai', 'nom']].rename(columns={'uai': 'id', 'nom': 'label'})
+        etablissements_entries = etablissements_entries.assign(
+            detail=None, popularity=etablissements_df['uai'].map(
+                formations_df.groupby('etabUai')['popularity'].sum()).fillna(0).to_numpy())
+        villes_entries = formations_df.dropna(subset=['ville']).groupby(['ville', 'dept'], dropna=False) \
+            .agg(popularity=('popularity', 'sum')).reset_index()
+        villes_entries = pd.DataFrame(dict(
+            id=villes_entries['ville'], label=villes_entries['ville'],
+            detail=villes_entries['dept'].map(lambda d: None if pd.isna(d) else str(int(d))),
+            popularity=villes_entries['popularity']))
+        self._entries: Dict[str, _SuggestEntries] = dict(
+            mention=_SuggestEntries(mentions_entries),
+            formation=_SuggestEntries(formations_df[['id', 'label', 'detail', 'popularity']]),
+            etablissement=_SuggestEntries(etablissements_entries),
+            ville=_SuggestEntries(villes_entries))
+        LOG.info("Suggest index built: %s", ', '.join('%d %ss (%d keys)' % (len(e), kind, len(e.keys))
+                                                       for kind, e in self._entries.items()))
+
+    def suggest(self, prefix: str, kinds: Optional[List[str]] = None, limit: int = 10) -> List[Dict]:
+        """
+        Give the most popular suggestions matching a prefix
+        :param prefix: the typed text
+        :param kinds: the kinds of suggestions among SUGGEST_KINDS, None for all of them
+        :param limit: the maximum number of suggestions
+        :return: the suggestions (kind, id, label, detail, popularity), the most popular first
+        """
+        unknown = [k for k in kinds or [] if k not in SUGGEST_KINDS]
+        if unknown:
+            raise ValueError("Unknown kinds: %s. Available: %s." % (', '.join(unknown), ', '.join(SUGGEST_KINDS)))
+        words = tokenize(prefix, stop_words=frozenset())
+        if not words:
+            return []
+        # stop words are not indexed, but the last word being typed may start another word (par... for paris)
+        head = [w for w in words[:-1] if w not in FRENCH_STOP_WORDS]
+        folded_prefixes = [' '.join(head + words[-1:])]
+        if words[-1] in FRENCH_STOP_WORDS and head:
+            folded_prefixes.append(' '.join(head))
+        candidates = []
+        for kind in SUGGEST_KINDS:
+            if kinds and kind not in kinds:
+                continue
+            entries = self._entries[kind]
+            entry_idx = np.unique(np.concatenate([entries.top(p, limit) for p in folded_prefixes]))
+            candidates.extend((entries.popularities[i], kind, entries, i) for i in entry_idx[:limit])
+        # most popular first, kinds order then rank within a kind for ties
+        candidates.sort(key=lambda c: (-c[0], SUGGEST_KINDS.index(c[1]), c[3]))
+        return [dict(kind=kind, id=entries.ids[i], label=entries.labels[i], detail=entries.details[i],
+                     popularity=popularity) for popularity, kind, entries, i in candidates[:limit]]
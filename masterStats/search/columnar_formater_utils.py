@@ -0,0 +1,159 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['CAND_COMPONENTS_FIELDS', 'INS_COMPONENTS_FIELDS', 'CAND_DETAILS', 'INS_DETAILS', 'columnar_values',
+           'columnar_cand_fields', 'columnar_ins_fields', 'create_cand_columnar', 'create_ins_columnar']
+
+# Details of stats that may be harvested, in response order
+CAND_DETAILS = ['general', 'experience', 'origine']
+INS_DETAILS = ['general', 'emplois', 'salaire', 'refRegion']
+
+_EXPERIENCE_KEYS = ['nb', 'nbFemmes', 'clas', 'clasFemme', 'prop', 'propFemmes', 'accept', 'acceptFemmes']
+_EXPERIENCE_SUFFIXES = {'lg3': 'lg3', 'lp3': 'lp3', 'master': 'master', 'autre': 'autre', 'noninscrit': 'noninscri'}
+_ORIGINE_KEYS = ['nb', 'clas', 'prop', 'accept']
+_ORIGINE_SUFFIXES = {'etablissement': 'etab', 'academie': 'acad', 'region': 'acad_reg'}
+
+# Components of candidatures stats, as given per row by result_formater_utils: output key -> stats field, or nested
+# output keys of categories
+CAND_COMPONENTS_FIELDS = {
+    'identifiants': {'anneeCollecte': 'anneeCollecte', 'etabUai': 'etabUai', 'formationIfc': 'formationIfc'},
+    'relations': {'academieId': 'academieId', 'regionId': 'regionId', 'secDiscId': 'secDiscId', 'discId': 'discId',
+                  'mentionId': 'mentionId'},
+    'general': {'capacite': 'col', 'nb': 'n_can', 'nbFemmes': 'n_can_femme', 'clas': 'n_clas',
+                'clasFemmes': 'n_clas_femme', 'prop': 'n_prop', 'propFemmes': 'n_prop_femme', 'accept': 'n_accept',
+                'acceptFemmes': 'n_accept_femme', 'nbComp': 'n_recrut_comp', 'acceptDebutPP': 'n_accept_debut_pp',
+                'rangDernier': 'rang_dernier'},
+    'experience': dict((cat, dict(zip(_EXPERIENCE_KEYS, ['n_can_' + s, 'n_can_femme_' + s, 'n_clas_' + s,
+                                                         'n_clas_femme_' + s, 'n_prop_' + s, 'n_prop_femme_' + s,
+                                                         'n_accept_' + s, 'n_accept_femme_' + s])))
+                       for cat, s in _EXPERIENCE_SUFFIXES.items()),
+    'origine': dict((cat, dict(zip(_ORIGINE_KEYS, ['n_can_' + s, 'n_clas_' + s, 'n_prop_' + s, 'n_accept_' + s])))
+                    for cat, s in _ORIGINE_SUFFIXES.items()),
+}
+
+# Components of insertions pro stats, as given per row by result_formater_utils (relations apart, derived from the
+# discipline of insertions pro)
+INS_COMPONENTS_FIELDS = {
+    'identifiants': {'anneeCollecte': 'anneeCollecte', 'etabUai': 'etabUai', 'moisApresDip': 'nbMoisApresDip',
+                     'insDiscId': 'ins_disc'},
+    'general': {'nbResponses': 'nombre_de_reponses', 'tauxReponse': 'taux_de_reponse',
+                'pbEchantillon': 'pbEchantillon', 'pbEchantillonRaison': 'pbEchantillonRaison'},
+    'emplois': {'cadreProIntermediaire': 'emplois_cadre_ou_professions_intermediaires', 'cadre': 'emplois_cadre',
+                'stable': 'emplois_stables', 'tempsPlein': 'emplois_a_temps_plein',
+                'exterieurRegionDip': 'emplois_exterieurs_a_la_region_de_luniversite', 'femmes': 'femmes',
+                'boursier': 'de_diplomes_boursiers'},
+    'salaire': {'netMedianTempsPlein': 'salaire_net_median_des_emplois_a_temps_plein',
+                'brutAnnuelEstime': 'salaire_brut_annuel_estime'},
+    'refRegion': {'tauxChomageRegional': 'emplois_cadre_ou_professions_intermediaires',
+                  'netQ1Regional': 'salaire_net_mensuel_regional_1er_quartile',
+                  'netMedianRegional': 'salaire_net_mensuel_median_regional',
+                  'netQ3Regional': 'salaire_net_mensuel_regional_3eme_quartile'},
+}
+_INS_RELATIONS_FIELDS = ['academieId', 'regionId', 'ins_disc']
+
+
+def _selected_details(details: List[str], all_details: List[str]) -> List[str]:
+    return all_details if 'all' in details else [d for d in all_details if d in details]
+
+
+def _leaf_fields(fields: Dict) -> List[str]:
+    leaves = []
+    for field in fields.values():
+        leaves.extend(_leaf_fields(field) if isinstance(field, dict) else [field])
+    return leaves
+
+
+def columnar_cand_fields(cand_details: List[str]) -> List[str]:
+    """
+    :param cand_details: the harvested details of candidatures stats
+    :return: the stats fields of the columnar candidatures stats, without duplicates
+    """
+    components = ['identifiants', 'relations'] + _selected_details(cand_details, CAND_DETAILS)
+    return list(dict.fromkeys(f for c in components for f in _leaf_fields(CAND_COMPONENTS_FIELDS[c])))
+
+
+def columnar_ins_fields(inspro_details: List[str]) -> List[str]:
+    """
+    :param inspro_details: the harvested details of insertions pro stats
+    :return: the stats fields of the columnar insertions pro stats, without duplicates
+    """
+    components = ['identifiants'] + _selected_details(inspro_details, INS_DETAILS)
+    return list(dict.fromkeys([f for c in components for f in _leaf_fields(INS_COMPONENTS_FIELDS[c])] +
+                              _INS_RELATIONS_FIELDS))
+
+
+def columnar_values(values: pd.Series):
+    """
+    Give the values of a column without its nulls
+    :param values: the values of the column
+    :return: the list of values if none is null, else a dict of the validity list (1 for a non-null value, 0 for a
+    null one, per row) and the list of non-null values
+    """
+    valid = values.notna().to_numpy()
+    if valid.all():
+        return values.tolist()
+    return dict(valid=valid.astype(np.int8).tolist(), values=values[valid].tolist())
+
+
+def _column(stats_df: pd.DataFrame, field: str) -> pd.Series:
+    # a field missing from all stats rows is null
+    return stats_df[field] if field in stats_df.columns else pd.Series(None, index=stats_df.index, dtype=object)
+
+
+def _create_columnar_component(stats_df: pd.DataFrame, fields: Dict) -> Dict:
+    return dict((key, _create_columnar_component(stats_df, field) if isinstance(field, dict)
+                 else columnar_values(_column(stats_df, field))) for key, field in fields.items())
+
+
+def create_cand_columnar(cands_df: pd.DataFrame, cand_details: List[str]) -> Dict:
+    """
+    Give candidatures stats in columns: the components of their rows, with one list of values per field
+    :param cands_df: the candidatures stats
+    :param cand_details: the harvested details of candidatures stats
+    :return: the number of stats rows and the columnar components
+    """
+    columnar = dict(count=len(cands_df))
+    for component in ['identifiants', 'relations'] + _selected_details(cand_details, CAND_DETAILS):
+        columnar[component] = _create_columnar_component(cands_df, CAND_COMPONENTS_FIELDS[component])
+    return columnar
+
+
+def create_ins_columnar(inspros_df: pd.DataFrame, inspro_details: List[str], sect_discs_df: pd.DataFrame,
+                        mentions_df: pd.DataFrame) -> Dict:
+    """
+    Give insertions pro stats in columns: the components of their rows, with one list of values per field
+    :param inspros_df: the insertions pro stats
+    :param inspro_details: the harvested details of insertions pro stats
+    :param sect_discs_df: the secteurs disciplinaires, for relations
+    :param mentions_df: the mentions, for relations
+    :return: the number of stats rows and the columnar components
+    """
+    columnar = dict(count=len(inspros_df))
+    columnar['identifiants'] = _create_columnar_component(inspros_df, INS_COMPONENTS_FIELDS['identifiants'])
+    columnar['relations'] = _create_ins_columnar_relations(inspros_df, sect_discs_df, mentions_df)
+    for component in _selected_details(inspro_details, INS_DETAILS):
+        columnar[component] = _create_columnar_component(inspros_df, INS_COMPONENTS_FIELDS[component])
+    return columnar
+
+
+def _create_ins_columnar_relations(inspros_df: pd.DataFrame, sect_discs_df: pd.DataFrame,
+                                   mentions_df: pd.DataFrame) -> Dict:
+    # relations are looked up once per discipline of insertions pro
+    codes, ins_discs = pd.factorize(_column(inspros_df, 'ins_disc'))
+    relations = []
+    for ins_disc in ins_discs:
+        selection = sect_discs_df.loc[sect_discs_df.insDiscId == ins_disc, ['id', 'disciplineId']]
+        sec_disc_ids = selection.id.tolist()
+        relations.append((sec_disc_ids, selection.disciplineId.unique().tolist(),
+                          mentions_df.loc[mentions_df.secDiscId.isin(sec_disc_ids), 'id'].tolist()))
+    # null disciplines (code -1) have no relations
+    relations.append(([], [], []))
+    return {
+        'academieId': columnar_values(_column(inspros_df, 'academieId')),
+        'regionId': columnar_values(_column(inspros_df, 'regionId')),
+        'secDiscIds': [relations[c][0] for c in codes],
+        'discIds': [relations[c][1] for c in codes],
+        'mentionIds': [relations[c][2] for c in codes],
+    }
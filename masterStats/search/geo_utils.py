@@ -0,0 +1,68 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mongo.model.Formation import Formation
+
+__all__ = ['EARTH_RADIUS_KM', 'check_geo_search', 'haversine_km', 'select_nearest', 'nearest_formations']
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def check_geo_search(latitude: float, longitude: float, radius_km: Optional[float], nearest: Optional[int]):
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError("Attributes lat and lon should be a latitude (-90 to 90) and a longitude (-180 to 180).")
+    if radius_km is None and nearest is None:
+        raise ValueError("Attribute radiusKm or nearest is required with lat and lon.")
+    if radius_km is not None and not radius_km > 0:
+        raise ValueError("Attribute radiusKm should be positive.")
+    if nearest is not None and nearest <= 0:
+        raise ValueError("Attribute nearest should be positive.")
+
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distances from a point to many points
+    :param latitude: the latitude of the point (degrees)
+    :param longitude: the longitude of the point (degrees)
+    :param latitudes: the latitudes of the other points (degrees)
+    :param longitudes: the longitudes of the other points (degrees)
+    :return: the distances (km)
+    """
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lats2, lons2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lats2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lats2) * np.sin((lons2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0., 1.)))
+
+
+def select_nearest(distances: np.ndarray, radius_km: Optional[float] = None,
+                   nearest: Optional[int] = None) -> np.ndarray:
+    """
+    Select points by distance
+    :param distances: the distances of points (km)
+    :param radius_km: the maximum distance (km), None for no limit
+    :param nearest: the maximum number of points, None for no limit
+    :return: the indexes of selected points, the nearest first (ties in index order)
+    """
+    selected = np.flatnonzero(distances <= radius_km) if radius_km is not None else np.arange(len(distances))
+    order = selected[np.argsort(distances[selected], kind='stable')]
+    return order[:nearest] if nearest is not None else order
+
+
+def nearest_formations(formations: Sequence[Formation], latitude: float, longitude: float,
+                       radius_km: Optional[float] = None,
+                       nearest: Optional[int] = None) -> List[Tuple[Formation, float]]:
+    """
+    Select formations around a point. Formations without coordinates are ignored.
+    :param formations: the formations
+    :param latitude: the latitude of the point
+    :param longitude: the longitude of the point
+    :param radius_km: the maximum distance (km), None for no limit
+    :param nearest: the maximum number of formations, None for no limit
+    :return: the formations with their distance (km), the nearest first
+    """
+    located = [f for f in formations if f.latitude is not None and f.longitude is not None]
+    distances = haversine_km(latitude, longitude, np.fromiter((f.latitude for f in located), dtype=np.float64,
+                                                              count=len(located)),
+                             np.fromiter((f.longitude for f in located), dtype=np.float64, count=len(located)))
+    return [(located[i], float(distances[i])) for i in select_nearest(distances, radius_km, nearest)]
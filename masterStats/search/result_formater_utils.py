@@ -78,14 +78,14 @@ def create_ins_identifiants(ins_row: pd.Series) -> Tuple[str, Dict]:
 def create_ins_relations(ins_row: pd.Series, sect_discs_df: pd.DataFrame,
                          mentions_df: pd.DataFrame, cache_dict: Dict = None) -> Tuple[str, Dict]:
     ins_disc = ins_row.ins_disc
-    if cache_dict and ins_disc in cache_dict:
+    if cache_dict is not None and ins_disc in cache_dict:
         sec_disc_ids, disc_ids, mention_ids = cache_dict[ins_disc]
     else:
-        selection = sect_discs_df.loc[sect_discs_df.insDiscId == ins_disc, 'disciplineId']
-        sec_disc_ids = selection.index.tolist()
-        disc_ids = selection.unique().tolist()
-        mention_ids = mentions_df.loc[mentions_df.secDiscId.isin(sec_disc_ids),:].index.tolist()
-        if cache_dict:
+        selection = sect_discs_df.loc[sect_discs_df.insDiscId == ins_disc, ['id', 'disciplineId']]
+        sec_disc_ids = selection.id.tolist()
+        disc_ids = selection.disciplineId.unique().tolist()
+        mention_ids = mentions_df.loc[mentions_df.secDiscId.isin(sec_disc_ids), 'id'].tolist()
+        if cache_dict is not None:
             cache_dict[ins_disc] = (sec_disc_ids, disc_ids, mention_ids)
 
     return 'relations', {
@@ -0,0 +1,251 @@
+import logging
+from math import isnan
+from typing import Dict, List, Optional
+
+import pandas as pd
+from werkzeug.exceptions import NotFound
+
+from masterStats.MasterStatsManager import MasterStatsManager
+from masterStats.loading.candidatures_loading import use_cand_cols
+from masterStats.loading.insertion_pro_loading import use_ins_cols
+from masterStats.search.StatSearchOptions import StatSearchOptions, QUERY_PARAMETERS
+from masterStats.stat_rollups import ROLLUP_GROUPINGS, ROLLUP_COUNTER_COLS, canonical_grouping, rollup_fields, \
+    rollup_col_name
+from masterStats.stat_search_engine import create_candidatures_mongo_filter, create_insertions_pro_mongo_filter, \
+    compute_ins_disc_ids
+from masterStats.stat_time_series import TIME_SERIES_LEVELS, time_series_id
+from mongo.dao.MongoDAO import MongoDAO
+from monitoring.metrics import time_stage, count_result_rows
+
+__all__ = ['aggregate_candidatures', 'aggregate_stats', 'create_aggregation_pipeline', 'query_data_cube',
+           'get_time_series']
+
+LOG = logging.getLogger(__name__)
+
+# Per type of stats: collection, mongo filter creation, group by dimensions and metrics of ad-hoc aggregations
+AGGREGATED_STATS = {
+    'candidatures': (MongoDAO.candidature_col_name, create_candidatures_mongo_filter,
+                     ['regionId', 'academieId', 'etabUai', 'formationIfc', 'mentionId', 'discId', 'secDiscId',
+                      'anneeCollecte'],
+                     use_cand_cols[16:]),
+    'insertionsPro': (MongoDAO.insertionpro_col_name, create_insertions_pro_mongo_filter,
+                      ['regionId', 'academieId', 'etabUai', 'ins_disc', 'anneeCollecte', 'nbMoisApresDip'],
+                      use_ins_cols[6:]),
+}
+
+MAX_GROUP_BY_DIMENSIONS = 2
+
+# Operation -> mongo accumulator of the (cleaned) metric values. $median requires MongoDB 7.0.
+AGGREGATE_OPERATIONS = {
+    'sum': lambda values: {'$sum': values},
+    'avg': lambda values: {'$avg': values},
+    'median': lambda values: {'$median': {'input': values, 'method': 'approximate'}},
+    'min': lambda values: {'$min': values},
+    'max': lambda values: {'$max': values},
+    'count': lambda values: {'$sum': {'$cond': [{'$isNumber': values}, 1, 0]}},
+}
+
+
+def aggregate_candidatures(group_by: List[str], query_args: Dict[str, List[str]],
+                           counters: Optional[List[str]] = None) -> Dict:
+    """
+    Give candidatures stats totals from the rollup of a grouping, filtered on its fields
+    :param group_by: the dimensions to group on, among ROLLUP_DIMENSIONS names (per year in any case)
+    :param query_args: the stats search filters, as query parameters (name -> list of values)
+    :param counters: the counters to give (default: all of them)
+    :return: the request and the aggregates, one per group
+    """
+    grouping = canonical_grouping(group_by)
+    if grouping not in ROLLUP_GROUPINGS:
+        raise ValueError("No rollup for groupBy %s. Available: %s." % (
+            ','.join(grouping), '; '.join(','.join(g) for g in ROLLUP_GROUPINGS if g)))
+    filter_names = [name for name, section, _, _ in QUERY_PARAMETERS if section == 'filters']
+    not_filters = [name for name in query_args if name not in filter_names]
+    if not_filters:
+        raise ValueError("Unknown query parameters: %s." % ', '.join(sorted(not_filters)))
+    search_options = StatSearchOptions.create_from_query_args(query_args)
+    fields = rollup_fields(grouping)
+    rollup_filter = create_candidatures_mongo_filter(search_options)
+    unavailable = [field for field in rollup_filter if field not in fields]
+    if search_options.mois_apres_dip_filter or unavailable:
+        raise ValueError("Filters not available with groupBy %s: only on %s." % (','.join(grouping),
+                                                                                ', '.join(fields)))
+    counters = counters or ROLLUP_COUNTER_COLS
+    unknown = [col for col in counters if col not in ROLLUP_COUNTER_COLS]
+    if unknown:
+        raise ValueError("Unknown counters: %s." % ', '.join(unknown))
+    projection = dict((field, 1) for field in fields)
+    projection.update(_id=0, rows=1)
+    for col in counters:
+        projection['sums.' + col] = 1
+        projection['counts.' + col] = 1
+    with time_stage('mongo_query'):
+        aggregates = list(MongoDAO().database[rollup_col_name(grouping)]
+                          .find(rollup_filter, projection=projection, sort=[(field, 1) for field in fields]))
+    search_options.canonicalize()
+    filters = dict((k, v) for k, v in search_options.to_dict().items() if k.endswith('_filter'))
+    return dict(request=dict(groupBy=list(grouping), filters=filters, counters=counters), aggregates=aggregates)
+
+
+def aggregate_stats(data: Dict) -> Dict:
+    """
+    Group stats of a type with any stats search filters, and aggregate their metrics, in mongo: only the aggregated
+    rows are fetched
+    :param data: the request data: typeStats ('candidatures' or 'insertionsPro'), filters (as in stats search),
+    groupBy (1 or 2 dimensions) and metrics (metric -> operation or list of operations among AGGREGATE_OPERATIONS)
+    :return: the request and the groups, sorted on their dimensions, with their number of stats rows and metrics
+    """
+    type_stats = data.get('typeStats')
+    if type_stats not in AGGREGATED_STATS:
+        raise ValueError("Attribute typeStats should be one of %s." % ', '.join(AGGREGATED_STATS))
+    col_name, create_mongo_filter, dimensions, metric_names = AGGREGATED_STATS[type_stats]
+    search_options = StatSearchOptions.create_from_request_data(dict(filters=data.get('filters')))
+    if type_stats == 'candidatures' and search_options.mois_apres_dip_filter:
+        raise ValueError("Filter moisApresDiplome is not available for candidatures.")
+    group_by = data.get('groupBy')
+    group_by = [group_by] if isinstance(group_by, str) else group_by
+    if not isinstance(group_by, List) or not 1 <= len(group_by) <= MAX_GROUP_BY_DIMENSIONS or \
+            any(d not in dimensions for d in group_by) or len(set(group_by)) < len(group_by):
+        raise ValueError("Attribute groupBy should hold 1 to %d distinct dimensions among %s." % (
+            MAX_GROUP_BY_DIMENSIONS, ', '.join(dimensions)))
+    metrics = data.get('metrics') or dict()
+    if not isinstance(metrics, Dict):
+        raise ValueError("Attribute metrics should map metrics to operations.")
+    metrics = dict((metric, [ops] if isinstance(ops, str) else ops) for metric, ops in metrics.items())
+    for metric, ops in metrics.items():
+        if metric not in metric_names:
+            raise ValueError("Unknown metric %s for %s. Available: %s." % (metric, type_stats, ', '.join(metric_names)))
+        if not isinstance(ops, List) or not ops or any(op not in AGGREGATE_OPERATIONS for op in ops):
+            raise ValueError("Operations of metric %s should be among %s." % (metric, ', '.join(AGGREGATE_OPERATIONS)))
+    max_groups = MasterStatsManager().configuration.get('SEARCH_MAX_ROWS')
+    pipeline = create_aggregation_pipeline(create_mongo_filter(search_options), group_by, metrics,
+                                           max_groups + 1 if max_groups is not None else None)
+    LOG.debug("Aggregation pipeline: %s", pipeline)
+    with time_stage('mongo_query'):
+        groups = list(MongoDAO().database[col_name].aggregate(pipeline, allowDiskUse=True))
+    if max_groups is not None and len(groups) > max_groups:
+        raise ValueError("Aggregation too large: more than %d groups. Add filters." % max_groups)
+    for group in groups:
+        for metric_values in group.get('metrics', dict()).values():
+            for op, value in metric_values.items():
+                if isinstance(value, float) and isnan(value):
+                    metric_values[op] = None
+    count_result_rows('aggregates', len(groups))
+    search_options.canonicalize()
+    filters = dict((k, v) for k, v in search_options.to_dict().items() if k.endswith('_filter'))
+    return dict(request=dict(typeStats=type_stats, filters=filters, groupBy=group_by, metrics=metrics),
+                groups=groups)
+
+
+def create_aggregation_pipeline(mongo_filter: Dict, group_by: List[str], metrics: Dict[str, List[str]],
+                                limit: Optional[int] = None) -> List[Dict]:
+    """
+    Compile an aggregation into a mongo pipeline
+    :param mongo_filter: the filter of stats, see create_candidatures_mongo_filter
+    :param group_by: the fields to group stats on
+    :param metrics: the fields to aggregate, with their operations
+    :param limit: the maximum number of groups, None for all of them
+    :return: the pipeline ($match, $group, $sort, $limit and $project stages)
+    """
+    group = {'_id': dict((field, '$' + field) for field in group_by), 'rows': {'$sum': 1}}
+    projection = dict((field, '$_id.' + field) for field in group_by)
+    projection.update(_id=0, rows=1)
+    if metrics:
+        projection['metrics'] = dict()
+    for metric, ops in metrics.items():
+        # missing values are stored as NaN (or null with compact dtypes): NaN would spoil sums and averages
+        values = {'$cond': [{'$eq': ['$' + metric, float('nan')]}, None, '$' + metric]}
+        projection['metrics'][metric] = dict()
+        for op in ops:
+            accumulator = '%s__%s' % (metric, op)
+            group[accumulator] = AGGREGATE_OPERATIONS[op](values)
+            projection['metrics'][metric][op] = '$' + accumulator
+    pipeline = [{'$match': mongo_filter}, {'$group': group},
+                {'$sort': dict(('_id.' + field, 1) for field in group_by)}]
+    if limit is not None:
+        pipeline.append({'$limit': limit})
+    pipeline.append({'$project': projection})
+    return pipeline
+
+
+# group by names of data cubes queries -> dimension
+CUBE_GROUP_BY = {'annee': 'anneeCollecte', 'academie': 'academieId', 'secteurDisciplinaire': 'secDiscId',
+                 'insDiscipline': 'ins_disc', 'moisApresDiplome': 'nbMoisApresDip'}
+
+
+def query_data_cube(search_options: StatSearchOptions, group_by: Optional[str] = None,
+                    metrics: Optional[List[str]] = None) -> Dict:
+    """
+    Aggregate stats from the in-memory data cube of their type (DATA_CUBE_ENABLED)
+    :param search_options: the search options: filters and type of stats (candidatures by default)
+    :param group_by: the dimension to group on, among CUBE_GROUP_BY, None for a single total
+    :param metrics: the metrics to give (default: all of them)
+    :return: the request and the aggregates
+    """
+    type_stats = 'candidatures' if search_options.type_stats == 'all' else search_options.type_stats
+    data_cube = MasterStatsManager().data_cubes.get(type_stats)
+    if data_cube is None:
+        raise NotFound('Cube de données non construit (DATA_CUBE_ENABLED)')
+    # candidatures cubes have no mention axis: a mention is not its whole secteur disciplinaire
+    if search_options.etablissements_filter or search_options.formations_filter or \
+            (type_stats == 'candidatures' and (search_options.mois_apres_dip_filter or search_options.mentions_filter)):
+        raise ValueError("Filters on etablissements, formations (or moisApresDiplome and mentions for candidatures) "
+                         "are not available on data cubes.")
+    if group_by is not None and CUBE_GROUP_BY.get(group_by) not in data_cube.dimensions:
+        raise ValueError("Attribute groupBy of %s should be one of %s." % (
+            type_stats, ', '.join(name for name, dim in CUBE_GROUP_BY.items() if dim in data_cube.dimensions)))
+    unknown = [m for m in metrics or [] if m not in data_cube.metrics]
+    if unknown:
+        raise ValueError("Unknown metrics: %s." % ', '.join(unknown))
+    selections = dict(anneeCollecte=search_options.annee_filter, academieId=_select_academies(search_options))
+    if type_stats == 'candidatures':
+        selections['secDiscId'] = _select_sect_discs(search_options)
+    else:
+        selections['ins_disc'] = compute_ins_disc_ids(search_options)
+        if search_options.mois_apres_dip_filter:
+            selections['nbMoisApresDip'] = [search_options.mois_apres_dip_filter]
+    with time_stage('cube_query'):
+        aggregates = data_cube.aggregate(selections, search_options.annee_mini_filter,
+                                         search_options.annee_maxi_filter, CUBE_GROUP_BY.get(group_by), metrics)
+    search_options.canonicalize()
+    filters = dict((k, v) for k, v in search_options.to_dict().items() if k.endswith('_filter'))
+    return dict(request=dict(typeStats=type_stats, filters=filters, groupBy=group_by, metrics=metrics),
+                aggregates=aggregates)
+
+
+def _select_academies(search_options: StatSearchOptions) -> Optional[List[int]]:
+    academies = search_options.academies_filter
+    if search_options.regions_filter:
+        academies_df = MasterStatsManager().academies_df
+        region_academies = academies_df.loc[academies_df.regionId.isin(search_options.regions_filter), 'id'].tolist()
+        academies = region_academies if academies is None else [a for a in academies if a in region_academies]
+    return academies
+
+
+def _select_sect_discs(search_options: StatSearchOptions) -> Optional[List[int]]:
+    if not (search_options.sec_disc_filter or search_options.disciplines_filter):
+        return None
+    sect_disc_df = MasterStatsManager().sect_discs_df
+    disc_filter = pd.Series(True, index=sect_disc_df.index)
+    if search_options.sec_disc_filter:
+        disc_filter &= sect_disc_df.id.isin(search_options.sec_disc_filter)
+    if search_options.disciplines_filter:
+        disc_filter &= sect_disc_df.disciplineId.isin(search_options.disciplines_filter)
+    return sect_disc_df.loc[disc_filter, 'id'].tolist()
+
+
+def get_time_series(level: str, key: str) -> Dict:
+    """
+    Give the time series of candidatures stats of a formation or an etablissement, precomputed by the cache builder
+    :param level: formation or etablissement
+    :param key: the ifc of the formation, or the uai of the etablissement
+    :return: the years, and per metric its values, deltas and ratios with the previous year
+    """
+    if level not in TIME_SERIES_LEVELS:
+        raise NotFound("Niveau de série inconnu: %s" % level)
+    time_series = MongoDAO().database[MongoDAO.candidature_time_series_col_name].find_one(
+        {'_id': time_series_id(level, key)})
+    if time_series is None:
+        raise NotFound("Série inconnue: %s %s" % (level, key))
+    time_series.pop('_id')
+    return time_series
@@ -0,0 +1,118 @@
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from masterStats.loading.candidatures_loading import use_cand_cols
+from mongo.dao.MongoDAO import MongoDAO
+
+__all__ = ['ROLLUP_DIMENSIONS', 'ROLLUP_GROUPINGS', 'ROLLUP_COUNTER_COLS', 'canonical_grouping', 'rollup_fields',
+           'rollup_col_name', 'compute_rollup', 'merge_rollups', 'generate_rollup_docs']
+
+LOG = logging.getLogger(__name__)
+
+# Dimensions of rollups, in canonical order, with the candidatures fields they are grouped on. Parent fields of a
+# dimension (region of an academie...) do not split groups: they are kept to filter rollups on them.
+ROLLUP_DIMENSIONS = [
+    ('region', ['regionId']),
+    ('academie', ['regionId', 'academieId']),
+    ('etablissement', ['regionId', 'academieId', 'etabUai']),
+    ('discipline', ['discId']),
+    ('secteurDisciplinaire', ['discId', 'secDiscId']),
+]
+
+# Dimensions combinations of the rollups computed at build time, always per year. The empty one gives national
+# totals per year.
+ROLLUP_GROUPINGS: List[Tuple[str, ...]] = [
+    (),
+    ('region',),
+    ('academie',),
+    ('etablissement',),
+    ('discipline',),
+    ('secteurDisciplinaire',),
+    ('region', 'discipline'),
+    ('academie', 'discipline'),
+    ('academie', 'secteurDisciplinaire'),
+    ('etablissement', 'discipline'),
+    ('etablissement', 'secteurDisciplinaire'),
+]
+
+# Summed counters of candidatures stats (rang_dernier is a rank, not a counter)
+ROLLUP_COUNTER_COLS = [col for col in use_cand_cols[16:] if col.startswith('n_')]
+
+
+def canonical_grouping(dimensions: List[str]) -> Tuple[str, ...]:
+    known = [name for name, _ in ROLLUP_DIMENSIONS]
+    unknown = [d for d in dimensions if d not in known]
+    if unknown:
+        raise ValueError("Unknown groupBy dimensions: %s. Available: %s." % (', '.join(unknown), ', '.join(known)))
+    dimensions_fields = dict((name, set(fields)) for name, fields in ROLLUP_DIMENSIONS if name in dimensions)
+    # a parent dimension of another one does not change groups (region of academie...)
+    return tuple(name for name in known if name in dimensions_fields and
+                 not any(dimensions_fields[name] < fields for fields in dimensions_fields.values()))
+
+
+def rollup_fields(grouping: Tuple[str, ...]) -> List[str]:
+    """
+    Give the fields a rollup is grouped on
+    :param grouping: the dimensions of the rollup
+    :return: the candidatures fields, year last
+    """
+    fields = []
+    for name, dimension_fields in ROLLUP_DIMENSIONS:
+        if name in grouping:
+            fields.extend(f for f in dimension_fields if f not in fields)
+    return fields + ['anneeCollecte']
+
+
+def rollup_col_name(grouping: Tuple[str, ...]) -> str:
+    return MongoDAO.candidature_rollup_col_prefix + ('-'.join(grouping) if grouping else 'annee')
+
+
+def compute_rollup(stats_candidatures_df: pd.DataFrame, grouping: Tuple[str, ...]) -> pd.DataFrame:
+    """
+    Compute the rollup of candidatures stats for a grouping
+    :param stats_candidatures_df: the candidatures stats, or a chunk of them
+    :param grouping: the dimensions of the rollup
+    :return: a frame indexed by the rollup fields, with the number of stats rows ('rows'), and the sums ('sums') and
+    non-null values counts ('counts') of counters
+    """
+    grouped = stats_candidatures_df.groupby(rollup_fields(grouping), observed=True, dropna=False)
+    counters = grouped[ROLLUP_COUNTER_COLS]
+    rollup = pd.concat({'sums': counters.sum(), 'counts': counters.count()}, axis=1)
+    rollup[('rows', '')] = grouped.size()
+    return rollup
+
+
+def merge_rollups(rollup: Optional[pd.DataFrame], other: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge the rollups of two parts of candidatures stats (chunks), as if computed on the whole of them
+    :param rollup: the rollup of the first part, None if there is none yet
+    :param other: the rollup of the second part
+    :return: the merged rollup
+    """
+    if rollup is None:
+        return other
+    levels = list(range(rollup.index.nlevels))
+    return pd.concat([rollup, other]).groupby(level=levels, dropna=False).sum()
+
+
+def _to_native(value):
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def generate_rollup_docs(rollup: pd.DataFrame) -> Iterator[Dict]:
+    fields = list(rollup.index.names)
+    sums_records = rollup['sums'].to_dict(orient='records')
+    counts_records = rollup['counts'].to_dict(orient='records')
+    for key, sums, counts, rows in zip(rollup.index, sums_records, counts_records, rollup[('rows', '')].values):
+        key = key if isinstance(key, tuple) else (key,)
+        doc = dict((field, _to_native(v)) for field, v in zip(fields, key))
+        doc['rows'] = int(rows)
+        # counters are counts of people: integers, unknown if no stats row holds them
+        doc['sums'] = dict((col, int(round(sums[col])) if counts[col] else None) for col in ROLLUP_COUNTER_COLS)
+        doc['counts'] = dict((col, int(counts[col])) for col in ROLLUP_COUNTER_COLS)
+        yield doc
+
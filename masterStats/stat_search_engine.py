@@ -1,33 +1,76 @@
 import logging
-from typing import List
+import time
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+from pymongo.cursor import Cursor
 
 from masterStats.MasterStatsManager import MasterStatsManager
+from masterStats.loading.candidatures_loading import use_cand_cols
+from masterStats.loading.insertion_pro_loading import use_ins_cols
 from masterStats.search.MongoStatSearchResult import MongoStatSearchResult
 from masterStats.search.StatSearchOptions import StatSearchOptions
 from masterStats.search.StatSearchResult import StatSearchResult
+from masterStats.search.columnar_formater_utils import columnar_cand_fields, columnar_ins_fields
 from mongo.dao.MongoDAO import MongoDAO
+from mongo.dao.explain_utils import summarize_explain
 from mongo.repository.CandidatureRepository import CandidatureRepository
 from mongo.repository.InsertionProRepository import InsertionProRepository
+from monitoring.metrics import time_stage, count_result_rows
 
-__all__ = ['search_stats', 'search_candidatures', 'search_insertions_pro']
+__all__ = ['search_stats', 'search_candidatures', 'search_insertions_pro', 'explain_search_stats',
+           'estimate_search_stats', 'create_candidatures_mongo_filter', 'create_insertions_pro_mongo_filter',
+           'compute_ins_disc_ids', 'facet_candidatures', 'rank_stats', 'RANKED_STATS']
 
 LOG = logging.getLogger(__name__)
 
 
-def search_stats(search_options: StatSearchOptions) -> StatSearchResult:
-    result = MongoStatSearchResult(search_options)  # StatSearchResult(search_options)
+def search_stats(search_options: StatSearchOptions, frame_filters: Optional[Dict] = None) -> StatSearchResult:
+    """
+    Search stats with the configured backend
+    :param search_options: the search options
+    :param frame_filters: frame masks already computed for the search by estimate_search_stats, reused by the pandas
+    backend
+    :return: the search result
+    """
+    if MasterStatsManager().configuration.get('STATS_SEARCH_BACKEND', 'mongo') == 'pandas':
+        result = StatSearchResult(search_options)
+        cands_search = partial(search_candidatures, frame_filters=frame_filters)
+        inspros_search = partial(search_insertions_pro, frame_filters=frame_filters)
+    else:
+        result = MongoStatSearchResult(search_options)
+        cands_search, inspros_search = mongo_search_candidatures, mongo_search_insertions_pro
     if search_options.type_stats == 'all' or search_options.type_stats == 'candidatures':
-        result.candidatures_found = mongo_search_candidatures(search_options)  # search_candidatures(search_options)
+        result.candidatures_found = cands_search(search_options)
     if search_options.type_stats == 'all' or search_options.type_stats == 'insertionsPro':
-        result.insertions_pro_found = mongo_search_insertions_pro(
-            search_options)  # search_insertions_pro(search_options)
+        result.insertions_pro_found = inspros_search(search_options)
+    if result.candidatures_found is not None:
+        count_result_rows('candidatures', len(result.candidatures_found))
+    if result.insertions_pro_found is not None:
+        count_result_rows('insertionsPro', len(result.insertions_pro_found))
     return result
 
 
-def search_candidatures(search_options: StatSearchOptions):
+def search_candidatures(search_options: StatSearchOptions, frame_filters: Optional[Dict] = None):
     original_cands = MasterStatsManager().stats_candidatures_df
+    cands_filter = _get_frame_filter(frame_filters, 'candidatures', original_cands, search_options,
+                                     _create_candidatures_frame_filter)
+    with time_stage('dataframe_query'):
+        found_cands = original_cands.loc[cands_filter, :] if cands_filter is not True else original_cands
+        return _paginate_frame(found_cands, search_options)
+
+
+def _get_frame_filter(frame_filters: Optional[Dict], kind: str, df: pd.DataFrame, search_options: StatSearchOptions,
+                      create_frame_filter):
+    # the mask of the cost estimate is only valid for the frame it was computed on, frames being replaced on reload
+    if frame_filters is not None and kind in frame_filters and frame_filters[kind][0] is df:
+        return frame_filters[kind][1]
+    return create_frame_filter(df, search_options)
+
+
+def _create_candidatures_frame_filter(original_cands: pd.DataFrame, search_options: StatSearchOptions):
     cands_filter = True
     if search_options.regions_filter:
         cands_filter &= _filter_serie_on_single_or_many_values(original_cands.regionId, search_options.regions_filter)
@@ -53,11 +96,10 @@ def search_candidatures(search_options: StatSearchOptions):
         cands_filter &= original_cands.anneeCollecte >= search_options.annee_mini_filter
     if search_options.annee_maxi_filter:
         cands_filter &= original_cands.anneeCollecte < search_options.annee_maxi_filter
-
-    return original_cands.loc[cands_filter, :] if cands_filter is not True else original_cands
+    return cands_filter
 
 
-def mongo_search_candidatures(search_options: StatSearchOptions):
+def create_candidatures_mongo_filter(search_options: StatSearchOptions) -> dict:
     cands_filter = dict()
     if search_options.regions_filter:
         add_mongo_filter_on_single_or_many_values(cands_filter, 'regionId', search_options.regions_filter)
@@ -73,29 +115,12 @@ def mongo_search_candidatures(search_options: StatSearchOptions):
         add_mongo_filter_on_single_or_many_values(cands_filter, 'secDiscId', search_options.sec_disc_filter)
     if search_options.disciplines_filter:
         add_mongo_filter_on_single_or_many_values(cands_filter, 'discId', search_options.disciplines_filter)
+    _add_mongo_annee_filter(cands_filter, search_options)
+    return cands_filter
 
-    if search_options.annee_filter or search_options.annee_mini_filter or search_options.annee_maxi_filter:
-        annee_filter = dict()
-        if search_options.annee_filter:
-            if len(search_options.annee_filter) == 1:
-                annee_filter['$eq'] = search_options.annee_filter[0]
-            else:
-                annee_filter['$in'] = search_options.annee_filter
-        if search_options.annee_mini_filter:
-            annee_filter['$gte'] = search_options.annee_mini_filter
-        if search_options.annee_maxi_filter:
-            annee_filter['$lt'] = search_options.annee_maxi_filter
-        cands_filter['anneeCollecte'] = annee_filter
-
-    LOG.info("Cand filter: %s" % str(cands_filter))
-    mongo_dao = MongoDAO()
-    candidature_repo: CandidatureRepository = CandidatureRepository(mongo_dao.database)
-    return list(candidature_repo.find_by(cands_filter))
 
-
-def mongo_search_insertions_pro(search_options: StatSearchOptions):
+def create_insertions_pro_mongo_filter(search_options: StatSearchOptions) -> dict:
     inspro_filter = dict()
-
     if search_options.regions_filter:
         add_mongo_filter_on_single_or_many_values(inspro_filter, 'regionId', search_options.regions_filter)
     if search_options.academies_filter:
@@ -104,6 +129,14 @@ def mongo_search_insertions_pro(search_options: StatSearchOptions):
         add_mongo_filter_on_single_or_many_values(inspro_filter, 'etabUai', search_options.etablissements_filter)
     if search_options.mois_apres_dip_filter:
         inspro_filter['nbMoisApresDip'] = search_options.mois_apres_dip_filter
+    _add_mongo_annee_filter(inspro_filter, search_options)
+    ins_disc = compute_ins_disc_ids(search_options)
+    if ins_disc is not None:
+        inspro_filter['ins_disc'] = {'$in': ins_disc}
+    return inspro_filter
+
+
+def _add_mongo_annee_filter(filter: dict, search_options: StatSearchOptions):
     if search_options.annee_filter or search_options.annee_mini_filter or search_options.annee_maxi_filter:
         annee_filter = dict()
         if search_options.annee_filter:
@@ -115,32 +148,231 @@ def mongo_search_insertions_pro(search_options: StatSearchOptions):
             annee_filter['$gte'] = search_options.annee_mini_filter
         if search_options.annee_maxi_filter:
             annee_filter['$lt'] = search_options.annee_maxi_filter
-        inspro_filter['anneeCollecte'] = annee_filter
-
-    if search_options.mentions_filter or search_options.sec_disc_filter or search_options.disciplines_filter:
-        sect_disc_df = MasterStatsManager().sect_discs_df
-        disc_filter = True
-        if search_options.mentions_filter:
-            mentions_df = MasterStatsManager().mentions_df
-            mentions_disc_test = _filter_serie_on_single_or_many_values(mentions_df.index,
-                                                                        search_options.mentions_filter)
-            mentions_disc_id = mentions_df.loc[mentions_disc_test, :].secDiscId.unique()
-            disc_filter &= sect_disc_df.index.isin(mentions_disc_id)
-        if search_options.sec_disc_filter:
-            disc_filter &= _filter_serie_on_single_or_many_values(sect_disc_df.index, search_options.sec_disc_filter)
-        if search_options.disciplines_filter:
-            disc_filter &= _filter_serie_on_single_or_many_values(sect_disc_df.disciplineId,
-                                                                  search_options.disciplines_filter)
-        ins_disc = sect_disc_df.loc[disc_filter, 'insDiscId'].unique().tolist()
-        inspro_filter['ins_disc'] = {'$in': ins_disc}
+        filter['anneeCollecte'] = annee_filter
+    return filter
+
+
+def compute_ins_disc_ids(search_options: StatSearchOptions) -> Optional[List[str]]:
+    """
+    Translate mentions, sect. disc. and disciplines filters into insertions pro disciplines
+    :param search_options: the search options
+    :return: the list of insertions pro disciplines ids, or None if there is no filter to translate
+    """
+    if not (search_options.mentions_filter or search_options.sec_disc_filter or search_options.disciplines_filter):
+        return None
+    sect_disc_df = MasterStatsManager().sect_discs_df
+    disc_filter = True
+    if search_options.mentions_filter:
+        mentions_df = MasterStatsManager().mentions_df
+        mentions_disc_test = _filter_serie_on_single_or_many_values(mentions_df.id, search_options.mentions_filter)
+        mentions_disc_id = mentions_df.loc[mentions_disc_test, :].secDiscId.unique()
+        disc_filter &= sect_disc_df.id.isin(mentions_disc_id)
+    if search_options.sec_disc_filter:
+        disc_filter &= _filter_serie_on_single_or_many_values(sect_disc_df.id, search_options.sec_disc_filter)
+    if search_options.disciplines_filter:
+        disc_filter &= _filter_serie_on_single_or_many_values(sect_disc_df.disciplineId,
+                                                              search_options.disciplines_filter)
+    return sect_disc_df.loc[disc_filter, 'insDiscId'].unique().tolist()
+
+
+def mongo_search_candidatures(search_options: StatSearchOptions):
+    cands_filter = create_candidatures_mongo_filter(search_options)
+    LOG.debug("Cand filter: %s", cands_filter)
+    mongo_dao = MongoDAO()
+    candidature_repo: CandidatureRepository = CandidatureRepository(mongo_dao.database)
+    if search_options.response_format == 'columnar':
+        return _mongo_search_columns(candidature_repo.get_collection(), cands_filter,
+                                     columnar_cand_fields(search_options.cand_details), search_options)
+    with time_stage('mongo_query'):
+        documents = list(_paginate_cursor(candidature_repo.get_collection().find(cands_filter), search_options))
+    with time_stage('document_decode'):
+        return [candidature_repo.to_model(doc) for doc in documents]
+
 
+def mongo_search_insertions_pro(search_options: StatSearchOptions):
+    inspro_filter = create_insertions_pro_mongo_filter(search_options)
     mongo_dao = MongoDAO()
     insertionpro_repo: InsertionProRepository = InsertionProRepository(mongo_dao.database)
-    return list(insertionpro_repo.find_by(inspro_filter))
+    if search_options.response_format == 'columnar':
+        return _mongo_search_columns(insertionpro_repo.get_collection(), inspro_filter,
+                                     columnar_ins_fields(search_options.inspro_details), search_options)
+    with time_stage('mongo_query'):
+        documents = list(_paginate_cursor(insertionpro_repo.get_collection().find(inspro_filter), search_options))
+    with time_stage('document_decode'):
+        return [insertionpro_repo.to_model(doc) for doc in documents]
+
+
+def _mongo_search_columns(collection, mongo_filter: Dict, fields: List[str],
+                          search_options: StatSearchOptions) -> pd.DataFrame:
+    """
+    Search stats for a columnar response: only the fields of the response are fetched, and gathered in columns
+    without building models
+    :return: the found stats, one column per field, values kept as stored (object columns)
+    """
+    with time_stage('mongo_query'):
+        documents = list(_paginate_cursor(collection.find(mongo_filter, projection=_get_columns_projection(fields)),
+                                          search_options))
+    with time_stage('document_decode'):
+        return pd.DataFrame(dict((f, pd.Series([doc.get(f) for doc in documents], dtype=object)) for f in fields),
+                            columns=fields)
+
+
+def _get_columns_projection(fields: List[str]) -> Dict:
+    projection = dict.fromkeys(fields, 1)
+    projection['_id'] = 0
+    return projection
+
+
+def _get_find_pagination(search_options: StatSearchOptions) -> Dict:
+    # sort, skip and limit options of the find command, as added by _paginate_cursor
+    if search_options.offset is None and search_options.limit is None:
+        return dict()
+    pagination = dict(sort={'_id': 1})
+    if search_options.offset:
+        pagination['skip'] = search_options.offset
+    if search_options.limit is not None:
+        pagination['limit'] = search_options.limit
+    return pagination
+
+
+def _paginate_cursor(cursor: Cursor, search_options: StatSearchOptions) -> Cursor:
+    if search_options.offset is None and search_options.limit is None:
+        return cursor
+    # stable pages
+    cursor = cursor.sort('_id', 1)
+    if search_options.offset:
+        cursor = cursor.skip(search_options.offset)
+    if search_options.limit is not None:
+        cursor = cursor.limit(search_options.limit)
+    return cursor
+
+
+def estimate_search_stats(search_options: StatSearchOptions, max_rows: Optional[int] = None,
+                          frame_filters: Optional[Dict] = None) -> Dict:
+    """
+    Estimate the rows and bytes a stats search would return, without fetching them: rows are counted with the filters
+    of the search backend (mongo counts or frame masks), pagination included, and bytes are estimated from the average
+    size of mongo documents
+    :param search_options: the search options
+    :param max_rows: counts stop beyond max_rows, as they only need to be compared with it (None for exact counts)
+    :param frame_filters: if given, gets the frame masks computed per type of stats, for search_stats to reuse them
+    :return: per type of stats and in total, the estimated rows and bytes (None if the average size is unknown)
+    """
+    pandas_backend = MasterStatsManager().configuration.get('STATS_SEARCH_BACKEND', 'mongo') == 'pandas'
+    estimate = dict(rows=0, bytes=0)
+    searched = []
+    if search_options.type_stats == 'all' or search_options.type_stats == 'candidatures':
+        searched.append(('candidatures', MongoDAO.candidature_col_name, create_candidatures_mongo_filter,
+                         MasterStatsManager().stats_candidatures_df, _create_candidatures_frame_filter))
+    if search_options.type_stats == 'all' or search_options.type_stats == 'insertionsPro':
+        searched.append(('insertionsPro', MongoDAO.insertionpro_col_name, create_insertions_pro_mongo_filter,
+                         MasterStatsManager().stats_insertionspro_df, _create_insertions_pro_frame_filter))
+    with time_stage('cost_estimation'):
+        for kind, col_name, create_mongo_filter, df, create_frame_filter in searched:
+            if pandas_backend:
+                frame_filter = create_frame_filter(df, search_options)
+                rows = len(df) if frame_filter is True else int(frame_filter.sum())
+                if frame_filters is not None:
+                    frame_filters[kind] = (df, frame_filter)
+            else:
+                rows = _count_mongo_documents(col_name, create_mongo_filter(search_options), search_options,
+                                              max_rows)
+            rows = max(rows - (search_options.offset or 0), 0)
+            if search_options.limit is not None:
+                rows = min(rows, search_options.limit)
+            avg_document_size = _get_average_document_size(col_name)
+            kind_bytes = int(rows * avg_document_size) if avg_document_size is not None else None
+            estimate[kind] = dict(rows=rows, bytes=kind_bytes)
+            estimate['rows'] += rows
+            if kind_bytes is None or estimate['bytes'] is None:
+                estimate['bytes'] = None
+            else:
+                estimate['bytes'] += kind_bytes
+    return estimate
+
+
+def _count_mongo_documents(col_name: str, filter: dict, search_options: StatSearchOptions,
+                           max_rows: Optional[int]) -> int:
+    collection = MongoDAO().database[col_name]
+    if not filter:
+        return collection.estimated_document_count()
+    count_opts = dict()
+    if max_rows is not None:
+        count_opts['limit'] = (search_options.offset or 0) + max_rows + 1
+    return collection.count_documents(filter, **count_opts)
+
+
+# collection name -> (time of computation, average document size)
+_average_document_sizes: Dict[str, Tuple[float, Optional[float]]] = dict()
+AVERAGE_DOCUMENT_SIZE_TTL = 600.
+
+
+def _get_average_document_size(col_name: str) -> Optional[float]:
+    computed = _average_document_sizes.get(col_name)
+    if computed is not None and time.monotonic() - computed[0] < AVERAGE_DOCUMENT_SIZE_TTL:
+        return computed[1]
+    try:
+        avg_document_size = MongoDAO().get_average_document_size(col_name)
+    except Exception as e:
+        LOG.debug("Cannot get average document size of %s: %s", col_name, str(e))
+        avg_document_size = None
+    _average_document_sizes[col_name] = (time.monotonic(), avg_document_size)
+    return avg_document_size
+
+
+def explain_search_stats(search_options: StatSearchOptions) -> Dict:
+    """
+    Explain the mongo queries a stats search would run, without fetching any data
+    :param search_options: the search options
+    :return: per type of stats, the filter, projection (None if all fields are fetched) and pagination (sort, skip and
+    limit, None if not paginated) sent, the plan chosen by mongo with its examined and returned documents counts, and
+    the estimated response size (None if the average size of documents is unknown)
+    """
+    mongo_dao = MongoDAO()
+    explanation = dict(request=search_options.to_dict())
+    # columnar searches only fetch the fields of the response
+    columnar = search_options.response_format == 'columnar'
+    if search_options.type_stats == 'all' or search_options.type_stats == 'candidatures':
+        projection = _get_columns_projection(columnar_cand_fields(search_options.cand_details)) if columnar else None
+        explanation['candidatures'] = _explain_mongo_find(mongo_dao, MongoDAO.candidature_col_name,
+                                                          create_candidatures_mongo_filter(search_options),
+                                                          projection, search_options)
+    if search_options.type_stats == 'all' or search_options.type_stats == 'insertionsPro':
+        projection = _get_columns_projection(columnar_ins_fields(search_options.inspro_details)) if columnar else None
+        explanation['insertionsPro'] = _explain_mongo_find(mongo_dao, MongoDAO.insertionpro_col_name,
+                                                           create_insertions_pro_mongo_filter(search_options),
+                                                           projection, search_options)
+        explanation['insertionsPro']['insDiscIds'] = compute_ins_disc_ids(search_options)
+    return explanation
+
 
+def _explain_mongo_find(mongo_dao: MongoDAO, col_name: str, filter: dict, projection: Optional[dict],
+                        search_options: StatSearchOptions) -> Dict:
+    pagination = _get_find_pagination(search_options)
+    plan = summarize_explain(mongo_dao.explain_find(col_name, filter, projection, **pagination))
+    avg_document_size = _get_average_document_size(col_name)
+    return {
+        'collection': col_name,
+        'filter': filter,
+        'projection': projection,
+        'pagination': pagination or None,
+        'plan': plan,
+        'collectionDocuments': mongo_dao.database[col_name].estimated_document_count(),
+        'estimatedResponseBytes': plan['nReturned'] * avg_document_size
+        if plan['nReturned'] is not None and avg_document_size is not None else None
+    }
 
-def search_insertions_pro(search_options: StatSearchOptions):
+
+def search_insertions_pro(search_options: StatSearchOptions, frame_filters: Optional[Dict] = None):
     original_inspro = MasterStatsManager().stats_insertionspro_df
+    inspro_filter = _get_frame_filter(frame_filters, 'insertionsPro', original_inspro, search_options,
+                                      _create_insertions_pro_frame_filter)
+    with time_stage('dataframe_query'):
+        found_inspro = original_inspro.loc[inspro_filter, :] if inspro_filter is not True else original_inspro
+        return _paginate_frame(found_inspro, search_options)
+
+
+def _create_insertions_pro_frame_filter(original_inspro: pd.DataFrame, search_options: StatSearchOptions):
     inspro_filter = True
     if search_options.regions_filter:
         inspro_filter &= _filter_serie_on_single_or_many_values(original_inspro.regionId, search_options.regions_filter)
@@ -160,24 +392,17 @@ def search_insertions_pro(search_options: StatSearchOptions):
     if search_options.mois_apres_dip_filter:
         inspro_filter &= original_inspro.nbMoisApresDip == search_options.mois_apres_dip_filter
 
-    if search_options.mentions_filter or search_options.sec_disc_filter or search_options.disciplines_filter:
-        sect_disc_df = MasterStatsManager().sect_discs_df
-        disc_filter = True
-        if search_options.mentions_filter:
-            mentions_df = MasterStatsManager().mentions_df
-            mentions_disc_test = _filter_serie_on_single_or_many_values(mentions_df.index,
-                                                                        search_options.mentions_filter)
-            mentions_disc_id = mentions_df.loc[mentions_disc_test, :].secDiscId.unique()
-            disc_filter &= sect_disc_df.index.isin(mentions_disc_id)
-        if search_options.sec_disc_filter:
-            disc_filter &= _filter_serie_on_single_or_many_values(sect_disc_df.index, search_options.sec_disc_filter)
-        if search_options.disciplines_filter:
-            disc_filter &= _filter_serie_on_single_or_many_values(sect_disc_df.disciplineId,
-                                                                  search_options.disciplines_filter)
-        ins_disc = sect_disc_df.loc[disc_filter, 'insDiscId'].unique()
+    ins_disc = compute_ins_disc_ids(search_options)
+    if ins_disc is not None:
         inspro_filter &= original_inspro.ins_disc.isin(ins_disc)
+    return inspro_filter
+
 
-    return original_inspro.loc[inspro_filter, :] if inspro_filter is not True else original_inspro
+def _paginate_frame(df: pd.DataFrame, search_options: StatSearchOptions) -> pd.DataFrame:
+    if search_options.offset is None and search_options.limit is None:
+        return df
+    offset = search_options.offset or 0
+    return df.iloc[offset:offset + search_options.limit if search_options.limit is not None else None]
 
 
 def _filter_serie_on_single_or_many_values(serie: pd.Series, values: List):
@@ -195,3 +420,249 @@ def add_mongo_filter_on_single_or_many_values(filter: dict, attr_name: str, valu
             '$in': values
         }
     return filter
+
+
+# Facets of candidatures searches: name, field and the search options attributes filtering on it
+CANDIDATURES_FACETS = [
+    ('regions', 'regionId', ['regions_filter']),
+    ('academies', 'academieId', ['academies_filter']),
+    ('disciplines', 'discId', ['disciplines_filter']),
+    ('annees', 'anneeCollecte', ['annee_filter', 'annee_mini_filter', 'annee_maxi_filter']),
+]
+
+
+def facet_candidatures(search_options: StatSearchOptions) -> Dict:
+    """
+    Count candidatures stats rows per region, academie, discipline and year in a single pass. Each facet ignores
+    the filters on its own field (drill-down: other values of the field remain selectable).
+    :param search_options: the search options
+    :return: the number of rows matching all filters, and per facet, the counts per value, sorted by value
+    """
+    if MasterStatsManager().configuration.get('STATS_SEARCH_BACKEND', 'mongo') == 'pandas':
+        facets, total = _facet_candidatures_frame(search_options)
+    else:
+        facets, total = _facet_candidatures_mongo(search_options)
+    return dict(request=search_options.to_dict(), total=total, facets=facets)
+
+
+def _without_filters(search_options: StatSearchOptions, attr_names: List[str]) -> StatSearchOptions:
+    options = StatSearchOptions()
+    for attr_name in StatSearchOptions.__slots__:
+        setattr(options, attr_name, None if attr_name in attr_names else getattr(search_options, attr_name))
+    return options
+
+
+def _facet_candidatures_mongo(search_options: StatSearchOptions) -> Tuple[Dict, int]:
+    facets_attrs = [attr for _, _, attrs in CANDIDATURES_FACETS for attr in attrs]
+    # filters out of facets are matched once, before facets
+    base_filter = create_candidatures_mongo_filter(_without_filters(search_options, facets_attrs))
+    full_filter = create_candidatures_mongo_filter(search_options)
+    facet_stages = dict()
+    for name, field, attrs in CANDIDATURES_FACETS:
+        facet_filter = create_candidatures_mongo_filter(_without_filters(search_options, attrs))
+        facet_stages[name] = [{'$match': dict((k, v) for k, v in facet_filter.items() if k not in base_filter)},
+                              {'$group': {'_id': '$' + field, 'count': {'$sum': 1}}},
+                              {'$sort': {'_id': 1}}]
+    facet_stages['total'] = [{'$match': dict((k, v) for k, v in full_filter.items() if k not in base_filter)},
+                             {'$count': 'count'}]
+    with time_stage('mongo_query'):
+        result = next(MongoDAO().database[MongoDAO.candidature_col_name].aggregate(
+            [{'$match': base_filter}, {'$facet': facet_stages}]))
+    facets = dict((name, [dict(value=f['_id'], count=f['count']) for f in result[name] if f['_id'] is not None])
+                  for name, _, _ in CANDIDATURES_FACETS)
+    return facets, result['total'][0]['count'] if result['total'] else 0
+
+
+def _facet_candidatures_frame(search_options: StatSearchOptions) -> Tuple[Dict, int]:
+    original_cands = MasterStatsManager().stats_candidatures_df
+    nb_rows = len(original_cands)
+    facets_attrs = [attr for _, _, attrs in CANDIDATURES_FACETS for attr in attrs]
+
+    def to_mask(frame_filter) -> np.ndarray:
+        return np.ones(nb_rows, dtype=bool) if frame_filter is True else frame_filter.to_numpy(dtype=bool)
+
+    with time_stage('dataframe_query'):
+        base_mask = to_mask(_create_candidatures_frame_filter(
+            original_cands, _without_filters(search_options, facets_attrs)))
+        # mask of each facet own filters
+        facet_masks = [to_mask(_create_candidatures_frame_filter(
+            original_cands, _without_filters(search_options, [a for a in facets_attrs if a not in attrs])))
+            for _, _, attrs in CANDIDATURES_FACETS]
+        facets = dict()
+        for i, (name, field, _) in enumerate(CANDIDATURES_FACETS):
+            mask = base_mask.copy()
+            for j, other_mask in enumerate(facet_masks):
+                if j != i:
+                    mask &= other_mask
+            codes, values = _get_facet_codes(original_cands, field)
+            counts = np.bincount(codes[mask & (codes >= 0)], minlength=len(values))
+            facets[name] = [dict(value=v.item() if hasattr(v, 'item') else v, count=int(c))
+                            for v, c in zip(values, counts) if c]
+        total = int(np.logical_and.reduce([base_mask] + facet_masks).sum())
+    return facets, total
+
+
+def _get_facet_codes(df: pd.DataFrame, field: str) -> Tuple[np.ndarray, np.ndarray]:
+    def factorize():
+        codes, values = pd.factorize(df[field], sort=True)
+        return codes, np.asarray(values)
+
+    return MasterStatsManager().frame_derived_cache.get(df, ('facet_codes', field), factorize)
+
+
+# Derived metrics of candidatures rankings: ratios of counters (numerator, denominator), and the growth of candidates
+# since the previous year of the formation
+RANKING_RATIOS = {
+    'selectivite': ('n_accept', 'n_can'),
+    'tauxProposition': ('n_prop', 'n_can'),
+    'tauxFemmes': ('n_can_femme', 'n_can'),
+}
+RANKING_GROWTHS = {
+    'evolutionCandidats': 'n_can',
+}
+# Per type of stats: collection, ranked metrics, and fields identifying ranked rows
+RANKED_STATS = {
+    'candidatures': (MongoDAO.candidature_col_name,
+                     use_cand_cols[16:] + list(RANKING_RATIOS) + list(RANKING_GROWTHS),
+                     ['formationIfc', 'etabUai', 'mentionId', 'secDiscId', 'academieId', 'anneeCollecte']),
+    'insertionsPro': (MongoDAO.insertionpro_col_name,
+                      use_ins_cols[6:],
+                      ['etabUai', 'ins_disc', 'academieId', 'anneeCollecte', 'nbMoisApresDip']),
+}
+
+
+def rank_stats(search_options: StatSearchOptions, metric: str, k: int, ascending: bool = False) -> Dict:
+    """
+    Give the k stats rows with the highest (or lowest) value of a metric among the rows matching the search filters.
+    Rows without value are ignored. The type of stats is the one of the metric.
+    :param search_options: the search options (filters)
+    :param metric: a metric of candidatures or insertions pro stats, raw or derived (RANKING_RATIOS, RANKING_GROWTHS)
+    :param k: the number of rows
+    :param ascending: True for the lowest values first
+    :return: the request and the ranked rows: identifying fields, value and rank
+    """
+    type_stats = next((t for t, (_, metrics, _) in RANKED_STATS.items() if metric in metrics), None)
+    if type_stats is None:
+        raise ValueError("Unknown metric: %s. Available: %s." % (
+            metric, ', '.join(m for _, metrics, _ in RANKED_STATS.values() for m in metrics)))
+    if search_options.type_stats not in ('all', type_stats):
+        raise ValueError("Metric %s is a metric of %s stats." % (metric, type_stats))
+    max_k = MasterStatsManager().configuration.get('TOP_MAX_K', 100)
+    if not 0 < k <= max_k:
+        raise ValueError("Attribute k should be between 1 and %d." % max_k)
+    if MasterStatsManager().configuration.get('STATS_SEARCH_BACKEND', 'mongo') == 'pandas':
+        ranked = _rank_stats_frame(type_stats, search_options, metric, k, ascending)
+    else:
+        ranked = _rank_stats_mongo(type_stats, search_options, metric, k, ascending)
+    for rank, row in enumerate(ranked, start=1):
+        row['rang'] = rank
+    count_result_rows(type_stats, len(ranked))
+    return dict(request=search_options.to_dict(), typeStats=type_stats, metric=metric,
+                order='asc' if ascending else 'desc', results=ranked)
+
+
+def _mongo_ranking_value(metric: str):
+    if metric in RANKING_RATIOS:
+        numerator, denominator = RANKING_RATIOS[metric]
+        return {'$cond': [{'$gt': ['$' + denominator, 0]}, {'$divide': ['$' + numerator, '$' + denominator]}, None]}
+    if metric in RANKING_GROWTHS:
+        # null if the previous row of the formation is not the previous year
+        return {'$cond': [{'$and': [{'$gt': ['$previous', 0]},
+                                    {'$eq': ['$previousAnnee', {'$subtract': ['$anneeCollecte', 1]}]}]},
+                          {'$subtract': [{'$divide': ['$' + RANKING_GROWTHS[metric], '$previous']}, 1]}, None]}
+    return '$' + metric
+
+
+def _rank_stats_mongo(type_stats: str, search_options: StatSearchOptions, metric: str, k: int,
+                      ascending: bool) -> List[Dict]:
+    col_name, _, fields = RANKED_STATS[type_stats]
+    create_filter = create_candidatures_mongo_filter if type_stats == 'candidatures' \
+        else create_insertions_pro_mongo_filter
+    # null and NaN values are below -Infinity in the BSON order
+    known_value = {'$gte': float('-inf')}
+    projection = dict((field, 1) for field in fields)
+    collection = MongoDAO().database[col_name]
+    if metric not in RANKING_RATIOS and metric not in RANKING_GROWTHS:
+        # sorted (indexed) query: only the k first rows are read
+        mongo_filter = create_filter(search_options)
+        mongo_filter[metric] = known_value
+        with time_stage('mongo_query'):
+            documents = list(collection.find(mongo_filter, projection=dict(projection, **{metric: 1, '_id': 0}),
+                                              sort=[(metric, 1 if ascending else -1), ('_id', 1)], limit=k))
+        for doc in documents:
+            doc['value'] = doc.pop(metric)
+    else:
+        pipeline = []
+        if metric in RANKING_GROWTHS:
+            # the previous year of a formation is looked for before filtering years
+            pipeline.append({'$match': create_filter(_without_filters(
+                search_options, ['annee_filter', 'annee_mini_filter', 'annee_maxi_filter']))})
+            pipeline.append({'$setWindowFields': {
+                'partitionBy': '$formationIfc', 'sortBy': {'anneeCollecte': 1},
+                'output': {'previous': {'$shift': {'output': '$' + RANKING_GROWTHS[metric], 'by': -1}},
+                           'previousAnnee': {'$shift': {'output': '$anneeCollecte', 'by': -1}}}}})
+        pipeline.append({'$match': create_filter(search_options)})
+        # $sort followed by $limit only keeps the k first rows in memory
+        pipeline += [{'$addFields': {'value': _mongo_ranking_value(metric)}},
+                     {'$match': {'value': known_value}},
+                     {'$sort': {'value': 1 if ascending else -1, '_id': 1}},
+                     {'$limit': k},
+                     {'$project': dict(projection, value=1, _id=0)}]
+        with time_stage('mongo_query'):
+            documents = list(collection.aggregate(pipeline))
+    return [dict(((field, doc.get(field)) for field in fields), valeur=doc['value']) for doc in documents]
+
+
+def _rank_stats_frame(type_stats: str, search_options: StatSearchOptions, metric: str, k: int,
+                      ascending: bool) -> List[Dict]:
+    _, _, fields = RANKED_STATS[type_stats]
+    if type_stats == 'candidatures':
+        df = MasterStatsManager().stats_candidatures_df
+        frame_filter = _create_candidatures_frame_filter(df, search_options)
+    else:
+        df = MasterStatsManager().stats_insertionspro_df
+        frame_filter = _create_insertions_pro_frame_filter(df, search_options)
+    with time_stage('dataframe_query'):
+        values = _get_ranking_values(df, type_stats, metric)
+        known = ~np.isnan(values)
+        if frame_filter is not True:
+            known &= frame_filter.to_numpy(dtype=bool)
+        candidates = np.flatnonzero(known)
+        keys = values[candidates] if ascending else -values[candidates]
+        if len(candidates) > k:
+            # the k best rows, without sorting the other ones (ties at the k-th value are resolved by row order)
+            kth = np.partition(keys, k - 1)[k - 1]
+            selected = np.flatnonzero(keys <= kth)
+            candidates, keys = candidates[selected], keys[selected]
+        top = candidates[np.lexsort((candidates, keys))[:k]]
+        rows = df.iloc[top][fields]
+        # missing values of compact dtypes as null
+        rows = rows.astype(object).where(rows.notna(), None)
+    return [dict(row, valeur=float(value)) for row, value in zip(rows.to_dict(orient='records'), values[top])]
+
+
+def _get_ranking_values(df: pd.DataFrame, type_stats: str, metric: str) -> np.ndarray:
+    return MasterStatsManager().frame_derived_cache.get(df, ('ranking_values', type_stats, metric),
+                                                        lambda: _compute_ranking_values(df, metric))
+
+
+def _compute_ranking_values(df: pd.DataFrame, metric: str) -> np.ndarray:
+    if metric in RANKING_RATIOS:
+        numerator, denominator = (df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                                  for col in RANKING_RATIOS[metric])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(denominator > 0, numerator / denominator, np.nan)
+    elif metric in RANKING_GROWTHS:
+        counter = df[RANKING_GROWTHS[metric]].to_numpy(dtype=np.float64, na_value=np.nan)
+        # rows of each formation by year: the previous row is kept if it is the previous year (no missing year)
+        ifcs = pd.factorize(df['formationIfc'])[0]
+        years = df['anneeCollecte'].to_numpy(dtype=np.float64, na_value=np.nan)
+        order = np.lexsort((years, ifcs))
+        previous = np.full(len(df), np.nan)
+        consecutive = (ifcs[order][1:] == ifcs[order][:-1]) & (years[order][1:] - years[order][:-1] == 1)
+        previous[order[1:][consecutive]] = counter[order[:-1][consecutive]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(previous > 0, counter / previous - 1, np.nan)
+    else:
+        values = df[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+    return values
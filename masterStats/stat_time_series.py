@@ -0,0 +1,110 @@
+import logging
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['TIME_SERIES_LEVELS', 'TIME_SERIES_METRICS', 'time_series_id', 'compute_time_series_part',
+           'merge_time_series_parts', 'generate_time_series_docs']
+
+LOG = logging.getLogger(__name__)
+
+# Levels of time series, with the candidatures field they are keyed on
+TIME_SERIES_LEVELS = {'formation': 'formationIfc', 'etablissement': 'etabUai'}
+
+# Counters summed per year (over the formations of an etablissement)
+TIME_SERIES_SUMMED_COLS = ['col', 'n_can', 'n_accept']
+# Ranks, only meaningful for a formation (one stats row per year)
+TIME_SERIES_RANK_COLS = {'formation': ['rang_dernier'], 'etablissement': []}
+
+# Metrics of time series, per level: counters, ranks, and the selectivity (n_accept / n_can)
+TIME_SERIES_METRICS = dict((level, TIME_SERIES_SUMMED_COLS + TIME_SERIES_RANK_COLS[level] + ['selectivite'])
+                           for level in TIME_SERIES_LEVELS)
+
+# suffix of columns of parts counting the non-null values of a counter
+_COUNT_SUFFIX = '__count'
+
+
+def time_series_id(level: str, key: str) -> str:
+    return '%s:%s' % (level, key)
+
+
+def compute_time_series_part(stats_candidatures_df: pd.DataFrame, level: str) -> pd.DataFrame:
+    """
+    Compute the per year aggregates of candidatures stats of a time series level
+    :param stats_candidatures_df: the candidatures stats, or a chunk of them
+    :param level: the level, among TIME_SERIES_LEVELS
+    :return: a frame indexed by the level field and the year, with the sums and non-null counts of counters, and the
+    max of ranks
+    """
+    grouped = stats_candidatures_df.groupby([TIME_SERIES_LEVELS[level], 'anneeCollecte'], observed=True)
+    part = grouped[TIME_SERIES_SUMMED_COLS].sum()
+    counts = grouped[TIME_SERIES_SUMMED_COLS].count()
+    for col in TIME_SERIES_SUMMED_COLS:
+        part[col + _COUNT_SUFFIX] = counts[col]
+    for col in TIME_SERIES_RANK_COLS[level]:
+        part[col] = grouped[col].max()
+    return part
+
+
+def merge_time_series_parts(part: Optional[pd.DataFrame], other: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge the aggregates of two parts of candidatures stats (chunks), as if computed on the whole of them
+    :param part: the aggregates of the first part, None if there is none yet
+    :param other: the aggregates of the second part
+    :return: the merged aggregates
+    """
+    if part is None:
+        return other
+    aggregations = dict((col, 'max' if col not in TIME_SERIES_SUMMED_COLS and not col.endswith(_COUNT_SUFFIX)
+                         else 'sum') for col in part.columns)
+    return pd.concat([part, other]).groupby(level=[0, 1]).agg(aggregations)
+
+
+def _to_list(values: np.ndarray, integers: bool):
+    if integers:
+        return [None if np.isnan(v) else int(round(v)) for v in values]
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def generate_time_series_docs(part: pd.DataFrame, level: str) -> Iterator[Dict]:
+    """
+    Generate the time series documents of a level: per key, the years with stats, the values of metrics for these
+    years, and the differences (deltas) and ratios of each year with the previous one (null for the first year, and
+    after a missing year)
+    :param part: the aggregates of the whole candidatures stats, see compute_time_series_part
+    :param level: the level of the aggregates
+    """
+    part = part.sort_index()
+    values = pd.DataFrame(index=part.index)
+    for col in TIME_SERIES_SUMMED_COLS:
+        # unknown if no stats row of the year holds the counter
+        values[col] = part[col].astype('float64').where(part[col + _COUNT_SUFFIX] > 0)
+    for col in TIME_SERIES_RANK_COLS[level]:
+        values[col] = part[col].astype('float64')
+    values['selectivite'] = values['n_accept'] / values['n_can'].where(values['n_can'] > 0)
+    # the previous year of each key, unknown if it is missing (the previous row of the key is an earlier year)
+    previous = values.groupby(level=0, sort=False, observed=True).shift(1)
+    row_years = pd.Series(part.index.get_level_values(1), index=part.index)
+    previous_years = row_years.groupby(level=0, sort=False, observed=True).shift(1)
+    previous = previous.where(row_years - previous_years == 1)
+    deltas = values - previous
+    ratios = values / previous.where(previous != 0)
+    metrics = TIME_SERIES_METRICS[level]
+    integer_metrics = set(TIME_SERIES_SUMMED_COLS + TIME_SERIES_RANK_COLS[level])
+    keys = part.index.get_level_values(0)
+    years = part.index.get_level_values(1).to_numpy()
+    boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    starts = np.concatenate([[0], boundaries]) if len(part) else np.zeros(0, dtype=np.int64)
+    ends = np.concatenate([boundaries, [len(part)]]) if len(part) else np.zeros(0, dtype=np.int64)
+    arrays = dict((m, (values[m].to_numpy(), deltas[m].to_numpy(), ratios[m].to_numpy())) for m in metrics)
+    for start, end in zip(starts, ends):
+        key = keys[start]
+        doc = dict(_id=time_series_id(level, key), niveau=level, id=key,
+                   annees=[int(y) for y in years[start:end]], series=dict(), deltas=dict(), ratios=dict())
+        for m in metrics:
+            m_values, m_deltas, m_ratios = arrays[m]
+            doc['series'][m] = _to_list(m_values[start:end], m in integer_metrics)
+            doc['deltas'][m] = _to_list(m_deltas[start:end], m in integer_metrics)
+            doc['ratios'][m] = _to_list(m_ratios[start:end], False)
+        yield doc
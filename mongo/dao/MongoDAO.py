@@ -5,6 +5,7 @@ from pymongo import MongoClient, database
 from pymongo.collection import Collection
 from pymongo.database import Database
 
+from mongo.dao.SlowQueryListener import SlowQueryListener
 from mongo.model import Formation
 from utils.Singleton import Singleton
 
@@ -20,6 +21,15 @@ class MongoDAO(metaclass=Singleton):
     formation_col_name = 'formations'
     candidature_col_name = 'candidatures'
     insertionpro_col_name = 'insertionspro'
+    academie_col_name = 'academies'
+    etablissement_col_name = 'etablissements'
+    sect_disc_col_name = 'secteursDisciplinaires'
+    mention_col_name = 'mentions'
+    metadata_col_name = 'metadata'
+    # followed by the dimensions of the rollup
+    candidature_rollup_col_prefix = 'candidaturesRollup_'
+    # per formation and etablissement time series of candidatures, keyed by '<level>:<key>'
+    candidature_time_series_col_name = 'candidaturesTimeSeries'
 
     def __init__(self, configuration: Dict = None):
         self.__configuration: Dict = configuration
@@ -62,8 +72,17 @@ class MongoDAO(metaclass=Singleton):
                     extra_params['authSource'] = creds['authSource']
                 if 'authMechanism' in creds:
                     extra_params['authMechanism'] = creds['authMechanism']
+        slow_query_listener = None
+        if 'slowQuery' in self.__configuration:
+            slow_query_opts = self.__configuration['slowQuery']
+            slow_query_listener = SlowQueryListener(slow_query_opts['thresholdMs'],
+                                                    explain=slow_query_opts.get('explain', False),
+                                                    explain_interval=slow_query_opts.get('explainInterval', 300))
+            extra_params['event_listeners'] = [slow_query_listener]
         self.__database_name = self.__configuration.get('database', DEFAULT_DB)
         self.__connection = MongoClient(host, **extra_params, connect=False)
+        if slow_query_listener is not None:
+            slow_query_listener.client = self.__connection
         self.__db = self.__connection[self.__database_name]
         LOG.debug("Mongo connection opened to db %s", self.__database_name)
 
@@ -85,6 +104,35 @@ class MongoDAO(metaclass=Singleton):
             ('discipline', 'text'),
             ('secteur_disciplinaire', 'text'),
         ], default_language="french", name="formation_txt_index", )
+        # formations near a point (formations without coordinates have no location)
+        self.__db[MongoDAO.formation_col_name].create_index([('location', '2dsphere')])
+        # stats search filters, for searches and their cost estimation (counts)
+        for field in ['regionId', 'academieId', 'etabUai', 'formationIfc', 'mentionId', 'secDiscId', 'anneeCollecte']:
+            self.__db[MongoDAO.candidature_col_name].create_index(field)
+        for field in ['regionId', 'academieId', 'etabUai', 'ins_disc', 'anneeCollecte']:
+            self.__db[MongoDAO.insertionpro_col_name].create_index(field)
+        # most ranked metrics (stats top), read in the order of their index
+        for field in ['n_can', 'n_accept', 'rang_dernier']:
+            self.__db[MongoDAO.candidature_col_name].create_index(field)
+        for field in ['taux_dinsertion', 'salaire_net_median_des_emplois_a_temps_plein']:
+            self.__db[MongoDAO.insertionpro_col_name].create_index(field)
+
+    def explain_find(self, col_name: str, filter: Dict, projection: Optional[Dict] = None,
+                     sort: Optional[Dict] = None, skip: Optional[int] = None, limit: Optional[int] = None) -> Dict:
+        command = {'find': col_name, 'filter': filter}
+        if projection is not None:
+            command['projection'] = projection
+        if sort is not None:
+            command['sort'] = sort
+        if skip:
+            command['skip'] = skip
+        if limit is not None:
+            command['limit'] = limit
+        return self.__db.command('explain', command, verbosity='executionStats')
+
+    def get_average_document_size(self, col_name: str) -> Optional[float]:
+        coll_stats = next(self.__db[col_name].aggregate([{'$collStats': {'storageStats': {}}}]), None)
+        return coll_stats['storageStats'].get('avgObjSize') if coll_stats else None
 
     @staticmethod
     def compute_dao_options_from_app(app_config: Dict):
@@ -98,6 +146,11 @@ class MongoDAO(metaclass=Singleton):
             if auth_source:
                 cred_dict['authSource'] = auth_source
             option_dict['credentials'] = cred_dict
+        slow_query_ms = app_config.get('MONGO_SLOW_QUERY_MS')
+        if slow_query_ms is not None:
+            option_dict['slowQuery'] = dict(thresholdMs=slow_query_ms,
+                                            explain=app_config.get('MONGO_SLOW_QUERY_EXPLAIN', False),
+                                            explainInterval=app_config.get('MONGO_SLOW_QUERY_EXPLAIN_INTERVAL', 300))
         return option_dict
 
     def __enter__(self):
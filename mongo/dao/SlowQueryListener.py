@@ -0,0 +1,117 @@
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from pymongo import MongoClient
+from pymongo.monitoring import CommandListener, CommandStartedEvent, CommandSucceededEvent, CommandFailedEvent
+
+from mongo.dao.explain_utils import normalize_query_shape, summarize_explain
+
+__all__ = ['SlowQueryListener']
+
+LOG = logging.getLogger(__name__)
+
+MAX_TRACKED = 1000
+
+
+class SlowQueryListener(CommandListener):
+    """
+    Command listener logging find, aggregate, count and getMore commands slower than a threshold, with the shape of
+    their filter (values removed), their duration and the number of documents returned. Optionally, the
+    explain('executionStats') plan of slow queries is logged as well, at most once per query shape and interval.
+    """
+    monitored_commands = {'find', 'aggregate', 'count', 'getMore'}
+
+    def __init__(self, threshold_ms: float, explain: bool = False, explain_interval: float = 300.):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.client: Optional[MongoClient] = None  # required for explains, set once the client created
+        self._lock = threading.Lock()
+        # (connection id, request id) -> (command name, database, collection, shape, explainable command)
+        self._running: Dict[Tuple, Tuple] = dict()
+        # cursor id -> shape of the command that opened the cursor, for getMore commands
+        self._cursors_shape: Dict[int, str] = dict()
+        # shape -> time of last explain
+        self._last_explains: Dict[str, float] = dict()
+
+    def started(self, event: CommandStartedEvent) -> None:
+        if event.command_name not in self.monitored_commands:
+            return
+        command = event.command
+        explainable_command = None
+        if event.command_name == 'find':
+            collection = command.get('find')
+            shape = normalize_query_shape(command.get('filter', dict()))
+            explainable_command = {'find': collection, 'filter': command.get('filter', dict())}
+        elif event.command_name == 'aggregate':
+            collection = command.get('aggregate')
+            shape = normalize_query_shape(command.get('pipeline', []))
+            explainable_command = {'aggregate': collection, 'pipeline': command.get('pipeline', []), 'cursor': {}}
+        elif event.command_name == 'count':
+            collection = command.get('count')
+            shape = normalize_query_shape(command.get('query', dict()))
+        else:
+            collection = command.get('collection')
+            shape = self._cursors_shape.get(command.get('getMore'), '?')
+        if not isinstance(shape, str):
+            shape = json.dumps(shape, sort_keys=True)
+        with self._lock:
+            if len(self._running) >= MAX_TRACKED:
+                self._running.clear()
+            self._running[(event.connection_id, event.request_id)] = (
+                event.command_name, event.database_name, collection, shape,
+                explainable_command if self.explain else None)
+
+    def succeeded(self, event: CommandSucceededEvent) -> None:
+        if event.command_name not in self.monitored_commands:
+            return
+        with self._lock:
+            running = self._running.pop((event.connection_id, event.request_id), None)
+        if running is None:
+            return
+        command_name, database_name, collection, shape, explainable_command = running
+        reply = event.reply
+        cursor = reply.get('cursor')
+        if cursor:
+            nb_docs = len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+            if cursor.get('id'):
+                with self._lock:
+                    if len(self._cursors_shape) >= MAX_TRACKED:
+                        self._cursors_shape.clear()
+                    self._cursors_shape[cursor.get('id')] = shape
+        else:
+            nb_docs = reply.get('n')
+        duration_ms = event.duration_micros / 1000.
+        if duration_ms < self.threshold_ms:
+            return
+        LOG.warning("Slow mongo %s on %s.%s (%.1f ms, %s docs returned): %s",
+                    command_name, database_name, collection, duration_ms, nb_docs, shape)
+        if explainable_command is not None and self._acquire_explain(shape):
+            threading.Thread(target=self._log_explain, args=(database_name, explainable_command, shape),
+                             daemon=True).start()
+
+    def failed(self, event: CommandFailedEvent) -> None:
+        with self._lock:
+            self._running.pop((event.connection_id, event.request_id), None)
+
+    def _acquire_explain(self, shape: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last_explain = self._last_explains.get(shape)
+            if last_explain is not None and now - last_explain < self.explain_interval:
+                return False
+            if len(self._last_explains) >= MAX_TRACKED:
+                self._last_explains.clear()
+            self._last_explains[shape] = now
+            return True
+
+    def _log_explain(self, database_name: str, command: Dict, shape: str):
+        # explain commands are not monitored: no recursion
+        try:
+            explain_result = self.client[database_name].command('explain', command, verbosity='executionStats')
+            LOG.warning("Explain of slow mongo query %s: %s", shape, summarize_explain(explain_result))
+        except Exception as e:
+            LOG.warning("Cannot explain slow mongo query %s: %s", shape, str(e))
@@ -0,0 +1,49 @@
+from typing import Any, Dict, Mapping, Optional
+
+__all__ = ['normalize_query_shape', 'summarize_explain']
+
+
+def normalize_query_shape(query: Any) -> Any:
+    """
+    Normalize a mongo filter or pipeline into its shape: fields and operators are kept, values are replaced by '?'
+    :param query: the filter, pipeline or value to normalize
+    :return: the shape
+    """
+    if isinstance(query, Mapping):
+        return dict((k, normalize_query_shape(v)) for k, v in query.items())
+    if isinstance(query, (list, tuple)) and query and all(isinstance(v, Mapping) for v in query):
+        return [normalize_query_shape(v) for v in query]
+    return '?'
+
+
+def _find_stage_values(plan: Any, key: str, found: list) -> list:
+    if isinstance(plan, Mapping):
+        if key in plan:
+            found.append(plan[key])
+        for v in plan.values():
+            _find_stage_values(v, key, found)
+    elif isinstance(plan, list):
+        for v in plan:
+            _find_stage_values(v, key, found)
+    return found
+
+
+def summarize_explain(explain_result: Mapping) -> Dict[str, Optional[Any]]:
+    """
+    Summarize the result of an explain command run with the executionStats verbosity
+    :param explain_result: the explain command result
+    :return: a dict with the winning plan stages and indexes, the number of keys and documents examined and returned
+    """
+    # find commands give queryPlanner at the top level, aggregate ones inside their $cursor stage
+    query_planners = _find_stage_values(explain_result, 'queryPlanner', [])
+    execution_stats = _find_stage_values(explain_result, 'executionStats', [])
+    winning_plan = query_planners[0].get('winningPlan') if query_planners else None
+    stats = execution_stats[0] if execution_stats else dict()
+    return {
+        'stages': _find_stage_values(winning_plan, 'stage', []),
+        'indexes': _find_stage_values(winning_plan, 'indexName', []),
+        'keysExamined': stats.get('totalKeysExamined'),
+        'docsExamined': stats.get('totalDocsExamined'),
+        'nReturned': stats.get('nReturned'),
+        'executionTimeMillis': stats.get('executionTimeMillis'),
+    }
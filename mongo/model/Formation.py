@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, Optional
 
 import pydantic
 from pydantic import BaseModel
@@ -27,6 +27,8 @@ class Formation(BaseModel):
     dept: Optional[int] = None
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    # GeoJSON point of latitude and longitude, for the 2dsphere index of the mongo cache
+    location: Optional[Dict] = None
 
     def to_small_dict(self) -> dict:
         return dict(ifc=self.ifc, parcours=self.parcours, alternance=self.alternance, lieux=self.lieux,
@@ -37,4 +39,5 @@ class Formation(BaseModel):
     def to_full_dict(self) -> dict:
         d = self.dict()
         d.pop('id')
+        d.pop('location')
         return d
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from pydantic_mongo import AbstractRepository
 
@@ -20,6 +20,43 @@ class FormationRepository(AbstractRepository[Formation]):
 
     def find_by_criteria(self, etab_uais: Optional[List[str]], sec_disc_ids: Optional[List[int]],
                          depts: Optional[List[int]], text_search: Optional[str]):
+        query = self._criteria_query(etab_uais, sec_disc_ids, depts)
+        if text_search:
+            query['$text'] = {
+                '$search': text_search,
+                '$language': 'fr'
+            }
+        return self.find_by(query)
+
+    def find_near(self, latitude: float, longitude: float, radius_km: Optional[float], nearest: Optional[int],
+                  etab_uais: Optional[List[str]], sec_disc_ids: Optional[List[int]],
+                  depts: Optional[List[int]]) -> List[Tuple[Formation, float]]:
+        """
+        Find formations around a point, from the 2dsphere index of locations
+        :return: the formations with their distance (km), the nearest first
+        """
+        geo_near = {
+            'near': {'type': 'Point', 'coordinates': [longitude, latitude]},
+            'key': 'location',
+            'distanceField': 'distance',
+            'distanceMultiplier': 0.001,
+            'spherical': True,
+            'query': self._criteria_query(etab_uais, sec_disc_ids, depts),
+        }
+        if radius_km is not None:
+            geo_near['maxDistance'] = radius_km * 1000
+        pipeline = [{'$geoNear': geo_near}]
+        if nearest is not None:
+            pipeline.append({'$limit': nearest})
+        results = []
+        for doc in self.get_collection().aggregate(pipeline):
+            distance = doc.pop('distance')
+            results.append((self.to_model(doc), distance))
+        return results
+
+    @staticmethod
+    def _criteria_query(etab_uais: Optional[List[str]], sec_disc_ids: Optional[List[int]],
+                        depts: Optional[List[int]]) -> Dict:
         query = dict()
         if etab_uais:
             if len(etab_uais) == 1:
@@ -36,9 +73,4 @@ class FormationRepository(AbstractRepository[Formation]):
                 query['dept'] = depts[0]
             else:
                 query['dept'] = {'$in': depts}
-        if text_search:
-            query['$text'] = {
-                '$search': text_search,
-                '$language': 'fr'
-            }
-        return self.find_by(query)
\ No newline at end of file
+        return query
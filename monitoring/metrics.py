@@ -0,0 +1,113 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Flask, Response, g, request, has_request_context
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+
+__all__ = ['init_metrics', 'time_stage', 'count_result_rows', 'count_coalesced_request', 'count_search_admission',
+           'generate_metrics_output']
+
+LOG = logging.getLogger(__name__)
+
+# Under gunicorn, PROMETHEUS_MULTIPROC_DIR must be set before this module is imported: each worker then writes its
+# metrics in this directory, and the metrics endpoint aggregates all of them.
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30.)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+REQUEST_LATENCY = Histogram('msapi_request_duration_seconds', 'Total latency of requests',
+                            ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+STAGE_LATENCY = Histogram('msapi_request_stage_duration_seconds',
+                          'Latency of request stages (mongo_query, document_decode, response_shaping, json_encoding)',
+                          ['route', 'stage'], buckets=LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('msapi_response_size_bytes', 'Size of response bodies', ['route'], buckets=SIZE_BUCKETS)
+RESULT_ROWS = Counter('msapi_result_rows', 'Number of rows returned by searches', ['route', 'kind'])
+COALESCED_REQUESTS = Counter('msapi_coalesced_requests', 'Number of coalesced requests, by role (leader computing '
+                                                         'the result, follower sharing it)', ['route', 'role'])
+SEARCH_ADMISSION = Counter('msapi_search_admission', 'Admission decisions of searches (admitted, admitted_expensive, '
+                                                     'rejected_budget, rejected_busy)', ['route', 'outcome'])
+
+_enabled = False
+
+
+def init_metrics(app: Flask):
+    """
+    Register request hooks measuring the total latency and the response size of each route
+    :param app: the flask app
+    """
+    global _enabled
+    _enabled = app.config.get('ENABLE_METRICS', True)
+    if not _enabled:
+        return
+    if MULTIPROC_DIR_ENV in os.environ:
+        LOG.info("Metrics in multiprocess mode (%s)", os.environ[MULTIPROC_DIR_ENV])
+    app.before_request(_start_request_timer)
+    app.after_request(_observe_request)
+
+
+def _route_label() -> str:
+    if not has_request_context():
+        return 'none'
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _start_request_timer():
+    g.metrics_request_start = time.perf_counter()
+
+
+def _observe_request(response: Response) -> Response:
+    start = g.pop('metrics_request_start', None)
+    if start is not None:
+        route = _route_label()
+        REQUEST_LATENCY.labels(route, request.method, str(response.status_code)).observe(time.perf_counter() - start)
+        size = response.calculate_content_length()
+        if size is not None:
+            RESPONSE_SIZE.labels(route).observe(size)
+    return response
+
+
+@contextmanager
+def time_stage(stage: str):
+    """
+    Measure the duration of a stage of the current request
+    :param stage: the stage name
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(_route_label(), stage).observe(time.perf_counter() - start)
+
+
+def count_result_rows(kind: str, nb_rows: int):
+    if _enabled:
+        RESULT_ROWS.labels(_route_label(), kind).inc(nb_rows)
+
+
+def count_coalesced_request(shared: bool):
+    if _enabled:
+        COALESCED_REQUESTS.labels(_route_label(), 'follower' if shared else 'leader').inc()
+
+
+def count_search_admission(outcome: str):
+    if _enabled:
+        SEARCH_ADMISSION.labels(_route_label(), outcome).inc()
+
+
+def generate_metrics_output() -> bytes:
+    """
+    Generate all metrics in the Prometheus text format, aggregated over all workers in multiprocess mode
+    :return: the text output
+    """
+    if MULTIPROC_DIR_ENV in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
@@ -0,0 +1,122 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Dict
+
+from flask import Flask, Response, current_app, g, request
+
+__all__ = ['init_profiling']
+
+LOG = logging.getLogger(__name__)
+
+# Only one request can be profiled at a time in a process (a single profiler can be active since python 3.12)
+_profiling_lock = threading.Lock()
+
+
+def init_profiling(app: Flask):
+    """
+    Register request hooks profiling the requests holding the profiling header (PROFILING_HEADER) and the admin token
+    (ADMIN_API_TOKEN, with the X-Admin-Token header or as a bearer token). Without admin token, no request is profiled.
+    With the header value 'inline', the profile report replaces the response. Otherwise, it is stored in
+    PROFILING_OUTPUT_DIR (.prof pstats file and .json report) and its id is given by the X-Profile-Id header.
+    :param app: the flask app
+    """
+    if not app.config.get('ENABLE_PROFILING', False):
+        return
+    app.logger.warning("ENABLE PROFILING")
+    if not app.config.get('ADMIN_API_TOKEN'):
+        app.logger.warning("ADMIN_API_TOKEN not set: no request will be profiled")
+    app.before_request(_start_profiling)
+    app.after_request(_stop_profiling)
+    app.teardown_request(_abort_profiling)
+
+
+def _start_profiling():
+    header_value = request.headers.get(current_app.config.get('PROFILING_HEADER', 'X-Profile'))
+    if not header_value or not _has_admin_token() or not _profiling_lock.acquire(blocking=False):
+        return
+    g.profiling_mode = header_value.lower()
+    g.profiling_tracemalloc = not tracemalloc.is_tracing()
+    if g.profiling_tracemalloc:
+        tracemalloc.start()
+    g.profiling_start = time.perf_counter()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def _has_admin_token() -> bool:
+    # profiles slow the requests of the process down and reveal internals: only for administrators
+    admin_token = current_app.config.get('ADMIN_API_TOKEN')
+    return bool(admin_token) and (request.headers.get('X-Admin-Token') == admin_token
+                                  or request.headers.get('Authorization') == 'Bearer ' + admin_token)
+
+
+def _stop_profiling(response: Response) -> Response:
+    profiler: cProfile.Profile = g.pop('profiler', None)
+    if profiler is None:
+        if request.headers.get(current_app.config.get('PROFILING_HEADER', 'X-Profile')) and _has_admin_token():
+            response.headers['X-Profile-Status'] = 'busy'
+        return response
+    try:
+        profiler.disable()
+        duration = time.perf_counter() - g.pop('profiling_start')
+        snapshot = tracemalloc.take_snapshot()
+        if g.pop('profiling_tracemalloc'):
+            tracemalloc.stop()
+        report = _create_profile_report(profiler, snapshot, duration,
+                                        current_app.config.get('PROFILING_TOP_FUNCTIONS', 30))
+        output_dir = current_app.config.get('PROFILING_OUTPUT_DIR')
+        if g.pop('profiling_mode') == 'inline' or not output_dir:
+            return current_app.json.response(report)
+        profile_id = "%s-%s" % (time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:8])
+        os.makedirs(output_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(output_dir, profile_id + '.prof'))
+        with open(os.path.join(output_dir, profile_id + '.json'), 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=1)
+        LOG.info("Profile %s stored for %s %s", profile_id, request.method, request.path)
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+    finally:
+        _profiling_lock.release()
+
+
+def _abort_profiling(exc):
+    # Request ended without after_request hooks being called (unhandled error)
+    profiler: cProfile.Profile = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        if g.pop('profiling_tracemalloc', False):
+            tracemalloc.stop()
+        _profiling_lock.release()
+
+
+def _create_profile_report(profiler: cProfile.Profile, snapshot: tracemalloc.Snapshot, duration: float,
+                           nb_top: int) -> Dict:
+    stats = pstats.Stats(profiler).stats
+    top_functions = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:nb_top]
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__)])
+    top_allocations = snapshot.statistics('lineno')[:nb_top]
+    return {
+        'method': request.method,
+        'path': request.full_path,
+        'backend': current_app.config.get('STATS_SEARCH_BACKEND', 'mongo'),
+        'duration': duration,
+        'functions': [{
+            'function': pstats.func_std_string(func),
+            'nbCalls': nb_calls,
+            'ownTime': own_time,
+            'cumulativeTime': cumul_time
+        } for func, (_, nb_calls, own_time, cumul_time, _) in top_functions],
+        'allocations': [{
+            'location': str(alloc_stat.traceback),
+            'nbBlocks': alloc_stat.count,
+            'size': alloc_stat.size
+        } for alloc_stat in top_allocations]
+    }
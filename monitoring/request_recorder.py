@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import random
+import time
+from logging.handlers import RotatingFileHandler
+
+from flask import Flask, Response, current_app, g, request
+
+__all__ = ['init_request_recording', 'RECORDER_LOGGER_NAME']
+
+LOG = logging.getLogger(__name__)
+
+RECORDER_LOGGER_NAME = 'msapi.request_recording'
+
+_recorder = logging.getLogger(RECORDER_LOGGER_NAME)
+
+
+def init_request_recording(app: Flask):
+    """
+    Register request hooks appending a sample of requests on REQUEST_RECORDING_PATHS to REQUEST_RECORDING_FILE, as
+    JSON lines (start time, method, path, route, query, body, status, latency, response size). The file is rotated
+    every REQUEST_RECORDING_MAX_BYTES. A {pid} placeholder in the file name gives one file per worker process.
+    Recorded files can be replayed with benchmarks.replay_requests.
+    :param app: the flask app
+    """
+    if not app.config.get('REQUEST_RECORDING_ENABLED', False):
+        return
+    filename = app.config.get('REQUEST_RECORDING_FILE', 'local/requests.jsonl').format(pid=os.getpid())
+    app.logger.warning("ENABLE REQUEST RECORDING in %s", filename)
+    if not _recorder.handlers:
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        handler = RotatingFileHandler(filename, maxBytes=app.config.get('REQUEST_RECORDING_MAX_BYTES', 50 * 2 ** 20),
+                                      backupCount=app.config.get('REQUEST_RECORDING_BACKUP_COUNT', 5),
+                                      encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _recorder.addHandler(handler)
+        _recorder.setLevel(logging.INFO)
+        _recorder.propagate = False
+    app.before_request(_start_recording)
+    app.after_request(_record_request)
+
+
+def _start_recording():
+    paths = current_app.config.get('REQUEST_RECORDING_PATHS', ['/api/rest/stats/search', '/api/rest/formations'])
+    if not request.path.startswith(tuple(paths)):
+        return
+    if random.random() >= current_app.config.get('REQUEST_RECORDING_SAMPLE_RATE', 1.):
+        return
+    g.recording_start = (time.time(), time.perf_counter())
+
+
+def _record_request(response: Response) -> Response:
+    start = g.pop('recording_start', None)
+    if start is None:
+        return response
+    try:
+        _recorder.info(json.dumps({
+            'ts': round(start[0], 6),
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule is not None else None,
+            'query': request.query_string.decode('utf-8', errors='replace'),
+            'body': request.get_json(silent=True) if request.is_json else None,
+            'status': response.status_code,
+            'latency': round(time.perf_counter() - start[1], 6),
+            'size': response.calculate_content_length(),
+        }, ensure_ascii=False))
+    except Exception as e:
+        # recording must never break a request
+        LOG.warning("Cannot record request %s: %s", request.path, str(e))
+    return response
@@ -1,3 +1,6 @@
 #!/bin/sh
+# Directory shared by gunicorn workers to aggregate their metrics. Must be cleared at each start.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/msapi-metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 # -u is important to not buffer console I/O that could cause no showing output to console in some docker platform (macos especially)
 gunicorn -c 'gunicorn.conf.py' 'MasterStatsAPI:main()'
@@ -0,0 +1,38 @@
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import pandas as pd
+
+__all__ = ['FrameDerivedCache']
+
+
+class FrameDerivedCache:
+    """
+    Cache of values derived from frames (codes of a column, metric arrays...), one frame per key. Frames are held by
+    weak references: values derived from a replaced frame are never given for another frame, even one reusing its
+    id, and do not keep it alive. Frames must not be modified once values are derived from them.
+    """
+    __slots__ = ['_lock', '_entries']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[weakref.ref, Any]] = dict()
+
+    def get(self, df: pd.DataFrame, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Give the value of a key derived from a frame, computed if the cached one was derived from another frame
+        :param df: the frame
+        :param key: the key of the derived value
+        :param compute: computes the value from the frame
+        :return: the value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+        # computed out of the lock: concurrent computations of a key give the same value
+        value = compute()
+        with self._lock:
+            self._entries[key] = (weakref.ref(df), value)
+        return value
@@ -0,0 +1,64 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+__all__ = ['SingleFlight']
+
+LOG = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ['done', 'result', 'error']
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls sharing a key, within a process: the first call (leader) computes the result, the
+    concurrent ones (followers) wait for it and share it, or its exception. Nothing is kept once the leader is done.
+    """
+    __slots__ = ['_lock', '_calls', '_wait_timeout']
+
+    def __init__(self, wait_timeout: Optional[float] = None):
+        """
+        :param wait_timeout: maximum waiting time of followers (in s.), after which they compute the result by
+        themselves. None to wait for the leader whatever the time.
+        """
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = dict()
+        self._wait_timeout = wait_timeout
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Compute func, or share the result of the concurrent call of the same key
+        :param key: the key identifying the computation
+        :param func: the computation
+        :return: the result and True if it was shared from a concurrent call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        if not leader:
+            if call.done.wait(self._wait_timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result, True
+            LOG.warning("Coalesced call waited more than %ss, compute it apart", self._wait_timeout)
+            return func(), False
+        try:
+            call.result = func()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
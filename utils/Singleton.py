@@ -13,3 +13,9 @@ class Singleton(type):
             return cls.__instance
         else:
             return cls.__instance
+
+    def reset_instance(cls):
+        """
+        Forget the instance of the class: the next call creates a new one
+        """
+        cls.__instance = None